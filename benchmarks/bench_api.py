@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test: many concurrent dashboard pollers against /api/data
+
+    python benchmarks/bench_api.py [--pollers 50] [--duration 5]
+
+Serves sp500_fast.app on a local threaded server and compares the old
+per-request jsonify(SAMPLE_DATA) handler (mounted at /bench/legacy) with
+the precomputed /api/data. Pollers behave like browsers: they send
+Accept-Encoding: gzip and echo the last ETag in If-None-Match.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from flask import jsonify
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+import sp500_fast
+
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like browsers
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def legacy_data():
+    return jsonify(sp500_fast.SAMPLE_DATA)
+
+
+def poll(url, deadline, totals, lock):
+    session = requests.Session()
+    headers = {'Accept-Encoding': 'gzip'}
+    count = wire_bytes = not_modified = 0
+
+    while time.perf_counter() < deadline:
+        response = session.get(url, headers=headers, stream=True)
+        wire_bytes += len(response.raw.read(decode_content=False))
+        count += 1
+        if response.status_code == 304:
+            not_modified += 1
+        if response.headers.get('ETag'):
+            headers['If-None-Match'] = response.headers['ETag']
+
+    with lock:
+        totals['requests'] += count
+        totals['bytes'] += wire_bytes
+        totals['not_modified'] += not_modified
+
+
+def run(base_url, path, pollers, duration):
+    totals = {'requests': 0, 'bytes': 0, 'not_modified': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=poll, args=(base_url + path, deadline, totals, lock))
+               for _ in range(pollers)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return totals['requests'] / elapsed, totals['bytes'] / elapsed, totals['not_modified'] / max(totals['requests'], 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pollers', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    sp500_fast.app.add_url_rule('/bench/legacy', 'bench_legacy', legacy_data)
+    server = make_server('127.0.0.1', 0, sp500_fast.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    print(f"{args.pollers} pollers, {args.duration:.0f}s per endpoint")
+    print(f"{'endpoint':<16} {'req/s':>10} {'KB/s':>10} {'304 share':>10}")
+    for label, path in (('before (legacy)', '/bench/legacy'), ('after', '/api/data')):
+        rps, bps, share = run(base_url, path, args.pollers, args.duration)
+        print(f"{label:<16} {rps:>10.0f} {bps / 1024:>10.1f} {share:>10.0%}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: cost of cross-ticker dedup when scoring a run's headlines
+
+    python benchmarks/bench_dedup.py [--tickers 500] [--per-ticker 10] [--shared 0.3]
+
+Builds one run's headlines: company-specific stories plus a `--shared`
+share of market-wide stories, which reach each ticker with wire-service
+variations (source suffixes, casing, punctuation) or as templates
+naming the company. Scores them through sp500_cache.ScoreCache (which
+skips repeated identical text) with and without clustering them with
+sp500_dedup.HeadlineDeduplicator, reporting time, VADER calls (the same
+either way: each ticker's own headlines are scored) and the dedup ratio.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer, NEGATE, BOOSTER_DICT
+
+from sp500_cache import ScoreCache
+from sp500_dedup import HeadlineDeduplicator
+from fakes import TEMPLATES
+
+MARKET_STORIES = (
+    "Stocks slide as the Federal Reserve signals more rate hikes",
+    "Wall Street rallies after cooler inflation report",
+    "Oil prices climb as OPEC extends production cuts",
+    "Treasury yields jump to a 16-year high",
+    "S&P 500 closes at a record as tech shares lead gains",
+    "Dow drops 500 points on recession fears",
+    "Jobs report shows hiring slowed sharply last month",
+    "Dollar weakens as traders price in rate cuts",
+)
+SUFFIXES = ('', ' - Reuters', ' | Bloomberg', ' (AP)', ' - MarketWatch')
+
+
+def build_run(tickers, per_ticker, shared, seed=0):
+    """[(ticker, company name, headlines)] for one synthetic run"""
+    rng = random.Random(seed)
+    words = ('revenue', 'guidance', 'margin', 'buyback', 'merger', 'lawsuit', 'layoffs', 'dividend',
+             'upgrade', 'downgrade', 'record', 'slump', 'partnership', 'recall', 'launch', 'probe')
+    run = []
+    for i in range(tickers):
+        ticker, name = f"T{i:03d}", f"Company{i} Holdings Inc."
+        headlines = []
+        for j in range(per_ticker):
+            draw = rng.random()
+            if draw < shared / 2:
+                story = rng.choice(MARKET_STORIES) + rng.choice(SUFFIXES)
+                headlines.append(story.upper() if rng.random() < 0.05 else story)
+            elif draw < shared:
+                headlines.append(rng.choice(TEMPLATES).format(ticker=ticker, name=name.split()[0]))
+            else:
+                headlines.append(f"{name.split()[0]} {' '.join(rng.sample(words, 4))} report {i}-{j}")
+        run.append((ticker, name, headlines))
+    return run
+
+
+def score(run, analyzer, dedup):
+    cache = ScoreCache(analyzer)
+    deduplicator = None
+    if dedup:
+        protected = set(analyzer.lexicon) | set(NEGATE) | set(BOOSTER_DICT)
+        deduplicator = HeadlineDeduplicator(protected_words=protected)
+
+    begin = time.perf_counter()
+    for ticker, name, headlines in run:
+        if deduplicator is not None:
+            deduplicator.add(ticker, headlines, name)
+        for text in headlines:
+            cache.polarity_scores(text)
+    return time.perf_counter() - begin, cache.stats['misses'], deduplicator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--per-ticker', type=int, default=10)
+    parser.add_argument('--shared', type=float, default=0.3, help="share of market-wide or templated headlines")
+    args = parser.parse_args()
+
+    analyzer = SentimentIntensityAnalyzer()
+    run = build_run(args.tickers, args.per_ticker, args.shared)
+    score(run[:20], analyzer, True)  # compile the name patterns' regex machinery once
+
+    for label, dedup in (('exact text only', False), ('with dedup', True)):
+        seconds, scored, deduplicator = score(run, analyzer, dedup)
+        print(f"{label:<16} {seconds * 1000:>7.0f} ms, {scored:>5} headlines scored by VADER")
+        if deduplicator is not None:
+            print(deduplicator.summary())
+
+
+if __name__ == '__main__':
+    main()
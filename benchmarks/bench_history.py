@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: rolling-window queries over a year of 5-minute snapshots
+
+    python benchmarks/bench_history.py [--days 365] [--interval 300] [--tickers 500]
+
+Writes synthetic runs into a temporary sp500_history.HistoryStore (one
+bulk append per day, each compacted as the next day starts) and times
+typical queries, each the median of a few repeats with a warm page cache.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from sp500_history import HistoryStore, FIELDS
+
+DAY = 86400
+
+
+def populate(store, days, interval, tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    names = [f"T{i:03d}" for i in range(tickers)]
+    runs_per_day = DAY // interval
+    start = (time.time() // DAY - days) * DAY
+    level = rng.uniform(-0.5, 0.5, tickers)
+
+    for day in range(days):
+        times = np.repeat(start + day * DAY + np.arange(runs_per_day) * interval, tickers)
+        # Slowly drifting sentiment per ticker plus noise
+        level += rng.normal(0, 0.02, tickers)
+        compound = np.clip(np.tile(level, runs_per_day) + rng.normal(0, 0.2, len(times)), -1, 1)
+        columns = {field: compound * (100 if field == 'prediction_score' else 1) for field in FIELDS}
+        store.append_rows(times, names * runs_per_day, columns)
+    return names, start + days * DAY
+
+
+def timed(func, repeats=5):
+    samples = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - begin)
+    return statistics.median(samples), result
+
+
+def disk_usage(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--interval', type=int, default=300, help="seconds between runs (default: 300)")
+    parser.add_argument('--tickers', type=int, default=500)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='sp500_history_')
+    try:
+        store = HistoryStore(directory)
+        begin = time.perf_counter()
+        names, end = populate(store, args.days, args.interval, args.tickers)
+        rows = args.days * (DAY // args.interval) * args.tickers
+        print(f"{rows:,} rows ({args.days} days x {DAY // args.interval} runs x {args.tickers} tickers) "
+              f"written in {time.perf_counter() - begin:.1f}s, {disk_usage(directory) / 2 ** 20:.0f} MB on disk")
+
+        queries = [
+            ("7d rolling mean, 1 ticker, full history", lambda: store.rolling_mean(names[:1], window='7d')),
+            ("7d z-score, 10 tickers, full history", lambda: store.zscore(names[:10], window='7d')),
+            ("change since 12 runs, 10 tickers, full history", lambda: store.change(names[:10], runs=12)),
+            ("24h rolling mean, all tickers, last 7 days",
+             lambda: store.rolling_mean(window='24h', start=end - 7 * DAY)),
+            ("7d z-score, all tickers, last day", lambda: store.zscore(window='7d', start=end - DAY)),
+        ]
+        print(f"\n{'query':<50} {'rows':>10} {'time':>9}")
+        for label, query in queries:
+            seconds, frame = timed(query)
+            print(f"{label:<50} {len(frame):>10,} {seconds * 1000:>7.0f}ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
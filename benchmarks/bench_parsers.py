@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: BeautifulSoup vs streaming lxml headline parsers
+
+    python benchmarks/bench_parsers.py [--rss FILE] [--page FILE] [--runs 20]
+
+Parses a saved RSS feed and quote news page (or synthetic ones of a
+realistic size) with the previous BeautifulSoup code and with
+sp500_parsers, checks both give the same headlines, and reports the
+median parse time and the peak memory growth, each parser measured in
+its own interpreter.
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def bs4_rss(content):
+    """The RSS parser as it was before sp500_parsers"""
+    from bs4 import BeautifulSoup
+    headlines = []
+    soup = BeautifulSoup(content, 'xml')
+    items = soup.find_all('item')
+
+    for item in items[:10]:
+        title = item.find('title')
+        if title:
+            headlines.append(title.text.strip())
+
+    return headlines
+
+
+def bs4_page(content):
+    """The quote-page scraper as it was before sp500_parsers"""
+    from bs4 import BeautifulSoup
+    headlines = []
+    soup = BeautifulSoup(content.decode('utf-8'), 'html.parser')
+
+    selectors = [
+        'h3',
+        '[data-test-locator="headline"]',
+        '.Mb\\(5px\\)',
+        'a[data-test-locator="stream-item-title"]'
+    ]
+
+    for selector in selectors:
+        items = soup.select(selector)
+        for item in items[:10]:
+            text = item.get_text().strip()
+            if len(text) > 15 and len(text) < 200:
+                headlines.append(text)
+
+        if len(headlines) >= 5:
+            break
+
+    return headlines
+
+
+def lxml_rss(content):
+    from sp500_parsers import parse_rss_titles
+    return parse_rss_titles(content)
+
+
+def lxml_page(content):
+    from sp500_parsers import parse_quote_page_headlines
+    return parse_quote_page_headlines(content)
+
+
+PARSERS = {
+    'rss': (bs4_rss, lxml_rss),
+    'page': (bs4_page, lxml_page),
+}
+
+
+def synthetic_rss(items=100):
+    """An RSS feed shaped like Yahoo's headline feed"""
+    entries = ''.join(
+        f"<item><title>Company {i} shares move after quarterly update number {i}</title>"
+        f"<link>https://finance.yahoo.com/news/story-{i}.html</link>"
+        f"<description>{'Analysts weigh in on the results. ' * 8}</description>"
+        f"<pubDate>Mon, 06 Jan 2025 12:{i % 60:02d}:00 +0000</pubDate>"
+        f"<guid isPermaLink=\"false\">story-{i}</guid></item>"
+        for i in range(items)
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f'<title>Yahoo! Finance: Headlines</title>{entries}</channel></rss>').encode('utf-8')
+
+
+def synthetic_page(stories=20, filler_kb=600):
+    """A quote news page: navigation and scripts, a story stream, then a long tail"""
+    head = ('<!DOCTYPE html><html><head><title>News</title>'
+            f'<script>{"var x = 1;" * 2000}</script></head><body>'
+            '<nav>' + ''.join(f'<a href="/s/{i}">Section {i}</a>' for i in range(50)) + '</nav>'
+            '<h3>Markets</h3>')
+    stream = ''.join(
+        f'<li><div class="Ov(h)"><h3 class="Mb(5px)"><a data-test-locator="stream-item-title" href="/n/{i}">'
+        f'Story {i}: earnings, guidance and what analysts expect next</a></h3>'
+        f'<p>{"Summary text for the story. " * 6}</p></div></li>'
+        for i in range(stories)
+    )
+    tail = f'<footer>{"<div><span>Related quotes and more links</span></div>" * (filler_kb * 20)}</footer>'
+    return (head + f'<ul>{stream}</ul>' + tail + '</body></html>').encode('utf-8')
+
+
+def child(kind, implementation, path, runs):
+    """Measure one parser in this (fresh) interpreter and print a JSON result"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    parse = PARSERS[kind][implementation == 'lxml']
+
+    parse(b'<html></html>' if kind == 'page' else b'<rss></rss>')  # import the parser first
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        headlines = parse(content)
+        timings.append(time.perf_counter() - start)
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'seconds': statistics.median(timings), 'peak_kb': peak_kb - baseline_kb,
+                      'headlines': headlines}))
+
+
+def measure(kind, implementation, path, runs):
+    result = subprocess.run([sys.executable, __file__, '--child', kind, implementation, path, str(runs)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rss', help='saved RSS feed (default: synthetic)')
+    parser.add_argument('--page', help='saved quote news page (default: synthetic)')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--child', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, implementation, path, runs = args.child
+        child(kind, implementation, path, int(runs))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = {}
+        for kind, saved, make in (('rss', args.rss, synthetic_rss), ('page', args.page, synthetic_page)):
+            if saved:
+                inputs[kind] = saved
+            else:
+                inputs[kind] = os.path.join(directory, f'{kind}.bin')
+                with open(inputs[kind], 'wb') as f:
+                    f.write(make())
+
+        print(f"{'input':<6} {'size':>9} {'parser':<14} {'parse':>10} {'peak mem':>10}  headlines")
+        for kind, path in inputs.items():
+            size = os.path.getsize(path)
+            results = {}
+            for implementation in ('bs4', 'lxml'):
+                results[implementation] = result = measure(kind, implementation, path, args.runs)
+                print(f"{kind:<6} {size / 1024:>7.0f}KB {implementation:<14} {result['seconds'] * 1000:>8.2f}ms "
+                      f"{result['peak_kb'] / 1024:>8.1f}MB  {len(result['headlines'])}")
+
+            same = results['bs4']['headlines'] == results['lxml']['headlines']
+            print(f"{'':<6} {'':>9} {'speedup':<14} {results['bs4']['seconds'] / results['lxml']['seconds']:>9.1f}x"
+                  f"{'':>11}  {'identical' if same else 'DIFFERENT'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: analyze_all_companies end to end against fake news sources
+
+    python benchmarks/bench_pipeline.py [--tickers 200] [--workers 8] [--latency-ms 50]
+                                        [--error-rate 0.05] [--gzip] [--runs 2] [--output FILE]
+
+Runs benchmarks/fakes.FakeNewsServer in a child process (so its CPU time
+is not counted), replaces yfinance with FakeYFinance and analyzes a
+synthetic universe. Each run reports tickers/s, p50/p95/p99 per-ticker
+latency (from the start of its news search to its progress callback)
+and CPU time; the whole process reports peak RSS. Later runs exercise
+conditional GETs. Results are written as JSON, tagged with the commit,
+for comparison between revisions.
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeNewsServer, FakeYFinance
+
+
+def serve(options, connection):
+    server = FakeNewsServer(**options)
+    connection.send((server.base_url, server.rss_url, server.quote_news_url))
+    server.server.serve_forever()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def commit():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    revision = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    return revision + ('-dirty' if git('status', '--porcelain', '--untracked-files=no') else '')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_once(analyzer, companies):
+    """Analyze `companies` once and measure it"""
+    started = {}
+    latencies = []
+    lock = threading.Lock()
+    search = analyzer.search_company_news
+
+    def timed_search(company_name, ticker):
+        with lock:
+            started[ticker] = time.perf_counter()
+        return search(company_name, ticker)
+
+    def progress(ticker, row, done, total):
+        finished = time.perf_counter()
+        # In batch scoring the callback fires after fetching; rows are scored together afterwards
+        with lock:
+            latencies.append(finished - started.pop(ticker, finished))
+
+    analyzer.search_company_news = timed_search
+    analyzer.progress_callback = progress
+    analyzer.sp500_companies = companies
+
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        analyzer.analyze_all_companies()
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+
+    del analyzer.search_company_news
+    return {
+        'tickers': len(companies),
+        'wall_seconds': round(wall, 4),
+        'tickers_per_second': round(len(companies) / wall, 2),
+        'latency_ms': {f'p{q}': round(percentile(latencies, q) * 1000, 2) for q in (50, 95, 99)},
+        'cpu_seconds': round(cpu, 4),
+        'http': analyzer.http.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=2, help="consecutive runs; later ones can use 304s (default: 2)")
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of HTTP requests answered with 500")
+    parser.add_argument('--change-rate', type=float, default=0.1,
+                        help="chance a ticker has new headlines on each request (default: 0.1)")
+    parser.add_argument('--no-etag', action='store_true', help="server sends no ETags (no 304s)")
+    parser.add_argument('--gzip', action='store_true', help="server gzips its bodies, like the real sources")
+    parser.add_argument('--yfinance-rate', type=float, default=0.0,
+                        help="share of tickers the fake yfinance has news for (default: 0, all go to RSS)")
+    parser.add_argument('--yfinance-batch', type=int, default=50,
+                        help="tickers per bulk yfinance batch; 0 reads news per ticker (default: 50)")
+    parser.add_argument('--batch-scoring', action='store_true')
+    parser.add_argument('--output', default='bench_pipeline.json', help="JSON results file (default: bench_pipeline.json)")
+    parser.add_argument('--compare', metavar='FILE', help="earlier JSON results to print the change against")
+    args = parser.parse_args()
+
+    FakeYFinance(news_rate=args.yfinance_rate, latency=args.latency_ms / 1000).install()
+
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, daemon=True, args=({
+        'latency': args.latency_ms / 1000, 'jitter': args.jitter_ms / 1000, 'error_rate': args.error_rate,
+        'etag': not args.no_etag, 'change_rate': args.change_rate, 'compress': args.gzip,
+    }, child))
+    server.start()
+    base_url, rss_url, quote_news_url = parent.recv()
+
+    from sp500_sentiment_analyzer import SP500SentimentAnalyzer
+
+    analyzer = SP500SentimentAnalyzer(workers=args.workers, rate_limit=None, rss_url=rss_url,
+                                      quote_news_url=quote_news_url, batch_scoring=args.batch_scoring,
+                                      yfinance_batch_size=args.yfinance_batch)
+    companies = [{'ticker': f"T{i:04d}", 'name': f"Test Company {i}"} for i in range(args.tickers)]
+
+    runs = []
+    try:
+        for number in range(1, args.runs + 1):
+            result = run_once(analyzer, companies)
+            runs.append(result)
+            print(f"run {number}: {result['tickers_per_second']:.1f} tickers/s, "
+                  f"p50/p95/p99 {result['latency_ms']['p50']:.0f}/{result['latency_ms']['p95']:.0f}/"
+                  f"{result['latency_ms']['p99']:.0f} ms, CPU {result['cpu_seconds']:.2f}s, {result['http']}")
+
+        import requests
+        server_stats = requests.get(base_url + '/stats', timeout=5).json()
+    finally:
+        server.terminate()
+
+    report = {
+        'commit': commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': vars(args),
+        'runs': runs,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'server': server_stats,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"peak RSS {report['peak_rss_mb']:.0f} MB; server {server_stats}; written to {args.output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+def compare(report, path):
+    """Print each run's change against an earlier results file"""
+    with open(path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    print(f"\nvs {baseline['commit']} ({path}):")
+    for number, (old, new) in enumerate(zip(baseline['runs'], report['runs']), 1):
+        changes = [('tickers/s', old['tickers_per_second'], new['tickers_per_second']),
+                   ('p95 ms', old['latency_ms']['p95'], new['latency_ms']['p95']),
+                   ('CPU s', old['cpu_seconds'], new['cpu_seconds'])]
+        print(f"run {number}: " + ', '.join(f"{label} {a:g} -> {b:g} ({(b - a) / a:+.0%})" for label, a, b in changes))
+    old_rss, new_rss = baseline['peak_rss_mb'], report['peak_rss_mb']
+    print(f"peak RSS {old_rss:g} -> {new_rss:g} MB ({(new_rss - old_rss) / old_rss:+.0%})")
+
+
+if __name__ == '__main__':
+    main()
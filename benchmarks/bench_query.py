@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test: per-ticker, ranking and sector queries against the dashboard
+
+    python benchmarks/bench_query.py [--tickers 500] [--clients 2x8] [--duration 5]
+
+Publishes a synthetic snapshot of `--tickers` results to a temporary
+store, serves sp500_fast.app on a local threaded server and drives
+/api/ticker, /api/rank and /api/sector from client processes (processes x
+threads, so the clients do not share the server's GIL). Reports request
+rate and the server-side latency of each request (WSGI call to last body
+byte) as wall time and as the serving thread's CPU time, next to a handler
+that sorts the snapshot per request (/bench/naive-rank, what clients of
+/api/data had to do themselves). Wall time includes waiting for a core,
+so it only means something when the server has cores to itself.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from bench_results import SECTORS
+
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Timed:
+    """WSGI middleware recording each request's (wall, thread CPU) seconds per route"""
+
+    def __init__(self, app):
+        self.app = app
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        start, cpu = time.perf_counter(), time.thread_time()
+        body = b''.join(self.app(environ, start_response))
+        seconds = (time.perf_counter() - start, time.thread_time() - cpu)
+        route = '/'.join(environ['PATH_INFO'].split('/')[:3])
+        with self.lock:
+            self.samples.setdefault(route, []).append(seconds)
+        return [body]
+
+
+def make_rows(count, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'ticker': f"T{i:04d}",
+        'company': f"Company {i}",
+        'sector': SECTORS[i % len(SECTORS)],
+        'prediction_score': rng.uniform(-60, 60),
+        'sentiment_compound': rng.uniform(-0.6, 0.6),
+        'sample_headlines': [f"Company {i} shares move after analysts revise their outlook"],
+        'headlines_count': 10,
+        'fresh': True,
+    } for i in range(count)]
+
+
+def client(base_url, paths, duration, threads, counts):
+    def loop(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        deadline = time.perf_counter() + duration
+        done = 0
+        while time.perf_counter() < deadline:
+            session.get(base_url + rng.choice(paths)).raise_for_status()
+            done += 1
+        counts.append(done)
+
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--clients', default='2x8', help="client processes x threads per process")
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+    processes, threads = (int(n) for n in args.clients.split('x'))
+
+    os.environ['SP500_RESULTS_DB'] = os.path.join(tempfile.mkdtemp(), 'results.db')
+    import sp500_fast
+    from flask import jsonify, request
+
+    rows = make_rows(args.tickers)
+    sp500_fast.publish_data(dict(sp500_fast.current_data(), results=sp500_fast.query_rows(rows),
+                                 total_companies=len(rows)))
+
+    def naive_rank():
+        results = sp500_fast.current_data()['results']
+        if request.args.get('sector'):
+            results = [row for row in results if row['sector'] == request.args['sector']]
+        ranked = sorted(results, key=lambda row: -row['prediction_score'])
+        offset, k = int(request.args.get('offset', 0)), int(request.args.get('k', 10))
+        return jsonify({'total': len(ranked), 'rows': ranked[offset:offset + k]})
+
+    sp500_fast.app.add_url_rule('/bench/naive-rank', 'bench_naive_rank', naive_rank)
+    timed = Timed(sp500_fast.app)
+    server = make_server('127.0.0.1', 0, timed, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    tickers = [row['ticker'] for row in rows]
+    mixes = {
+        'indexed': [f"/api/ticker/{ticker}" for ticker in tickers[:50]]
+                   + [f"/api/rank?k=20&offset={offset}" for offset in range(0, 200, 20)]
+                   + [f"/api/rank?k=10&sector={sector}&order=asc" for sector in SECTORS]
+                   + [f"/api/sector/{sector}?k=10" for sector in SECTORS],
+        'naive': [f"/bench/naive-rank?k=20&offset={offset}" for offset in range(0, 200, 20)]
+                 + [f"/bench/naive-rank?k=10&sector={sector}" for sector in SECTORS],
+    }
+
+    print(f"{args.tickers} tickers, {processes}x{threads} clients, {args.duration:.0f}s per mix, "
+          f"{os.cpu_count()} cores")
+    print(f"{'route':<18} {'req/s':>8} {'wall p50 us':>12} {'wall p99 us':>12} {'cpu p50 us':>11} {'cpu p99 us':>11}")
+    for label, paths in mixes.items():
+        timed.samples = {}
+        with multiprocessing.Manager() as manager:
+            counts = manager.list()
+            started = time.perf_counter()
+            pool = [multiprocessing.Process(target=client, args=(base_url, paths, args.duration, threads, counts))
+                    for _ in range(processes)]
+            for process in pool:
+                process.start()
+            for process in pool:
+                process.join()
+            elapsed = time.perf_counter() - started
+        for route, samples in sorted(timed.samples.items()):
+            wall, cpu = zip(*samples)
+            print(f"{route:<18} {len(samples) / elapsed:>8.0f} {percentile(wall, 50) * 1e6:>12.0f} "
+                  f"{percentile(wall, 99) * 1e6:>12.0f} {percentile(cpu, 50) * 1e6:>11.0f} "
+                  f"{percentile(cpu, 99) * 1e6:>11.0f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: memory of per-ticker result dicts vs sp500_results.ResultTable
+
+    python benchmarks/bench_results.py [--rows 500 50000] [--distinct-headlines 2000]
+
+Builds the same synthetic result rows both ways and reports the memory
+held (tracemalloc) and the time to produce a DataFrame, and checks that
+both give the same CSV. Sample headlines are drawn from a pool, as they
+repeat across tickers and runs in practice; each row gets its own string
+objects, like headlines freshly parsed from a response.
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from sp500_results import ResultTable
+
+SECTORS = ('Information Technology', 'Health Care', 'Financials', 'Consumer Discretionary',
+           'Communication Services', 'Industrials', 'Consumer Staples', 'Energy', 'Utilities',
+           'Real Estate', 'Materials')
+
+
+def make_rows(count, distinct_headlines, seed=0):
+    rng = random.Random(seed)
+    pool = [f"Company {i} shares move after analysts revise their outlook ({i})" for i in range(distinct_headlines)]
+    rows = []
+    for i in range(count):
+        compound = rng.uniform(-1, 1)
+        rows.append({
+            'ticker': f"T{i:05d}",
+            'company': f"Company {i} Inc.",
+            'sector': SECTORS[i % len(SECTORS)],
+            'prediction_score': compound * 100,
+            'sentiment_compound': compound,
+            'sentiment_pos': rng.random(),
+            'sentiment_neg': rng.random(),
+            'sentiment_neu': rng.random(),
+            'headlines_count': 10,
+            # ''.join(...) makes a new string object, as parsing a response would
+            'sample_headlines': [''.join(rng.choice(pool)) for _ in range(3)],
+            'scored_at': 1.7e9 + i,
+            'fresh': True,
+        })
+    return rows
+
+
+def held_bytes(build):
+    """(result, bytes still allocated by `build()` once it returns)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[500, 50000])
+    parser.add_argument('--distinct-headlines', type=int, default=2000)
+    args = parser.parse_args()
+
+    import numpy  # noqa: F401 - keep NumPy's own import out of the measurement
+
+    print(f"{'rows':>7} {'layout':<12} {'memory':>10} {'per row':>9} {'to DataFrame':>13}")
+    for count in args.rows:
+        dicts, dict_bytes = held_bytes(lambda: make_rows(count, args.distinct_headlines))
+        # Rows are transient when building the table: only what it keeps counts
+        table, table_bytes = held_bytes(lambda: ResultTable.from_rows(make_rows(count, args.distinct_headlines)))
+
+        frame_seconds = {}
+        start = time.perf_counter()
+        dict_frame = pd.DataFrame(dicts)
+        frame_seconds['dicts'] = time.perf_counter() - start
+        start = time.perf_counter()
+        table_frame = table.to_pandas()
+        frame_seconds['ResultTable'] = time.perf_counter() - start
+
+        for layout, size in (('dicts', dict_bytes), ('ResultTable', table_bytes)):
+            print(f"{count:>7} {layout:<12} {size / 2 ** 20:>8.2f}MB {size / count:>8.0f}B "
+                  f"{frame_seconds[layout] * 1000:>11.1f}ms")
+
+        same = dict_frame.to_csv(index=False) == table_frame.to_csv(index=False)
+        print(f"{'':>7} {'saving':<12} {1 - table_bytes / dict_bytes:>10.0%}  CSV {'identical' if same else 'DIFFERENT'}")
+
+
+if __name__ == '__main__':
+    main()
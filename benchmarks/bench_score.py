@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test: /api/score throughput vs. micro-batch settings
+
+    python benchmarks/bench_score.py [--windows 1:0 16:2 256:2 256:5 256:20] [--texts 5] [--clients 2x8]
+
+Serves sp500_fast.app on a local threaded server and posts requests of
+`--texts` synthetic headlines from client processes (processes x threads)
+for `--duration` seconds per setting. Each setting is max batch
+texts:max wait ms (1:0 scores every request on its own). Reports request
+and text rates, client-side latency, 429 responses and the mean batch size.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from bench_scoring import SUBJECTS, VERBS, TAILS
+
+
+class QuietHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def client(url, texts, duration, threads, seed, results):
+    def loop(thread):
+        rng = random.Random(seed * 1000 + thread)
+        session = requests.Session()
+        latencies, rejected = [], 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            # Mostly unique texts, so the score cache does not answer them
+            body = {'texts': [f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(TAILS)} "
+                              f"(item {rng.getrandbits(40)})" for _ in range(texts)]}
+            start = time.perf_counter()
+            response = session.post(url, json=body)
+            if response.status_code == 429:
+                rejected += 1
+                time.sleep(0.01)
+                continue
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        results.append((latencies, rejected))
+
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--windows', nargs='+', default=['1:0', '16:2', '256:2', '256:5', '256:20'],
+                        help="max batch texts:max wait ms per setting")
+    parser.add_argument('--texts', type=int, default=5, help="texts per request")
+    parser.add_argument('--clients', default='2x8', help="client processes x threads per process")
+    parser.add_argument('--processes', type=int, default=1, help="scoring processes (0: score in-process)")
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+    processes, threads = (int(n) for n in args.clients.split('x'))
+
+    os.environ['SP500_RESULTS_DB'] = os.path.join(tempfile.mkdtemp(), 'results.db')
+    import sp500_fast
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    from sp500_batcher import MicroBatcher, MAX_QUEUE
+
+    server = make_server('127.0.0.1', 0, sp500_fast.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/api/score'
+    analyzer = SentimentIntensityAnalyzer()
+
+    print(f"{args.texts} texts per request, {processes}x{threads} clients, {args.processes} scoring processes, "
+          f"{args.duration:.0f}s per setting, {os.cpu_count()} cores")
+    print(f"{'batch:wait':<11} {'req/s':>7} {'texts/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'429s':>5} {'mean batch':>11}")
+    for window in args.windows:
+        max_batch, max_wait = window.split(':')
+        batcher = MicroBatcher(analyzer, max_batch=int(max_batch), max_wait=float(max_wait) / 1000,
+                               max_queue=MAX_QUEUE, processes=args.processes).start()
+        sp500_fast.batcher, sp500_fast.batcher_pid = batcher, os.getpid()
+
+        with multiprocessing.Manager() as manager:
+            results = manager.list()
+            started = time.perf_counter()
+            pool = [multiprocessing.Process(target=client, args=(url, args.texts, args.duration, threads, i, results))
+                    for i in range(processes)]
+            for process in pool:
+                process.start()
+            for process in pool:
+                process.join()
+            elapsed = time.perf_counter() - started
+            results = list(results)
+
+        batcher.close()
+        latencies = [seconds for thread_latencies, rejected in results for seconds in thread_latencies]
+        rejected = sum(rejected for thread_latencies, rejected in results)
+        batches = batcher.stats['batches']
+        print(f"{window:<11} {len(latencies) / elapsed:>7.0f} {len(latencies) * args.texts / elapsed:>8.0f} "
+              f"{percentile(latencies, 50) * 1000:>7.1f} {percentile(latencies, 99) * 1000:>7.1f} {rejected:>5} "
+              f"{batcher.stats['texts'] / batches if batches else 0:>11.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
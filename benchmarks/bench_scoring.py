@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: per-ticker analyze_sentiment loop vs. batch scoring engine
+
+    python benchmarks/bench_scoring.py [--sizes 10000 100000] [--processes N]
+
+Generates synthetic headlines spread over 500 tickers, scores them with the
+current per-ticker path and with sp500_scoring, and checks that the
+per-ticker averages are identical.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from sp500_scoring import SCORE_FIELDS, score_headline_sets
+
+TICKERS = 500
+
+SUBJECTS = ['Shares', 'Revenue', 'Guidance', 'Margins', 'Demand', 'Outlook', 'Earnings', 'Sales']
+VERBS = ['surge', 'slump', 'beat expectations', 'miss estimates', 'hold steady', 'disappoint',
+         'impress analysts', 'fall sharply', 'rise strongly', 'stall']
+TAILS = ['amid strong demand', 'after weak quarter', 'on regulatory concerns', 'as investors cheer',
+         'despite supply chain issues', 'following upgrade', 'after downgrade', 'in volatile trading']
+
+
+def make_headline_sets(size, seed=0):
+    """`size` mostly-unique headlines split evenly over TICKERS tickers"""
+    rng = random.Random(seed)
+    sets = [[] for _ in range(TICKERS)]
+    for i in range(size):
+        headline = f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(TAILS)} (item {i})"
+        sets[i % TICKERS].append(headline)
+    return sets
+
+
+def loop_path(analyzer, headline_sets):
+    """The analyze_sentiment accumulation, one ticker at a time"""
+    results = []
+    for texts in headline_sets:
+        total = {key: 0 for key in SCORE_FIELDS}
+        for text in texts:
+            scores = analyzer.polarity_scores(text)
+            for key in total:
+                total[key] += scores[key]
+        results.append([total[key] / len(texts) for key in SCORE_FIELDS])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--processes', type=int, default=None, help='default: all cores')
+    args = parser.parse_args()
+
+    analyzer = SentimentIntensityAnalyzer()
+    print(f"cores: {os.cpu_count()}, processes: {args.processes or os.cpu_count()}")
+    print(f"{'headlines':>10} {'loop (s)':>10} {'batch (s)':>10} {'speedup':>8}  identical")
+
+    for size in args.sizes:
+        headline_sets = make_headline_sets(size)
+
+        start = time.perf_counter()
+        expected = loop_path(analyzer, headline_sets)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        means, counts = score_headline_sets(headline_sets, analyzer, processes=args.processes)
+        batch_time = time.perf_counter() - start
+
+        identical = means.tolist() == expected
+        print(f"{size:>10} {loop_time:>10.2f} {batch_time:>10.2f} {loop_time / batch_time:>7.2f}x  {identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: fixed vs adaptive news source order with one source timing out
+
+    python benchmarks/bench_sources.py [--tickers 100] [--workers 8] [--dead-source rss]
+                                       [--request-timeout 1] [--latency-ms 50]
+
+Serves benchmarks/fakes.FakeNewsServer in a child process with every
+request to --dead-source delayed past the analyzer's request timeout,
+and a fake yfinance with no news, so each ticker needs the remaining
+source. The same tickers are analyzed once trying sources in the fixed
+order and once with sp500_sources.SourceSelector (adaptive order and
+circuit breakers); each reports wall time and per-ticker latency.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeYFinance
+from bench_pipeline import serve, run_once
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--dead-source', choices=['rss', 'scrape'], default='rss')
+    parser.add_argument('--request-timeout', type=float, default=1.0, help="analyzer HTTP timeout in s (default: 1)")
+    parser.add_argument('--latency-ms', type=float, default=50, help="latency of the working source (default: 50)")
+    args = parser.parse_args()
+
+    FakeYFinance(news_rate=0.0, latency=0.005).install()
+
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, daemon=True, args=({
+        'latency': args.latency_ms / 1000, 'etag': False,
+        'source_latency': {args.dead_source: args.request_timeout * 30},
+    }, child))
+    server.start()
+    _, rss_url, quote_news_url = parent.recv()
+
+    from sp500_sentiment_analyzer import SP500SentimentAnalyzer
+    from sp500_sources import SourceSelector
+
+    companies = [{'ticker': f"T{i:04d}", 'name': f"Test Company {i}"} for i in range(args.tickers)]
+    results = {}
+    try:
+        for label, adaptive in (('fixed order', False), ('adaptive', True)):
+            analyzer = SP500SentimentAnalyzer(
+                workers=args.workers, rate_limit=None, rss_url=rss_url, quote_news_url=quote_news_url,
+                request_timeout=args.request_timeout,
+                sources=SourceSelector(SP500SentimentAnalyzer.SOURCES, adaptive=adaptive))
+            results[label] = result = run_once(analyzer, companies)
+            print(f"{label:<12} {result['wall_seconds']:>7.2f}s  {result['tickers_per_second']:>7.1f} tickers/s  "
+                  f"p50/p95 {result['latency_ms']['p50']:.0f}/{result['latency_ms']['p95']:.0f} ms  "
+                  f"{analyzer.sources.summary()}")
+    finally:
+        server.terminate()
+
+    fixed, adaptive = results['fixed order']['wall_seconds'], results['adaptive']['wall_seconds']
+    print(f"\nadaptive saves {fixed - adaptive:.2f}s ({(fixed - adaptive) / fixed:.0%}) "
+          f"with {args.dead_source} timing out after {args.request_timeout:g}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: import time and time-to-first-fetch of sp500_sentiment_analyzer
+
+    python benchmarks/bench_startup.py [--baseline REV] [--runs 5]
+
+Runs the working tree and a baseline git revision (default: the first
+commit) in fresh interpreters under -X importtime. Time-to-first-fetch is
+the wall time from spawning the interpreter until the first call to
+search_company_news, i.e. everything paid before any network work starts.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import sys, time, os
+sys.path.insert(0, os.getcwd())
+import sp500_sentiment_analyzer as m
+
+def first_fetch(self, company_name, ticker):
+    print(f"FIRST_FETCH {time.time()}", flush=True)
+    os._exit(0)
+
+m.SP500SentimentAnalyzer.search_company_news = first_fetch
+analyzer = m.SP500SentimentAnalyzer()
+analyzer.fetch_sp500_list()
+analyzer.analyze_all_companies(1)
+'''
+
+
+def measure(directory):
+    """(time-to-first-fetch s, analyzer import time s, its heaviest direct imports) for one run"""
+    start = time.time()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=directory,
+                            capture_output=True, text=True)
+    first_fetch = next(float(line.split()[1]) for line in result.stdout.splitlines()
+                       if line.startswith('FIRST_FETCH'))
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative) / 1e6, name.rstrip()))
+
+    analyzer_import = next(seconds for seconds, name in imports if name.strip() == 'sp500_sentiment_analyzer')
+    # Direct imports of the analyzer module (one indentation level below it)
+    direct = [entry for entry in imports if entry[1].startswith('   ') and not entry[1].startswith('     ')]
+    heaviest = sorted(direct, reverse=True)[:5]
+    return first_fetch - start, analyzer_import, heaviest
+
+
+def baseline_tree(revision, directory):
+    """Extract `revision` of the repository into `directory`"""
+    archive = subprocess.run(['git', 'archive', revision], cwd=ROOT, capture_output=True, check=True)
+    subprocess.run(['tar', '-x', '-C', directory], input=archive.stdout, check=True)
+
+
+def report(label, directory, runs):
+    samples = [measure(directory) for _ in range(runs)]
+    first_fetch = statistics.median(sample[0] for sample in samples)
+    import_time = statistics.median(sample[1] for sample in samples)
+    print(f"\n{label}: time-to-first-fetch {first_fetch:.3f}s, import sp500_sentiment_analyzer {import_time:.3f}s")
+    for seconds, name in samples[-1][2]:
+        print(f"    {seconds:7.3f}s  {name.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default=None, help='git revision to compare against (default: first commit)')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = args.baseline or subprocess.run(
+        ['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.split()[0]
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline_tree(baseline, directory)
+        report(f"before ({baseline[:10]})", directory, args.runs)
+    report("after (working tree)", ROOT, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline stand-ins for the news sources, for benchmarks
+
+FakeNewsServer serves deterministic RSS feeds and quote news pages for any
+ticker with configurable latency, error rate and ETag/304 behaviour.
+FakeYFinance replaces the yfinance module. Neither touches the network.
+
+    python benchmarks/fakes.py --port 8000 --latency-ms 50
+    # RSS:   http://127.0.0.1:8000/rss?s=AAPL
+    # Page:  http://127.0.0.1:8000/quote/AAPL/news
+    # Stats: http://127.0.0.1:8000/stats
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Headline templates with a spread of VADER sentiment
+TEMPLATES = (
+    "{name} shares soar after record quarterly earnings",
+    "{ticker} beats analyst expectations on strong demand",
+    "Investors cheer {name} product launch",
+    "{name} stock plunges on disappointing guidance",
+    "{ticker} faces lawsuit over accounting concerns",
+    "Analysts downgrade {name} amid weak sales",
+    "{name} announces leadership transition",
+    "{ticker} trades flat ahead of earnings report",
+    "{name} expands partnership to accelerate growth",
+    "Regulators probe {name} business practices",
+    "{ticker} dividend raised for the tenth straight year",
+    "{name} cuts jobs as restructuring continues",
+)
+
+
+def ticker_seed(ticker, version=0):
+    return int(hashlib.md5(f"{ticker}:{version}".encode()).hexdigest()[:8], 16)
+
+
+def headlines_for(ticker, version=0, count=12):
+    """Deterministic headlines for one ticker (a new set per version)"""
+    rng = random.Random(ticker_seed(ticker, version))
+    return [rng.choice(TEMPLATES).format(ticker=ticker, name=f"{ticker} Corp") + f" ({version}.{i})"
+            for i in range(count)]
+
+
+def rss_fixture(ticker, version=0, items=20):
+    entries = ''.join(
+        f"<item><title>{title}</title><link>https://example.com/{ticker}/{i}</link>"
+        f"<description>{'Market coverage and analysis. ' * 6}</description>"
+        f"<pubDate>Mon, 06 Jan 2025 12:{i:02d}:00 +0000</pubDate></item>"
+        for i, title in enumerate(headlines_for(ticker, version, items))
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f'<title>Yahoo! Finance: {ticker} News</title>{entries}</channel></rss>').encode('utf-8')
+
+
+def quote_page_fixture(ticker, version=0, stories=15):
+    stream = ''.join(
+        f'<li><h3 class="Mb(5px)"><a data-test-locator="stream-item-title" href="/n/{i}">{title}</a></h3>'
+        f'<p>{"Summary of the story. " * 5}</p></li>'
+        for i, title in enumerate(headlines_for(ticker, version, stories))
+    )
+    return (f'<!DOCTYPE html><html><head><title>{ticker} news</title><script>{"var x=1;" * 500}</script>'
+            f'</head><body><ul>{stream}</ul><footer>{"<div>Related quotes</div>" * 2000}</footer>'
+            f'</body></html>').encode('utf-8')
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading a streamed body early reset the connection
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeNewsServer:
+    """
+    Local HTTP server for the RSS (/rss?s=TICKER) and quote page
+    (/quote/TICKER/news) sources.
+
+    latency: seconds added to every response, plus up to `jitter` more;
+    `source_latency` overrides it per source ('rss' or 'scrape').
+    error_rate: share of requests answered with a 500.
+    etag: send ETags and answer If-None-Match with 304.
+    change_rate: chance that a ticker has new headlines on a request,
+    which changes its ETag.
+    compress: gzip 200 bodies for clients that accept it, as the real
+    sources do.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, source_latency=None,
+                 error_rate=0.0, etag=True, change_rate=0.0, compress=False, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.source_latency = dict(source_latency or {})
+        self.error_rate = error_rate
+        self.etag = etag
+        self.change_rate = change_rate
+        self.compress = compress
+        self.random = random.Random(seed)
+        self.versions = {}
+        self.stats = {'requests': 0, 'ok': 0, 'not_modified': 0, 'errors': 0, 'bytes': 0}
+        self.lock = threading.Lock()
+        self.server = QuietServer((host, port), self.handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def rss_url(self):
+        """Format string for SP500SentimentAnalyzer(rss_url=...)"""
+        return self.base_url + "/rss?s={ticker}"
+
+    @property
+    def quote_news_url(self):
+        return self.base_url + "/quote/{ticker}/news"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, source, ticker, if_none_match, accept_encoding=''):
+        """(status, headers, body) for one request"""
+        with self.lock:
+            self.stats['requests'] += 1
+            error = self.random.random() < self.error_rate
+            key = (source, ticker)
+            if self.random.random() < self.change_rate:
+                self.versions[key] = self.versions.get(key, 0) + 1
+            version = self.versions.get(key, 0)
+            delay = self.source_latency.get(source, self.latency) + self.random.random() * self.jitter
+
+        if delay:
+            time.sleep(delay)
+
+        if error:
+            status, headers, body = 500, {}, b'internal error'
+        else:
+            tag = f'"{source}-{ticker}-{version}"'
+            headers = {'ETag': tag} if self.etag else {}
+            if self.etag and if_none_match == tag:
+                status, body = 304, b''
+            else:
+                fixture = rss_fixture if source == 'rss' else quote_page_fixture
+                status, body = 200, fixture(ticker, version)
+                if self.compress and 'gzip' in accept_encoding:
+                    headers['Content-Encoding'] = 'gzip'
+                    body = gzip.compress(body)
+            headers['Content-Type'] = 'application/rss+xml' if source == 'rss' else 'text/html; charset=utf-8'
+
+        with self.lock:
+            self.stats[{200: 'ok', 304: 'not_modified'}.get(status, 'errors')] += 1
+            self.stats['bytes'] += len(body)
+        return status, headers, body
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                parts = url.path.strip('/').split('/')
+                if url.path == '/stats':
+                    with fake.lock:
+                        status, headers, body = 200, {'Content-Type': 'application/json'}, json.dumps(fake.stats).encode()
+                elif url.path == '/rss' and 's' in parse_qs(url.query):
+                    status, headers, body = fake.respond('rss', parse_qs(url.query)['s'][0], self.headers.get('If-None-Match'),
+                                                           self.headers.get('Accept-Encoding', ''))
+                elif len(parts) == 3 and parts[0] == 'quote' and parts[2] == 'news':
+                    status, headers, body = fake.respond('scrape', parts[1], self.headers.get('If-None-Match'),
+                                                           self.headers.get('Accept-Encoding', ''))
+                else:
+                    status, headers, body = 404, {}, b'not found'
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class FakeYFinance:
+    """
+    Replacement for the yfinance module: Ticker(symbol).news returns
+    deterministic articles for `news_rate` of tickers (an empty list for
+    the rest, so the analyzer falls through to RSS), after `latency` s.
+    Tickers("A B C").tickers maps each symbol to a Ticker, as in yfinance.
+    """
+
+    def __init__(self, news_rate=0.0, latency=0.0, articles=10):
+        self.news_rate = news_rate
+        self.latency = latency
+        self.articles = articles
+        self.calls = 0
+        self.batches = 0
+        self.lock = threading.Lock()
+
+    def news(self, ticker):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if ticker_seed(ticker) % 1000 >= self.news_rate * 1000:
+            return []
+        return [{'title': title} for title in headlines_for(ticker, count=self.articles)]
+
+    def module(self):
+        fake = self
+
+        class Ticker:
+            def __init__(self, ticker):
+                self.ticker = ticker
+
+            @property
+            def news(self):
+                return fake.news(self.ticker)
+
+        class Tickers:
+            def __init__(self, tickers):
+                with fake.lock:
+                    fake.batches += 1
+                symbols = tickers.replace(',', ' ').split() if isinstance(tickers, str) else tickers
+                self.symbols = [symbol.upper() for symbol in symbols]
+                self.tickers = {symbol: Ticker(symbol) for symbol in self.symbols}
+
+        module = types.ModuleType('yfinance')
+        module.Ticker = Ticker
+        module.Tickers = Tickers
+        return module
+
+    def install(self):
+        """Make `import yfinance` return this fake"""
+        sys.modules['yfinance'] = self.module()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake RSS and quote pages locally")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--change-rate', type=float, default=0)
+    parser.add_argument('--no-etag', action='store_true')
+    parser.add_argument('--gzip', action='store_true', help="gzip bodies for clients that accept it")
+    args = parser.parse_args()
+
+    server = FakeNewsServer(port=args.port, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                            error_rate=args.error_rate, etag=not args.no_etag, change_rate=args.change_rate,
+                            compress=args.gzip)
+    print(f"Serving {server.rss_url} and {server.quote_news_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-batched sentiment scoring for the S&P 500 Sentiment Analyzer
+Coalesces the texts of concurrent /api/score requests into batches (up to
+a maximum size or a maximum wait) and scores each batch in one call to a
+pool of VADER processes shared by every request thread.
+"""
+
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from sp500_scoring import SCORE_FIELDS, init_worker, score_chunk
+
+# A batch closes at MAX_BATCH texts, or MAX_WAIT seconds after its oldest
+# request was queued
+MAX_BATCH = 256
+MAX_WAIT = 0.005
+
+# Texts waiting for a batch, over all requests, before submit() refuses more
+MAX_QUEUE = 10000
+
+# Scoring processes; with 0 batches are scored in the batcher's own thread,
+# which holds this process's GIL while it scores
+PROCESSES = 1
+
+# The pool starts inside multi-threaded web workers, where fork() can copy a
+# lock another thread holds into the child; forkserver children are forked
+# from a clean single-threaded server process instead (spawn where missing)
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# VADER's usual compound thresholds for counting positive and negative texts
+POSITIVE = 0.05
+NEGATIVE = -0.05
+
+
+class QueueFull(Exception):
+    """The batcher's queue has no room for a request's texts"""
+
+
+def aggregate(scores):
+    """Mean scores over a request's texts, as analyze_sentiment returns them, plus label counts"""
+    count = len(scores)
+    if not count:
+        return {'compound': 0.0, 'pos': 0.0, 'neu': 0.5, 'neg': 0.0, 'text_count': 0,
+                'positive': 0, 'negative': 0, 'neutral': 0}
+
+    summary = {field: sum(row[field] for row in scores) / count for field in SCORE_FIELDS}
+    summary['text_count'] = count
+    summary['positive'] = sum(1 for row in scores if row['compound'] >= POSITIVE)
+    summary['negative'] = sum(1 for row in scores if row['compound'] <= NEGATIVE)
+    summary['neutral'] = count - summary['positive'] - summary['negative']
+    return summary
+
+
+class MicroBatcher:
+    """
+    Shared scoring queue for one process.
+
+    submit() queues a request's texts and returns a Future for their
+    scores (a dict per text, in order). A collector thread waits for a free
+    scoring process, then takes queued requests, oldest first, until the
+    batch holds max_batch texts or the oldest has waited max_wait seconds.
+    While every process is busy requests pile up, so batches grow with
+    load. A request larger than max_batch is a batch of its own. Texts
+    repeated within a batch are scored once, and a ScoreCache, if given,
+    is checked first and filled after.
+    """
+
+    def __init__(self, analyzer, cache=None, max_batch=MAX_BATCH, max_wait=MAX_WAIT,
+                 max_queue=MAX_QUEUE, processes=PROCESSES, metrics=None):
+        self.analyzer = analyzer
+        self.cache = cache
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.processes = processes
+        self.metrics = metrics
+
+        self.queue = deque()  # (texts, future, time queued)
+        self.queued = 0       # texts in the queue
+        self.closed = False
+        self.condition = threading.Condition()
+        self.slots = threading.Semaphore(max(processes, 1))
+        self.executor = None
+        self.thread = None
+        self.stats = {'requests': 0, 'texts': 0, 'batches': 0, 'scored': 0, 'rejected': 0}
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.processes:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=init_worker,
+                                                initargs=(self.analyzer.lexicon, self.analyzer.emojis),
+                                                mp_context=multiprocessing.get_context(START_METHOD))
+        self.thread = threading.Thread(target=self.collect, name='sp500-score-batcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        """Score what is queued, then stop the collector and the pool"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def submit(self, texts):
+        """Queue `texts` for scoring; raises QueueFull if the queue has no room"""
+        texts = list(texts)
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('batcher is closed')
+            full = self.queued and self.queued + len(texts) > self.max_queue
+            if not full:
+                self.queue.append((texts, future, time.perf_counter()))
+                self.queued += len(texts)
+                self.condition.notify()
+            waiting = self.queued
+
+        with self.lock:
+            self.stats['rejected' if full else 'requests'] += 1
+        if full:
+            self.count('api_score_rejected')
+            raise QueueFull(f"{waiting} texts are waiting to be scored")
+        return future
+
+    def score(self, texts, timeout=None):
+        """Scores of `texts`, waiting at most `timeout` seconds"""
+        return self.submit(texts).result(timeout)
+
+    # Collector
+
+    def collect(self):
+        while True:
+            self.slots.acquire()
+            batch = self.next_batch()
+            if batch is None:
+                self.slots.release()
+                return
+            try:
+                self.dispatch(batch)
+            except Exception as e:
+                self.slots.release()
+                for texts, future, queued in batch:
+                    future.set_exception(e)
+
+    def next_batch(self):
+        """The next batch of queued requests, or None once closed and drained"""
+        with self.condition:
+            while not self.queue and not self.closed:
+                self.condition.wait()
+            if not self.queue:
+                return None
+
+            deadline = self.queue[0][2] + self.max_wait
+            while self.queued < self.max_batch and not self.closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = [self.queue.popleft()]
+            size = len(batch[0][0])
+            while self.queue and size + len(self.queue[0][0]) <= self.max_batch:
+                batch.append(self.queue.popleft())
+                size += len(batch[-1][0])
+            self.queued -= size
+
+        if self.metrics is not None:
+            self.metrics.observe('api_score_wait', time.perf_counter() - batch[0][2])
+        return batch
+
+    def dispatch(self, batch):
+        """Score a batch's uncached texts in the pool (or here) and answer its requests"""
+        unique = list(dict.fromkeys(text for texts, future, queued in batch for text in texts))
+        scores = {}
+        missing = []
+        for text in unique:
+            cached = self.cache.lookup(text) if self.cache is not None else None
+            if cached is None:
+                missing.append(text)
+            else:
+                scores[text] = cached
+
+        started = time.perf_counter()
+        if not missing:
+            self.finish(batch, scores, missing, None, started)
+        elif self.executor is None:
+            self.finish(batch, scores, missing, score_chunk(missing, self.analyzer), started)
+        else:
+            pending = self.executor.submit(score_chunk, missing)
+            pending.add_done_callback(lambda done: self.finish(batch, scores, missing, done, started))
+
+    def finish(self, batch, scores, missing, computed, started):
+        self.slots.release()
+        try:
+            if isinstance(computed, Future):
+                computed = computed.result()
+            for text, row in zip(missing, computed.tolist() if computed is not None else ()):
+                scores[text] = dict(zip(SCORE_FIELDS, row))
+                if self.cache is not None:
+                    self.cache.store(text, scores[text])
+        except Exception as e:
+            for texts, future, queued in batch:
+                future.set_exception(e)
+            return
+
+        size = sum(len(texts) for texts, future, queued in batch)
+        with self.lock:
+            self.stats['batches'] += 1
+            self.stats['texts'] += size
+            self.stats['scored'] += len(missing)
+        if self.metrics is not None:
+            self.metrics.observe('api_score', time.perf_counter() - started)
+            self.count('api_score_batches')
+            self.count('api_score_texts', size)
+
+        for texts, future, queued in batch:
+            future.set_result([scores[text] for text in texts])
+
+    def count(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.increment(name, amount)
+
+    def summary(self):
+        """One-line report of the batches scored so far"""
+        with self.lock:
+            stats = dict(self.stats)
+        mean = stats['texts'] / stats['batches'] if stats['batches'] else 0.0
+        return (f"Scoring: {stats['requests']} requests, {stats['texts']} texts in {stats['batches']} batches "
+                f"(mean {mean:.1f} texts, {stats['scored']} scored by VADER), {stats['rejected']} rejected")
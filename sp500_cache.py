@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caches for the S&P 500 Sentiment Analyzer
+Persistent headline cache shared between the analyzer and the dashboard,
+and a memoizing wrapper around VADER scoring.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+
+HEADLINE_CACHE_PATH = 'sp500_headlines.db'
+
+# Seconds a cached headline list stays fresh, per source
+DEFAULT_TTL = {
+    'yfinance': 15 * 60,
+    'rss': 15 * 60,
+    'scrape': 30 * 60,
+}
+
+
+class HeadlineCache:
+    """
+    On-disk headline cache keyed by (ticker, source), stored in SQLite
+    (WAL mode, so the web app can read while an analysis run writes).
+
+    - ttl: seconds per source before an entry is stale (see DEFAULT_TTL)
+    - max_entries: size cap, least recently used entries are evicted first
+    - stale_while_revalidate: serve stale headlines immediately and refresh
+      them on a background thread instead of blocking the caller
+    """
+
+    def __init__(self, path=HEADLINE_CACHE_PATH, ttl=None, max_entries=5000,
+                 stale_while_revalidate=False, refresh_workers=2):
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self.refresh_workers = refresh_workers
+
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evicted': 0}
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.executor = None
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS headlines (
+                ticker TEXT NOT NULL,
+                source TEXT NOT NULL,
+                headlines TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (ticker, source)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS headlines_lru ON headlines (accessed_at)')
+        self.conn.commit()
+
+    def get(self, ticker, source):
+        """Return (headlines, fetched_at) for a cached entry, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT headlines, fetched_at FROM headlines WHERE ticker = ? AND source = ?',
+                (ticker, source)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute(
+                'UPDATE headlines SET accessed_at = ? WHERE ticker = ? AND source = ?',
+                (time.time(), ticker, source)
+            )
+            self.conn.commit()
+
+        return json.loads(row[0]), row[1]
+
+    def put(self, ticker, source, headlines):
+        """Store a headline list and evict the least recently used overflow"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO headlines VALUES (?, ?, ?, ?, ?)',
+                (ticker, source, json.dumps(headlines), now, now)
+            )
+
+            overflow = self.conn.execute('SELECT COUNT(*) FROM headlines').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self.conn.execute(
+                    'DELETE FROM headlines WHERE rowid IN '
+                    '(SELECT rowid FROM headlines ORDER BY accessed_at LIMIT ?)',
+                    (overflow,)
+                )
+                self.stats['evicted'] += overflow
+
+            self.conn.commit()
+
+    def fresh_tickers(self, source):
+        """Tickers with an entry for `source` that has not expired yet"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT ticker FROM headlines WHERE source = ? AND fetched_at > ?',
+                (source, time.time() - self.ttl.get(source, 0))
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def latest(self, ticker):
+        """Most recently fetched non-empty entry for a ticker, across sources"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT source, headlines, fetched_at FROM headlines "
+                "WHERE ticker = ? AND headlines != '[]' ORDER BY fetched_at DESC LIMIT 1",
+                (ticker,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {'ticker': ticker, 'source': row[0], 'headlines': json.loads(row[1]), 'fetched_at': row[2]}
+
+    def get_or_fetch(self, ticker, source, fetch):
+        """
+        Return cached headlines for (ticker, source) if fresh, otherwise call
+        `fetch()` and cache its result. Empty lists are cached too, so a
+        source with no news is not asked again until the entry expires;
+        a None result (fetch failed) is never cached.
+        """
+        entry = self.get(ticker, source)
+
+        if entry is not None:
+            headlines, fetched_at = entry
+            if time.time() - fetched_at < self.ttl.get(source, 0):
+                self.count('hits')
+                return headlines
+
+            if self.stale_while_revalidate:
+                self.count('stale')
+                self.refresh_in_background(ticker, source, fetch)
+                return headlines
+
+        self.count('misses')
+        headlines = fetch()
+        if headlines is not None:
+            self.put(ticker, source, headlines)
+
+        return headlines
+
+    def refresh_in_background(self, ticker, source, fetch):
+        """Re-fetch an entry on the refresh pool unless already in flight"""
+        key = (ticker, source)
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.refresh_workers)
+
+        def refresh():
+            try:
+                headlines = fetch()
+                if headlines is not None:
+                    self.put(ticker, source, headlines)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        self.executor.submit(refresh)
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def summary(self):
+        """One-line cache report for the end of a run"""
+        with self.lock:
+            stats = dict(self.stats)
+        return (f"Headline cache: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['stale']} served stale, {stats['evicted']} evicted")
+
+    def close(self):
+        """Wait for background refreshes and close the database"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.conn.close()
+
+
+class ScoreCache:
+    """
+    Memoized VADER polarity scores keyed by a hash of the normalized text.
+
+    An in-memory LRU tier (max_size entries) sits in front of an optional
+    SQLite tier at `path`. Both are tagged with a fingerprint of the
+    vaderSentiment version and lexicon and are cleared when it changes.
+    """
+
+    def __init__(self, analyzer, max_size=10000, path=None):
+        self.analyzer = analyzer
+        self.max_size = max_size
+        self.path = path
+
+        self.memory = OrderedDict()
+        self.pending = {}  # scores not yet written to the persistent tier
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+        self.lock = threading.Lock()
+        self.version = self.analyzer_version()
+
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS scores (
+                    key TEXT PRIMARY KEY,
+                    compound REAL, pos REAL, neu REAL, neg REAL
+                )
+            ''')
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != self.version:
+                self.reset_persistent()
+
+    def analyzer_version(self):
+        """Fingerprint of the vaderSentiment release plus the loaded lexicon"""
+        digest = hashlib.sha1(metadata.version('vaderSentiment').encode())
+        for table in (self.analyzer.lexicon, self.analyzer.emojis):
+            for word, value in sorted(table.items()):
+                digest.update(f"{word}\t{value}\n".encode())
+        return digest.hexdigest()
+
+    def reset_persistent(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM scores')
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+            self.conn.commit()
+
+    def check_version(self):
+        """Drop every cached score if the analyzer or its lexicon changed"""
+        version = self.analyzer_version()
+        if version == self.version:
+            return False
+
+        self.version = version
+        with self.lock:
+            self.memory.clear()
+            self.pending.clear()
+        if self.conn is not None:
+            self.reset_persistent()
+        return True
+
+    @staticmethod
+    def key(text):
+        normalized = ' '.join(text.split())
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    def polarity_scores(self, text):
+        """Drop-in replacement for SentimentIntensityAnalyzer.polarity_scores"""
+        scores = self.lookup(text)
+        if scores is None:
+            scores = self.analyzer.polarity_scores(text)
+            self.store(text, scores)
+        return scores
+
+    def lookup(self, text):
+        """Cached scores for `text` from either tier, or None on a miss"""
+        key = self.key(text)
+
+        with self.lock:
+            scores = self.memory.get(key)
+            if scores is not None:
+                self.memory.move_to_end(key)
+                self.stats['hits'] += 1
+                return scores
+
+        if self.conn is not None:
+            with self.lock:
+                row = self.conn.execute(
+                    'SELECT compound, pos, neu, neg FROM scores WHERE key = ?', (key,)
+                ).fetchone()
+            if row is not None:
+                scores = dict(zip(('compound', 'pos', 'neu', 'neg'), row))
+                self.remember(key, scores)
+                self.count('disk_hits')
+                return scores
+
+        self.count('misses')
+        return None
+
+    def store(self, text, scores):
+        """Cache scores computed outside polarity_scores (e.g. by a batch)"""
+        self.remember(self.key(text), scores, persist=self.conn is not None)
+
+    def remember(self, key, scores, persist=False):
+        with self.lock:
+            self.memory[key] = scores
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_size:
+                self.memory.popitem(last=False)
+
+            flush = False
+            if persist:
+                self.pending[key] = scores
+                flush = len(self.pending) >= 500
+
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write newly computed scores to the persistent tier"""
+        if self.conn is None:
+            return
+
+        with self.lock:
+            rows = [(key, s['compound'], s['pos'], s['neu'], s['neg']) for key, s in self.pending.items()]
+            self.pending.clear()
+            if rows:
+                self.conn.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)', rows)
+                self.conn.commit()
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def summary(self):
+        """One-line cache report for the end of a run"""
+        with self.lock:
+            stats = dict(self.stats)
+        return (f"Score cache: {stats['hits']} hits, {stats['disk_hits']} disk hits, "
+                f"{stats['misses']} scored by VADER")
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
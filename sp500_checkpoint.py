@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run checkpoints for the S&P 500 Sentiment Analyzer
+Streams each finished ticker's result row to an append-only NDJSON file,
+so an interrupted run can resume where it stopped, and builds the final
+report and output file from that file without loading it whole.
+"""
+
+import csv
+import heapq
+import json
+import os
+import threading
+
+from sp500_ranking import rank_key
+from sp500_results import COLUMNS, OUTPUT_FORMATS
+
+CHECKPOINT_PATH = 'sp500_checkpoint.ndjson'
+CHECKPOINT_VERSION = 1
+
+
+class Checkpoint:
+    """
+    Append-only NDJSON run log. The first line is a header with the run's
+    planned tickers, then one result row per line as tickers finish (a
+    ticker written twice, e.g. re-averaged at the end of the run, keeps
+    its last row; rows flagged stale are not treated as done). Every line
+    is flushed as it is written, so a killed process loses only the
+    tickers that were still in flight; a line cut short by the kill is
+    dropped on resume.
+
+    The reporting methods mirror SP500SentimentAnalyzer's
+    (get_predictions, save_results) and read the file row by row.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+
+    def start(self, tickers, resume=False):
+        """
+        Open the checkpoint for a run of `tickers`. With resume=True and an
+        existing checkpoint, its plan is kept; returns (planned tickers,
+        set of tickers already done).
+        """
+        self.close()
+        if resume and os.path.exists(self.path):
+            self.repair()
+            header = self.header()
+            if header is not None:
+                # Stale rows carried over by a deadline-limited run are redone
+                done = {row['ticker'] for row in self.rows() if row.get('fresh', True)}
+                self.file = open(self.path, 'a', encoding='utf-8')
+                return header['tickers'], done
+            print(f"[WARNING] {self.path} has no checkpoint header, starting over")
+
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.write({'checkpoint': CHECKPOINT_VERSION, 'tickers': list(tickers)})
+        return list(tickers), set()
+
+    def append(self, row):
+        """Record one finished ticker's result row"""
+        self.write(dict(row))
+
+    def write(self, record):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def repair(self):
+        """Cut off a last line left incomplete by a killed process"""
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            # Walk back to the last newline
+            end = size
+            while end > 0:
+                step = min(65536, end)
+                f.seek(end - step)
+                chunk = f.read(step)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    end = end - step + newline + 1
+                    break
+                end -= step
+            if end != size:
+                f.truncate(end)
+                print(f"[INFO] Dropped an incomplete last line from {self.path}")
+
+    def header(self):
+        with open(self.path, encoding='utf-8') as f:
+            first = f.readline()
+        try:
+            header = json.loads(first)
+        except ValueError:
+            return None
+        return header if header.get('checkpoint') == CHECKPOINT_VERSION else None
+
+    def records(self):
+        """(byte offset, row) for every row line, in file order"""
+        with open(self.path, 'rb') as f:
+            f.readline()
+            offset = f.tell()
+            for line in f:
+                if line.endswith(b'\n'):
+                    yield offset, json.loads(line)
+                offset += len(line)
+
+    def offsets(self):
+        """ticker -> offset of its last row (only the tickers are held in memory)"""
+        return {row['ticker']: offset for offset, row in self.records()}
+
+    def rows(self):
+        """
+        Each ticker's latest row, streamed from the file in the run's planned
+        order (the order an uninterrupted run stores them in)
+        """
+        offsets = self.offsets()
+        header = self.header() or {}
+        planned = [ticker for ticker in header.get('tickers', ()) if ticker in offsets]
+        with open(self.path, 'rb') as f:
+            for ticker in dict.fromkeys(planned + list(offsets)):
+                f.seek(offsets[ticker])
+                yield json.loads(f.readline())
+
+    def __len__(self):
+        return len(self.offsets())
+
+    # Reporting, in the analyzer's interface
+
+    def get_predictions(self, k=10):
+        """Top k predicted rises and falls, keeping only 2k rows in memory"""
+        import pandas as pd
+
+        # Ordered by rank_key, as RankingIndex orders the analyzer's (falls reversed)
+        top = heapq.nsmallest(k, self.rows(), key=rank_key)
+        bottom = heapq.nlargest(k, self.rows(), key=rank_key)
+        if not top:
+            print("No results to analyze. Run analysis first.")
+            return None, None
+        return pd.DataFrame(top), pd.DataFrame(bottom)
+
+    def save_results(self, filename, fmt=None):
+        """Write every ticker's latest row as CSV, JSON or NDJSON, one row at a time"""
+        if not self.offsets():
+            print("No results to save.")
+            return False
+
+        fmt = fmt or OUTPUT_FORMATS.get(filename.rsplit('.', 1)[-1].lower(), 'csv')
+        count = 0
+        with open(filename, 'w', encoding='utf-8', newline='' if fmt == 'csv' else None) as f:
+            if fmt == 'csv':
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(COLUMNS)
+                for count, row in enumerate(self.rows(), 1):
+                    writer.writerow([row[column] for column in COLUMNS])
+            elif fmt == 'json':
+                # Same layout as json.dump(rows, indent=2)
+                f.write('[')
+                for count, row in enumerate(self.rows(), 1):
+                    f.write(',' if count > 1 else '')
+                    f.write('\n  ' + json.dumps(row, indent=2).replace('\n', '\n  '))
+                f.write('\n]')
+            else:
+                for row in self.rows():
+                    f.write(json.dumps(row) + '\n')
+
+        print(f"[OK] Results saved to {filename}")
+        return True
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headline deduplication for the S&P 500 Sentiment Analyzer
+Groups exact and near-duplicate headlines across all tickers of a run
+(normalized text, character shingles, MinHash with LSH banding), so each
+story's tickers are known. Clusters compare masked, normalized text and are
+never used as the text to score.
+"""
+
+import functools
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+# Character shingle length (bytes, so a shingle packs into one integer) and
+# MinHash signature layout: BANDS * ROWS hashes, a pair becomes a candidate
+# if any band matches (~99% of pairs at THRESHOLD, ~0.01% at 0.2)
+SHINGLE = 5
+BANDS = 10
+ROWS = 6
+
+# Shingle Jaccard similarity at which two headlines are near duplicates
+THRESHOLD = 0.85
+
+# LSH candidates whose MinHash estimate is this far below THRESHOLD are
+# dropped before the exact check (about three standard errors)
+ESTIMATE_SLACK = 0.15
+
+# Words dropped from the end of a company name when masking it
+NAME_SUFFIXES = {'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'plc', 'llc',
+                 'holdings', 'group', 'the', 'class', 'a', 'b', 'c'}
+
+NON_WORD = re.compile(r'[^0-9a-z]+')
+
+# Fixed multiply-shift hash parameters, so signatures are stable between runs
+hash_state = np.random.default_rng(20240615)
+HASH_A = hash_state.integers(1, 2 ** 63, BANDS * ROWS, dtype=np.uint64) | np.uint64(1)
+HASH_B = hash_state.integers(0, 2 ** 63, BANDS * ROWS, dtype=np.uint64)
+
+
+@functools.lru_cache(maxsize=2048)
+def name_variants(company_name):
+    """Lower-case forms of a company name to mask, longest first: as given and without suffixes"""
+    words = unicodedata.normalize('NFKC', company_name).lower().replace(',', ' ').split()
+    short = list(words)
+    while len(short) > 1 and short[-1].strip('.') in NAME_SUFFIXES:
+        short.pop()
+    variants = (' '.join(words).rstrip('.'), ' '.join(short).rstrip('.'))
+    return tuple(name for name in dict.fromkeys(variants) if len(name) >= 3)
+
+
+def replace_mentions(text, needle, case_sensitive=True, cashtag=False):
+    """Replace `needle` where it stands as a whole word (with a leading $ if `cashtag`) by 'Company'"""
+    haystack = text if case_sensitive else text.lower()
+    if len(haystack) != len(text):
+        return text  # lower() changed the length; offsets would not line up
+
+    parts, position, start = [], 0, haystack.find(needle)
+    while start != -1:
+        end = start + len(needle)
+        begin = start - 1 if start and haystack[start - 1] == '$' else start
+        before = haystack[begin - 1] if begin else ' '
+        after = haystack[end] if end < len(haystack) else ' '
+        if (not cashtag or begin < start) and not (before.isalnum() or before in '_$') \
+                and not (after.isalnum() or after == '_'):
+            parts += [text[position:begin], 'Company']
+            position = end
+        start = haystack.find(needle, end)
+    return ''.join(parts) + text[position:] if parts else text
+
+
+def mask(text, ticker=None, company_name=None):
+    """
+    Replace the ticker's own symbol (upper case, optionally as a $cashtag)
+    and company name with 'Company', so the same story or template about
+    different companies reads alike (for clustering only: masking drops name
+    words VADER may score, e.g. "Best Buy").
+    """
+    text = unicodedata.normalize('NFKC', text)
+    for name in name_variants(company_name) if company_name else ():
+        text = replace_mentions(text, name, case_sensitive=False)
+    if ticker:
+        # One-letter symbols (A, C, F, ...) only as cashtags; 'A' is usually the article
+        text = replace_mentions(text, ticker, cashtag=len(ticker) == 1)
+    return text
+
+
+def normalize(text):
+    """Lowercase and strip punctuation and extra whitespace"""
+    return ' '.join(NON_WORD.sub(' ', text.lower()).split())
+
+
+def shingles(texts):
+    """
+    Character shingles of each normalized text as a uint64 array (every
+    SHINGLE-byte window of the UTF-8 bytes packed into one integer, texts
+    shorter than that padded), computed in one pass over all texts
+    """
+    encoded = [text.encode('utf-8').ljust(SHINGLE) for text in texts]
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+    lengths = np.array([len(e) for e in encoded], dtype=np.int64)
+    counts = lengths - SHINGLE + 1
+
+    windows = np.zeros(len(data) - SHINGLE + 1, dtype=np.uint64)
+    for k in range(SHINGLE):
+        windows |= data[k:len(windows) + k] << np.uint64(8 * k)
+
+    # Keep the windows that start and end inside one text
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    positions = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts) + np.arange(counts.sum())
+    return np.split(windows[positions], np.cumsum(counts)[:-1])
+
+
+def signatures(shingle_arrays):
+    """(n, BANDS * ROWS) MinHash signatures for a list of shingle arrays"""
+    values = np.concatenate(shingle_arrays)
+    # Multiply-shift hashing; uint64 arithmetic wraps, which is the intended mod 2**64
+    with np.errstate(over='ignore'):
+        hashed = (values[:, None] * HASH_A + HASH_B) >> np.uint64(32)
+    offsets = np.concatenate(([0], np.cumsum([len(a) for a in shingle_arrays])[:-1]))
+    return np.minimum.reduceat(hashed, offsets, axis=0)
+
+
+class HeadlineDeduplicator:
+    """
+    Incremental clustering of one run's headlines, thread-safe.
+
+    add() maps each headline to a cluster: first by normalized text, then
+    by MinHash LSH candidates whose shingle Jaccard similarity is at least
+    `threshold`. Headlines are compared with their own company masked
+    (see mask()). With `protected_words` (e.g. the VADER lexicon), near
+    duplicates must also differ only in words outside that set, so stories
+    that differ in a sentiment word or a negation stay apart. A cluster
+    keeps the first masked headline seen as its text (for inspection) and
+    the set of tickers it appeared for.
+    """
+
+    def __init__(self, threshold=THRESHOLD, protected_words=None):
+        self.threshold = threshold
+        self.protected_words = protected_words or set()
+        self.texts = []        # cluster id -> representative (masked) headline
+        self.words = []        # cluster id -> normalized word set
+        self.shingles = []     # cluster id -> set of shingles
+        self.tickers = []      # cluster id -> set of tickers
+        self.by_text = {}      # normalized text -> cluster id
+        self.buckets = [{} for _ in range(BANDS)]  # band bytes -> [cluster ids]
+        self.signatures = np.empty((64, BANDS * ROWS), dtype=np.uint64)  # cluster id -> MinHash
+        self.stats = {'headlines': 0, 'exact': 0, 'near': 0}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, ticker, headlines, company_name=None):
+        """Cluster `headlines` of `ticker`; returns one cluster id per headline"""
+        if not headlines:
+            return []
+        masked = [mask(text, ticker, company_name) for text in headlines]
+        normalized = [normalize(text) for text in masked]
+
+        # MinHash only the first copy of texts not seen verbatim yet (by_text only
+        # grows, so the others are exact matches by the time they are assigned)
+        first = {}
+        with self.lock:
+            for i, norm in enumerate(normalized):
+                if norm not in self.by_text:
+                    first.setdefault(norm, i)
+        new = list(first.values())
+        bands = {}
+        if new:
+            shingle_arrays = shingles([normalized[i] for i in new])
+            signature = signatures(shingle_arrays).reshape(len(new), BANDS, ROWS)
+            bands = {i: (shingle_array, band) for i, shingle_array, band in zip(new, shingle_arrays, signature)}
+
+        ids = []
+        with self.lock:
+            for i, (text, norm) in enumerate(zip(masked, normalized)):
+                self.stats['headlines'] += 1
+                cluster = self.by_text.get(norm)
+                if cluster is not None:
+                    self.stats['exact'] += 1
+                else:
+                    shingle_array, band = bands[i]
+                    keys = [band[b].tobytes() for b in range(BANDS)]
+                    shingle_set = set(shingle_array.tolist())
+                    cluster = self.match(set(norm.split()), shingle_set, band.ravel(), keys)
+                    if cluster is not None:
+                        self.stats['near'] += 1
+                    else:
+                        cluster = self.create(text, norm, shingle_set, band.ravel(), keys)
+                    self.by_text[norm] = cluster
+                self.tickers[cluster].add(ticker)
+                ids.append(cluster)
+        return ids
+
+    def match(self, words, shingle_set, signature, keys):
+        """Best verified near-duplicate cluster among the LSH candidates"""
+        candidates = {cluster for band, key in enumerate(keys) for cluster in self.buckets[band].get(key, ())}
+        candidates = sorted(candidates)
+        if len(candidates) > 4:
+            candidates = np.array(candidates, dtype=np.int64)
+            estimates = (self.signatures[candidates] == signature).mean(axis=1)
+            candidates = candidates[estimates >= self.threshold - ESTIMATE_SLACK].tolist()
+
+        best, best_similarity = None, self.threshold
+        for cluster in candidates:
+            other = self.shingles[cluster]
+            similarity = len(shingle_set & other) / len(shingle_set | other)
+            if similarity >= best_similarity and not (words ^ self.words[cluster]) & self.protected_words:
+                best, best_similarity = cluster, similarity
+        return best
+
+    def create(self, text, norm, shingle_set, signature, keys):
+        cluster = len(self.texts)
+        if cluster == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[cluster] = signature
+        self.texts.append(text)
+        self.words.append(set(norm.split()))
+        self.shingles.append(shingle_set)
+        self.tickers.append(set())
+        for band, key in enumerate(keys):
+            self.buckets[band].setdefault(key, []).append(cluster)
+        return cluster
+
+    def text(self, cluster):
+        return self.texts[cluster]
+
+    def shared_by(self, cluster):
+        """Number of tickers a cluster's headlines appeared for"""
+        with self.lock:
+            return len(self.tickers[cluster])
+
+    def summary(self):
+        """One-line dedup report for the end of a run"""
+        with self.lock:
+            stats = dict(self.stats)
+            unique = len(self.texts)
+            shared = sum(1 for tickers in self.tickers if len(tickers) > 1)
+        duplicates = stats['headlines'] - unique
+        ratio = duplicates / stats['headlines'] if stats['headlines'] else 0.0
+        return (f"Dedup: {stats['headlines']} headlines, {unique} unique ({ratio:.0%} duplicates: "
+                f"{stats['exact']} exact, {stats['near']} near), {shared} shared by several tickers")
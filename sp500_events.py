@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server-Sent Events for the S&P 500 Sentiment Dashboard
+An in-process event broker with a replay buffer, plus SSE formatting.
+"""
+
+import collections
+import json
+import threading
+
+# Event types whose latest value is replayed to every new subscriber
+SNAPSHOT_EVENTS = ('status', 'rankings')
+
+
+class EventBroker:
+    """
+    Numbered event log shared by every /api/stream connection.
+
+    Keeps the last `history` events so a reconnecting client can resume
+    from its Last-Event-ID; clients further behind get a fresh snapshot.
+    """
+
+    def __init__(self, history=1000):
+        self.events = collections.deque(maxlen=history)
+        self.latest = {}  # event type -> (id, event, data)
+        self.last_id = 0
+        self.condition = threading.Condition()
+
+    def publish(self, event, data, only_if_changed=True):
+        """Append an event; by default skip it if its data is unchanged"""
+        with self.condition:
+            previous = self.latest.get(event)
+            if only_if_changed and previous is not None and previous[2] == data:
+                return False
+
+            self.last_id += 1
+            entry = (self.last_id, event, data)
+            self.events.append(entry)
+            self.latest[event] = entry
+            self.condition.notify_all()
+            return True
+
+    def add(self, entry):
+        """
+        Append an (id, event, data) entry numbered elsewhere, e.g. read from
+        the shared results store, so ids agree across processes
+        """
+        with self.condition:
+            if entry[0] <= self.last_id:
+                return
+            self.events.append(entry)
+            self.latest[entry[1]] = entry
+            self.last_id = entry[0]
+            self.condition.notify_all()
+
+    def seed(self, entry):
+        """Remember an older entry as the latest of its type without replaying it"""
+        with self.condition:
+            current = self.latest.get(entry[1])
+            if current is None or current[0] < entry[0]:
+                self.latest[entry[1]] = entry
+
+    def snapshot(self):
+        """Latest status and rankings events, oldest first"""
+        entries = [self.latest[event] for event in SNAPSHOT_EVENTS if event in self.latest]
+        return sorted(entries)
+
+    def replay(self, last_event_id=None):
+        """
+        Events a (re)connecting client should receive first, and the cursor
+        to continue waiting from.
+        """
+        with self.condition:
+            oldest = self.events[0][0] if self.events else self.last_id + 1
+            if last_event_id is None or last_event_id < oldest - 1 or last_event_id > self.last_id:
+                return self.snapshot(), self.last_id
+            return [entry for entry in self.events if entry[0] > last_event_id], self.last_id
+
+    def wait(self, cursor, timeout):
+        """Block up to `timeout` seconds for events after `cursor`"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_id > cursor, timeout)
+            oldest = self.events[0][0] if self.events else self.last_id + 1
+            if cursor < oldest - 1:
+                # Fell behind the replay buffer
+                return self.snapshot(), self.last_id
+            return [entry for entry in self.events if entry[0] > cursor], self.last_id
+
+
+def format_event(entry):
+    """Serialize an (id, event, data) entry in text/event-stream format"""
+    event_id, event, data = entry
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
@@ -4,9 +4,26 @@
 S&P 500 Sentiment Analysis - Fast Version with Mock Data
 """
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 import os
+import gzip
+import hashlib
+import html
+import json
+import threading
+import time
+from datetime import datetime
+from sp500_cache import HeadlineCache, HEADLINE_CACHE_PATH
+from sp500_events import EventBroker, SNAPSHOT_EVENTS, format_event
+from sp500_store import ResultsStore, RESULTS_DB_PATH
+from sp500_metrics import Metrics, profiled
+from sp500_query import QueryIndex, query_rows, PAGE_SIZE, MAX_PAGE_SIZE
+
+try:
+    import brotli  # optional: adds a br variant to precomputed responses
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
@@ -145,8 +162,8 @@ HTML_TEMPLATE = """<!DOCTYPE html>
         </header>
 
         <div class="controls">
-            <div class="status">✅ Data Updated: """ + SAMPLE_DATA['last_update'] + """</div>
-            <p style="margin-top: 10px; color: #666;">Analyzed """ + str(SAMPLE_DATA['total_companies']) + """ major S&P 500 companies</p>
+            <div class="status">✅ Data Updated: __LAST_UPDATE__</div>
+            <p style="margin-top: 10px; color: #666;">Analyzed __TOTAL_COMPANIES__ major S&P 500 companies</p>
         </div>
 
         <div class="grid">
@@ -167,7 +184,11 @@ HTML_TEMPLATE = """<!DOCTYPE html>
     </div>
 
     <script>
-        const data = """ + str(SAMPLE_DATA).replace("'", '"') + """;
+        const data = __DATA_JSON__;
+
+        function escapeHtml(text) {
+            return String(text).replace(/[&<>"']/g, c => `&#${c.charCodeAt(0)};`);
+        }
 
         function updateStockList(elementId, stocks, type) {
             const container = document.getElementById(elementId);
@@ -180,13 +201,13 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 item.innerHTML = `
                     <div class="stock-header">
                         <div>
-                            <span class="stock-ticker">${stock.ticker}</span>
+                            <span class="stock-ticker">${escapeHtml(stock.ticker)}</span>
                             <span style="color: #999; margin-left: 8px;">#${stock.rank}</span>
                         </div>
                         <span class="stock-score ${scoreClass}">${scoreSign}${stock.score}</span>
                     </div>
-                    <div class="stock-company">${stock.company}</div>
-                    <div class="stock-headline">"${stock.headline}"</div>
+                    <div class="stock-company">${escapeHtml(stock.company)}${stock.fresh === false ? " (stale: not rescored this run)" : ""}</div>
+                    <div class="stock-headline">"${escapeHtml(stock.headline)}"</div>
                 `;
                 container.appendChild(item);
             });
@@ -198,15 +219,453 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 </body>
 </html>"""
 
+def render_index(data):
+    """Fill HTML_TEMPLATE with a data snapshot"""
+    # Headlines are scraped text: escape '<' so one containing </script>
+    # cannot end the script block
+    data_json = json.dumps(data).replace('<', '\\u003c')
+    return (HTML_TEMPLATE
+            .replace('__LAST_UPDATE__', html.escape(str(data['last_update'])))
+            .replace('__TOTAL_COMPANIES__', html.escape(str(data['total_companies'])))
+            .replace('__DATA_JSON__', data_json))
+
+
+class PrecomputedResponse:
+    """
+    A response body encoded once per data version: identity, gzip and (if
+    the brotli module is installed) br variants, each with a strong ETag.
+    """
+
+    def __init__(self, body, mimetype):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+
+        digest = hashlib.sha1(body).hexdigest()
+        self.variants = {'identity': (body, f'"{digest}"')}
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9), f'"{digest}-gzip"')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body), f'"{digest}-br"')
+        self.etags = [etag for _, etag in self.variants.values()]
+
+    def respond(self):
+        """Serve the best variant for the current request, or a 304"""
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip', 'identity'):
+            if encoding in self.variants and (encoding == 'identity' or accepted[encoding]):
+                break
+        body, etag = self.variants[encoding]
+
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if any(request.if_none_match.contains(tag.strip('"')) for tag in self.etags):
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(body, mimetype=self.mimetype, headers=headers)
+
+
+# Data lives in a shared SQLite store so every gunicorn worker serves the
+# same snapshot; each process opens its own connection on first use
+store = None
+store_pid = None
+store_lock = threading.Lock()
+
+def get_store():
+    global store, store_pid
+    with store_lock:
+        if store is None or store_pid != os.getpid():
+            store = ResultsStore(os.environ.get('SP500_RESULTS_DB', RESULTS_DB_PATH))
+            store_pid = os.getpid()
+            if store.snapshot_version() == 0:
+                store.publish_snapshot(SAMPLE_DATA)
+                publish_events(SAMPLE_DATA, store)
+        return store
+
+def current_data():
+    return get_store().latest_snapshot()[1]
+
+def publish_data(data):
+    """Publish a new snapshot; every worker re-encodes responses on next request"""
+    target = get_store()
+    target.publish_snapshot(data)
+    publish_events(data, target)
+
+def snapshot_rows(data):
+    """
+    Every result row of a snapshot; older snapshots only have the top-10
+    lists, or rows without the exact prediction_score (ranked by the rounded one)
+    """
+    if 'results' in data:
+        return [row if 'prediction_score' in row else dict(row, prediction_score=row['score'])
+                for row in data['results']]
+    return [{'ticker': row['ticker'], 'company': row['company'], 'sector': '', 'score': row['score'],
+             'prediction_score': row['score'], 'sentiment': row['sentiment'], 'headline': row['headline'],
+             'headlines_count': 0, 'fresh': row.get('fresh', True)}
+            for row in data['top_rises'] + data['top_falls']]
+
+# Responses and query indexes for the current data version, rebuilt only
+# when the data changes
+responses = {}
+responses_lock = threading.Lock()
+built_version = None
+
+def get_responses():
+    global responses, built_version
+    target = get_store()
+    with responses_lock:
+        if built_version != target.snapshot_version():
+            version, data = target.latest_snapshot()
+            # The full result rows are served by the query API, not with the top 10
+            public = {key: value for key, value in data.items() if key != 'results'}
+            responses = {
+                'index': PrecomputedResponse(render_index(public), 'text/html'),
+                'data': PrecomputedResponse(app.json.dumps(public) + '\n', 'application/json'),
+                'query': QueryIndex(snapshot_rows(data), version),
+            }
+            built_version = version
+        return responses
+
 @app.route('/')
 def index():
-    return HTML_TEMPLATE
+    return get_responses()['index'].respond()
 
 @app.route('/api/data')
 def get_data():
-    return jsonify(SAMPLE_DATA)
+    return get_responses()['data'].respond()
+
+# Query API over every ticker of the current snapshot (see sp500_query)
+def page_args():
+    """k, offset and order from the query string; raises ValueError if invalid"""
+    order = request.args.get('order', 'desc')
+    try:
+        k = int(request.args.get('k', PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        k = offset = -1
+    if not 1 <= k <= MAX_PAGE_SIZE or offset < 0 or order not in ('desc', 'asc'):
+        raise ValueError(f"k must be 1-{MAX_PAGE_SIZE}, offset at least 0 and order desc or asc")
+    return k, offset, order
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+def unknown_sector(index, name):
+    sectors = [sector for sector, count in index.sector_names()]
+    return jsonify({'error': f'Unknown sector {name!r}', 'sectors': sectors}), 404
+
+@app.route('/api/ticker/<ticker>')
+def get_ticker(ticker):
+    body = get_responses()['query'].ticker(ticker)
+    if body is None:
+        return jsonify({'error': f'No result for {ticker.upper()}'}), 404
+    return json_response(body)
+
+@app.route('/api/rank')
+def get_rank():
+    try:
+        k, offset, order = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    index = get_responses()['query']
+    sector = request.args.get('sector') or None
+    body = index.rank(k, offset, sector, order)
+    if body is None:
+        return unknown_sector(index, sector)
+    return json_response(body)
+
+@app.route('/api/sector/<name>')
+def get_sector(name):
+    try:
+        k, offset, order = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    index = get_responses()['query']
+    body = index.sector(name, k, offset, order)
+    if body is None:
+        return unknown_sector(index, name)
+    return json_response(body)
+
+# Bulk scoring for other services: texts of concurrent requests are scored
+# together in micro-batches by this worker's scoring process (see sp500_batcher)
+SCORE_MAX_TEXTS = 1000             # texts per request
+SCORE_MAX_CHARS = 5000             # characters per text
+SCORE_MAX_BYTES = 2 * 1024 * 1024  # request body
+SCORE_TIMEOUT = 30                 # seconds a request waits for its batch
+batcher = None
+batcher_pid = None
+
+def get_batcher():
+    global batcher, batcher_pid
+    with store_lock:
+        if batcher is None or batcher_pid != os.getpid():
+            from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+            from sp500_batcher import MicroBatcher, MAX_BATCH, MAX_WAIT, MAX_QUEUE, PROCESSES
+            from sp500_cache import ScoreCache
+
+            analyzer = SentimentIntensityAnalyzer()
+            batcher = MicroBatcher(
+                analyzer,
+                cache=ScoreCache(analyzer),
+                max_batch=int(os.environ.get('SP500_SCORE_BATCH', MAX_BATCH)),
+                max_wait=float(os.environ.get('SP500_SCORE_WAIT_MS', MAX_WAIT * 1000)) / 1000,
+                max_queue=int(os.environ.get('SP500_SCORE_QUEUE', MAX_QUEUE)),
+                processes=int(os.environ.get('SP500_SCORE_PROCESSES', PROCESSES)),
+                metrics=metrics,
+            ).start()
+            batcher_pid = os.getpid()
+        return batcher
+
+def score_texts_arg():
+    """The request's list of texts; raises ValueError (400) or OverflowError (413)"""
+    payload = request.get_json(silent=True)
+    texts = payload.get('texts') if isinstance(payload, dict) else None
+    if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+        raise ValueError('Expected a JSON object with a non-empty "texts" array of strings')
+    if len(texts) > SCORE_MAX_TEXTS:
+        raise OverflowError(f"At most {SCORE_MAX_TEXTS} texts per request")
+    if any(len(text) > SCORE_MAX_CHARS for text in texts):
+        raise OverflowError(f"Texts are limited to {SCORE_MAX_CHARS} characters")
+    return texts
+
+@app.route('/api/score', methods=['POST'])
+def score():
+    from concurrent.futures import TimeoutError
+    from sp500_batcher import QueueFull, aggregate
+
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    if request.content_length > SCORE_MAX_BYTES:
+        return jsonify({'error': f'Request body is limited to {SCORE_MAX_BYTES} bytes'}), 413
+    try:
+        texts = score_texts_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+
+    try:
+        pending = get_batcher().submit(texts)
+    except QueueFull as e:
+        response = jsonify({'error': f'Scoring queue is full: {e}'})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+    try:
+        scores = pending.result(SCORE_TIMEOUT)
+    except TimeoutError:
+        return jsonify({'error': 'Scoring timed out'}), 503
+    return jsonify({'scores': scores, 'aggregate': aggregate(scores)})
+
+# Headline cache written by sp500_sentiment_analyzer runs (opened on first use)
+headline_cache = None
+
+def get_headline_cache():
+    global headline_cache
+    path = os.environ.get('SP500_HEADLINE_CACHE', HEADLINE_CACHE_PATH)
+    if headline_cache is None and os.path.exists(path):
+        headline_cache = HeadlineCache(path)
+    return headline_cache
+
+@app.route('/api/headlines/<ticker>')
+def get_headlines(ticker):
+    cache = get_headline_cache()
+    entry = cache.latest(ticker.upper()) if cache else None
+    if entry is None:
+        return jsonify({'error': f'No cached headlines for {ticker.upper()}'}), 404
+    return jsonify(entry)
+
+# Server-Sent Events: status, per-ticker progress and top-10 lists. Events
+# are written to the shared store; one thread per worker tails them into a
+# local broker, keeping the store's ids so Last-Event-ID works on any worker
+events = EventBroker()
+HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 300  # clients reconnect with Last-Event-ID
+TAIL_INTERVAL = 0.25
+tail_pid = None
+tail_lock = threading.Lock()
+
+def publish_events(data, target=None):
+    target = target or get_store()
+    target.append_event('status', {key: data[key] for key in ('status', 'last_update', 'total_companies')})
+    target.append_event('rankings', {'top_rises': data['top_rises'], 'top_falls': data['top_falls']})
+
+def load_events(target, cursor):
+    """Add the store's events after `cursor` to the broker; returns the new cursor"""
+    for entry in target.events_after(cursor):
+        events.add(entry)
+        cursor = entry[0]
+    return cursor
+
+def tail_events(cursor):
+    target = get_store()
+    while True:
+        cursor = load_events(target, cursor)
+        time.sleep(TAIL_INTERVAL)
+
+def start_event_tail():
+    """
+    Fill the broker with the store's recent events, then tail it. The
+    first stream in a worker waits for the fill, so it replays from a
+    caught-up log instead of receiving the backlog as new events.
+    """
+    global tail_pid
+    with tail_lock:
+        if tail_pid == os.getpid():
+            return
+        target = get_store()
+        for entry in target.latest_events(SNAPSHOT_EVENTS):
+            events.seed(entry)
+        cursor = load_events(target, max(0, target.last_event_id() - events.events.maxlen))
+        tail_pid = os.getpid()
+    threading.Thread(target=tail_events, args=(cursor,), daemon=True).start()
+
+@app.route('/api/stream')
+def stream():
+    start_event_tail()
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('lastEventId'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    def generate():
+        yield 'retry: 3000\n\n'
+        entries, cursor = events.replay(last_event_id)
+        for entry in entries:
+            yield format_event(entry)
+
+        # Events up to the client's Last-Event-ID are never sent again, unless
+        # it is ahead of the log (e.g. a new store) and was given a snapshot
+        delivered = last_event_id if last_event_id is not None and last_event_id <= cursor else 0
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            entries, cursor = events.wait(cursor, HEARTBEAT_SECONDS)
+            entries = [entry for entry in entries if entry[0] > delivered]
+            if not entries:
+                yield ': heartbeat\n\n'
+            for entry in entries:
+                yield format_event(entry)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Background analysis started from the dashboard's Refresh button. The job
+# lease in the store makes sure only one worker runs it at a time.
+def dashboard_rows(rows):
+    """Convert analyzer result rows to the dashboard's top-10 format"""
+    return [{
+        'rank': rank,
+        'ticker': row['ticker'],
+        'company': row['company'],
+        'score': round(row['prediction_score'], 1),
+        'sentiment': round(row['sentiment_compound'], 3),
+        'headline': row['sample_headlines'][0] if row['sample_headlines'] else '',
+        'fresh': row['fresh']
+    } for rank, row in enumerate(rows, 1)]
+
+# Analysis stage metrics of this process; the job publishes them to the store
+# so /metrics on any worker reports the job's numbers
+metrics = Metrics()
+METRICS_PUBLISH_SECONDS = 5
+
+def publish_metrics(target):
+    target.publish_metrics(str(os.getpid()), metrics.snapshot())
+
+@app.route('/metrics')
+def get_metrics():
+    merged = Metrics()
+    merged.merge(metrics.snapshot())
+    for snapshot in get_store().metrics_snapshots(exclude=str(os.getpid())):
+        merged.merge(snapshot)
+    return Response(merged.render(), mimetype='text/plain; version=0.0.4')
+
+# Source stats and circuit breakers, kept across refreshes so a dead
+# source stays skipped instead of costing every refresh its timeouts
+source_selector = None
+
+def get_source_selector(sources):
+    global source_selector
+    if source_selector is None:
+        from sp500_sources import SourceSelector
+        source_selector = SourceSelector(sources)
+    return source_selector
+
+def run_analysis(owner):
+    from sp500_sentiment_analyzer import SP500SentimentAnalyzer
+    from sp500_universe import UniverseLoader, CONSTITUENTS_PATH
+    from sp500_history import HistoryStore, HISTORY_PATH, parse_duration
+    from sp500_schedule import DeadlineScheduler
+    target = get_store()
+
+    try:
+        publish_data(dict(current_data(), status='running'))
+        analyzer = SP500SentimentAnalyzer(
+            workers=int(os.environ.get('SP500_WORKERS', 8)),
+            headline_cache=HeadlineCache(os.environ.get('SP500_HEADLINE_CACHE', HEADLINE_CACHE_PATH)),
+            universe_loader=UniverseLoader(os.environ.get('SP500_CONSTITUENTS', CONSTITUENTS_PATH)),
+            metrics=metrics,
+            sources=get_source_selector(SP500SentimentAnalyzer.SOURCES)
+        )
+        published = [time.monotonic()]
+
+        def progress(ticker, row, done, total):
+            if time.monotonic() - published[0] >= METRICS_PUBLISH_SECONDS:
+                publish_metrics(target)
+                published[0] = time.monotonic()
+            target.append_event('progress', {
+                'ticker': ticker, 'done': done, 'total': total,
+                'score': round(row['prediction_score'], 1) if row else None
+            }, only_if_changed=False)
+            target.append_event('rankings', {
+                'top_rises': dashboard_rows(analyzer.ranking.top(10)),
+                'top_falls': dashboard_rows(analyzer.ranking.bottom(10))
+            })
+
+        analyzer.progress_callback = progress
+        sample_size = int(os.environ.get('SP500_SAMPLE_SIZE', 0)) or None
+        history = HistoryStore(os.environ.get('SP500_HISTORY', HISTORY_PATH))
+        # SP500_DEADLINE=60s analyzes the highest-priority tickers that fit the
+        # budget; the rest keep their last scores and show as stale
+        if os.environ.get('SP500_DEADLINE'):
+            if not analyzer.fetch_sp500_list():
+                raise RuntimeError('could not load the company list')
+            analyzer.load_index_weights()
+            analyzer.scheduler = DeadlineScheduler(parse_duration(os.environ['SP500_DEADLINE']),
+                                                   universe=analyzer.universe, history=history)
+        # SP500_PROFILE=path.prof profiles each refresh (pstats format), run
+        # on this one thread so the profile sees all of its work
+        if os.environ.get('SP500_PROFILE'):
+            analyzer.run_serially()
+        with profiled(os.environ.get('SP500_PROFILE')):
+            succeeded = analyzer.analyze_all_companies(sample_size)
+        if not succeeded:
+            raise RuntimeError('analysis failed')
+
+        history.append(analyzer.results)
+        publish_data({
+            'top_rises': dashboard_rows(analyzer.ranking.top(10)),
+            'top_falls': dashboard_rows(analyzer.ranking.bottom(10)),
+            'last_update': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'completed',
+            'total_companies': len(analyzer.results),
+            'results': query_rows(analyzer.results)
+        })
+    except Exception as e:
+        print(f"[ERROR] Analysis failed: {e}")
+        publish_data(dict(current_data(), status='error'))
+    finally:
+        publish_metrics(target)
+        target.release_job(owner)
+
+@app.route('/api/refresh', methods=['POST'])
+def refresh():
+    owner = f"{os.getpid()}-{threading.get_ident()}-{time.time()}"
+    if not get_store().acquire_job(owner):
+        return jsonify({'status': 'running'}), 409
+    threading.Thread(target=run_analysis, args=(owner,), daemon=True).start()
+    return jsonify({'status': 'running'}), 202
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print(f"Fast version running on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=False)
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
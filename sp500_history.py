@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Historical sentiment store for the S&P 500 Sentiment Analyzer
+Appends every run's scores to date-partitioned column files and answers
+rolling mean, z-score and change-since-N-runs queries per ticker.
+"""
+
+import contextlib
+import fcntl
+import os
+import re
+import threading
+import time
+
+HISTORY_PATH = 'sp500_history'
+FIELDS = ('prediction_score', 'sentiment_compound', 'sentiment_pos', 'sentiment_neg', 'sentiment_neu')
+
+# File name -> NumPy dtype of each column file in a partition. Scores are
+# float32: VADER reports 3-4 decimals, well within float32 precision.
+COLUMN_TYPES = dict({'time': '<f8', 'ticker': '<i4'}, **{field: '<f4' for field in FIELDS})
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'min': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_duration(value):
+    """Seconds from a number or a string such as '300', '30m', '12h' or '7d'"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*', str(value).lower())
+    if not match or match.group(2) not in DURATION_UNITS and match.group(2):
+        raise ValueError(f"invalid duration: {value!r}")
+    return float(match.group(1)) * DURATION_UNITS.get(match.group(2) or 's')
+
+
+class HistoryStore:
+    """
+    Append-only score history, one directory per UTC day.
+
+    The newest partition is written run by run: each column is its own
+    file (time.bin, ticker.bin, prediction_score.bin, ... typed as in
+    COLUMN_TYPES) opened in append mode. Once a later day has rows, the
+    earlier one is compacted in place: rows are sorted by
+    ticker then time and an offsets index is written, so a query for a
+    few tickers reads only their slices of each memory-mapped file.
+    Tickers are stored as ids into tickers.txt (an id is a line number).
+
+    Writers (a CLI run and the dashboard's job may share a directory) take
+    an flock on writer.lock and re-read tickers.txt under it before handing
+    out new ids. Readers may run concurrently and ignore a torn trailing row.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        self.tickers = []
+        self.ticker_ids = {}
+        self.load_tickers()
+
+    # Ticker dictionary
+
+    def load_tickers(self):
+        """Pick up tickers added to tickers.txt since it was last read"""
+        tickers_path = os.path.join(self.path, 'tickers.txt')
+        if os.path.exists(tickers_path):
+            with open(tickers_path, encoding='utf-8') as f:
+                # A line still being written by another process has no newline yet
+                tickers = f.read().split('\n')[:-1]
+            for ticker in tickers[len(self.tickers):]:
+                self.ticker_ids.setdefault(ticker, len(self.tickers))
+                self.tickers.append(ticker)
+
+    def ticker_id(self, ticker, create=False):
+        """Id of `ticker`; with create=True (under the writer lock) a new one is added"""
+        ticker_id = self.ticker_ids.get(ticker)
+        if ticker_id is None and create:
+            with open(os.path.join(self.path, 'tickers.txt'), 'a', encoding='utf-8') as f:
+                f.write(ticker + '\n')
+            ticker_id = self.ticker_ids[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+        return ticker_id
+
+    @contextlib.contextmanager
+    def writing(self):
+        """Hold the writer lock, shared with other processes, with the ticker list up to date"""
+        with self.lock, open(os.path.join(self.path, 'writer.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self.load_tickers()
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # Partitions
+
+    def partitions(self):
+        """Partition directory names (date=YYYY-MM-DD), oldest first"""
+        return sorted(name for name in os.listdir(self.path) if name.startswith('date='))
+
+    def partition_for(self, timestamp):
+        return 'date=' + time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+    def is_compacted(self, partition):
+        return os.path.exists(os.path.join(self.path, partition, 'index.i8'))
+
+    # Writing
+
+    def append(self, results, timestamp=None):
+        """
+        Record one run: `results` is a ResultTable or an iterable of result
+        rows with a ticker and the score FIELDS. Rows flagged as not fresh
+        (carried over from an earlier run) are left out. Returns the rows written.
+        """
+        import numpy as np
+
+        timestamp = time.time() if timestamp is None else timestamp
+        if hasattr(results, 'column'):
+            fresh = results.column('fresh')
+            tickers = list(results.column('ticker')[fresh])
+            columns = {field: results.column(field)[fresh] for field in FIELDS}
+        else:
+            rows = [row for row in results if row.get('fresh', True)]
+            tickers = [row['ticker'] for row in rows]
+            columns = {field: np.array([row[field] for row in rows]) for field in FIELDS}
+
+        return self.append_rows(np.full(len(tickers), timestamp), tickers, columns)
+
+    def append_rows(self, times, tickers, columns):
+        """
+        Append rows (several runs at once, e.g. when importing old CSVs).
+        Rows for a day that is already compacted reopen it; it is compacted
+        again with the new rows merged in.
+        """
+        import numpy as np
+
+        times = np.asarray(times, dtype=COLUMN_TYPES['time'])
+        if len(times) == 0:
+            return 0
+
+        with self.writing():
+            ids = np.array([self.ticker_id(ticker, create=True) for ticker in tickers], dtype=COLUMN_TYPES['ticker'])
+
+            # Time last: a reader counts complete rows by the shortest column
+            data = dict({field: columns[field] for field in FIELDS}, ticker=ids)
+            data['time'] = times
+
+            # Rows may span days; each goes to the partition of its own UTC day
+            days = (times // 86400).astype(np.int64)
+            for day in np.unique(days):
+                selected = days == day
+                partition = self.partition_for(int(day) * 86400)
+                directory = os.path.join(self.path, partition)
+                if self.is_compacted(partition):
+                    self.reopen(partition)
+                os.makedirs(directory, exist_ok=True)
+
+                for name, values in data.items():
+                    with open(os.path.join(directory, f'{name}.bin'), 'ab') as f:
+                        f.write(np.asarray(values, dtype=COLUMN_TYPES[name])[selected].tobytes())
+
+            self.compact_finished()
+        return len(times)
+
+    def compact_finished(self):
+        """Compact every partition older than the newest one (the day being written)"""
+        partitions = self.partitions()
+        for partition in partitions[:-1]:
+            if not self.is_compacted(partition):
+                self.compact(partition)
+
+    def compact(self, partition):
+        """
+        Rewrite a finished day sorted by (ticker, time) with an index of
+        per-ticker offsets. The index is written last, so readers use the
+        append files until the sorted ones are complete.
+        """
+        import numpy as np
+
+        directory = os.path.join(self.path, partition)
+        data = self.read_appended(directory)
+        order = np.lexsort((data['time'], data['ticker']))
+        offsets = np.searchsorted(data['ticker'][order], np.arange(len(self.tickers) + 1)).astype('<i8')
+
+        for name in ['time'] + list(FIELDS):
+            temporary = os.path.join(directory, f'{name}.sorted.tmp')
+            data[name][order].tofile(temporary)
+            os.replace(temporary, os.path.join(directory, f'{name}.sorted'))
+
+        temporary = os.path.join(directory, 'index.i8.tmp')
+        offsets.tofile(temporary)
+        os.replace(temporary, os.path.join(directory, 'index.i8'))
+
+        for name in COLUMN_TYPES:
+            os.remove(os.path.join(directory, f'{name}.bin'))
+
+    def reopen(self, partition):
+        """
+        Turn a compacted day back into append files. The index is removed
+        only once they are complete, so readers switch from one to the other.
+        """
+        import numpy as np
+
+        directory = os.path.join(self.path, partition)
+        offsets = np.fromfile(os.path.join(directory, 'index.i8'), dtype='<i8')
+        data = {name: np.fromfile(os.path.join(directory, f'{name}.sorted'), dtype=COLUMN_TYPES[name])
+                for name in ['time'] + list(FIELDS)}
+        data['ticker'] = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+        for name in COLUMN_TYPES:
+            temporary = os.path.join(directory, f'{name}.bin.tmp')
+            np.asarray(data[name], dtype=COLUMN_TYPES[name]).tofile(temporary)
+            os.replace(temporary, os.path.join(directory, f'{name}.bin'))
+
+        os.remove(os.path.join(directory, 'index.i8'))
+        for name in ['time'] + list(FIELDS):
+            os.remove(os.path.join(directory, f'{name}.sorted'))
+
+    # Reading
+
+    def read_appended(self, directory, names=None):
+        """Columns of an uncompacted partition, cut to the complete rows"""
+        import numpy as np
+
+        names = names or COLUMN_TYPES
+        data = {name: np.fromfile(os.path.join(directory, f'{name}.bin'), dtype=COLUMN_TYPES[name])
+                for name in set(names) | {'time'}}
+        rows = min(len(values) for values in data.values())
+        return {name: values[:rows] for name, values in data.items()}
+
+    def read_partition(self, partition, ids, field):
+        """(ticker ids, times, values) of the given tickers in one partition"""
+        import numpy as np
+
+        directory = os.path.join(self.path, partition)
+        if self.is_compacted(partition):
+            offsets = np.fromfile(os.path.join(directory, 'index.i8'), dtype='<i8')
+            times = np.memmap(os.path.join(directory, 'time.sorted'), dtype=COLUMN_TYPES['time'], mode='r')
+            values = np.memmap(os.path.join(directory, f'{field}.sorted'), dtype=COLUMN_TYPES[field], mode='r')
+            # Tickers added after this day was compacted have no rows here
+            known = ids[ids < len(offsets) - 1]
+            slices = [slice(offsets[i], offsets[i + 1]) for i in known]
+            lengths = [s.stop - s.start for s in slices]
+            return (np.repeat(known, lengths),
+                    np.concatenate([times[s] for s in slices] or [np.empty(0)]),
+                    np.concatenate([values[s] for s in slices] or [np.empty(0, dtype='<f4')]))
+
+        data = self.read_appended(directory, ('ticker', field))
+        selected = np.isin(data['ticker'], ids)
+        return data['ticker'][selected], data['time'][selected], data[field][selected]
+
+    def load(self, tickers=None, field='sentiment_compound', start=None, end=None):
+        """
+        Rows of `field` for `tickers` (default: all) with start <= time < end,
+        as (ticker ids, times, values) sorted by ticker then time
+        """
+        import numpy as np
+
+        if field not in FIELDS:
+            raise ValueError(f"unknown field: {field}")
+        if tickers is None:
+            ids = np.arange(len(self.tickers))
+        else:
+            ids = np.array([self.ticker_ids[t] for t in tickers if t in self.ticker_ids], dtype='<i4')
+
+        first = self.partition_for(start) if start is not None else ''
+        last = self.partition_for(end) if end is not None else '~'
+        parts = [self.read_partition(p, ids, field) for p in self.partitions() if first <= p <= last]
+        if not parts:
+            return np.empty(0, dtype='<i4'), np.empty(0), np.empty(0)
+
+        ticker_ids, times, values = (np.concatenate(column) for column in zip(*parts))
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times < end
+        # Partitions are read in date order, so a stable sort by ticker keeps time order
+        order = np.argsort(ticker_ids[keep], kind='stable')
+        return ticker_ids[keep][order], times[keep][order], values[keep][order].astype(np.float64)
+
+    # Queries
+
+    def query(self, metric, tickers=None, field='sentiment_compound', window='7d', runs=None,
+              start=None, end=None):
+        """
+        DataFrame of ticker, time, `field` and `metric` for every stored run
+        in [start, end). The window covers the `runs` latest observations
+        of the ticker when given, else the trailing `window` duration.
+        Earlier rows are loaded as needed so the first windows are complete.
+        """
+        import numpy as np
+        import pandas as pd
+
+        span = float(runs) if runs else parse_duration(window)
+        # Change-since-N-runs and run windows need history before `start` too
+        lookback = None if start is None else (None if runs else start - span)
+        ticker_ids, times, values = self.load(tickers, field, lookback, end)
+
+        results = {
+            'rolling_mean': rolling_mean,
+            'zscore': rolling_zscore,
+            'change': change_since,
+        }[metric](ticker_ids, times, values, window=None if runs else span, runs=runs)
+
+        selected = slice(None) if start is None else times >= start
+        names = np.array(self.tickers, dtype=object)
+        return pd.DataFrame({
+            'ticker': names[ticker_ids[selected]],
+            'time': pd.to_datetime(times[selected], unit='s', utc=True),
+            field: values[selected],
+            metric: results[selected],
+        })
+
+    def rolling_mean(self, tickers=None, window='7d', runs=None, **kwargs):
+        return self.query('rolling_mean', tickers, window=window, runs=runs, **kwargs)
+
+    def zscore(self, tickers=None, window='7d', runs=None, **kwargs):
+        return self.query('zscore', tickers, window=window, runs=runs, **kwargs)
+
+    def change(self, tickers=None, runs=1, **kwargs):
+        return self.query('change', tickers, runs=runs, **kwargs)
+
+
+# Vectorized window statistics over rows sorted by (ticker, time)
+
+def group_starts(ticker_ids):
+    """Index of the first row of each row's ticker"""
+    import numpy as np
+
+    boundaries = np.flatnonzero(np.diff(ticker_ids)) + 1
+    first = np.zeros(len(ticker_ids), dtype=np.int64)
+    first[boundaries] = boundaries
+    return np.maximum.accumulate(first) if len(first) else first
+
+
+def window_starts(ticker_ids, times, window=None, runs=None):
+    """Index of the first row in each row's window, never crossing tickers"""
+    import numpy as np
+
+    first = group_starts(ticker_ids)
+    if runs:
+        return np.maximum(np.arange(len(times)) - int(runs) + 1, first)
+
+    # One sorted key over all tickers, spaced so no window reaches the previous ticker
+    offset = times - times.min() if len(times) else times
+    spacing = (offset.max() if len(times) else 0) + window + 1
+    key = ticker_ids * spacing + offset
+    return np.maximum(np.searchsorted(key, key - window, side='right'), first)
+
+
+def window_sums(values, starts):
+    """(count, sum, sum of squares) of values[starts[i]:i + 1] for every row"""
+    import numpy as np
+
+    index = np.arange(len(values))
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    squares = np.concatenate(([0.0], np.cumsum(values * values)))
+    return index + 1 - starts, sums[index + 1] - sums[starts], squares[index + 1] - squares[starts]
+
+
+def rolling_mean(ticker_ids, times, values, window=None, runs=None):
+    count, total, _ = window_sums(values, window_starts(ticker_ids, times, window, runs))
+    return total / count
+
+
+def rolling_zscore(ticker_ids, times, values, window=None, runs=None):
+    """(value - window mean) / window standard deviation; NaN for a flat or single-row window"""
+    import numpy as np
+
+    count, total, squares = window_sums(values, window_starts(ticker_ids, times, window, runs))
+    mean = total / count
+    std = np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 1e-9, (values - mean) / std, np.nan)
+
+
+def change_since(ticker_ids, times, values, window=None, runs=1):
+    """value minus the ticker's value `runs` observations earlier (NaN before that)"""
+    import numpy as np
+
+    runs = int(runs or 1)
+    index = np.arange(len(values))
+    previous = index - runs
+    valid = previous >= group_starts(ticker_ids)
+    result = np.full(len(values), np.nan)
+    result[valid] = values[valid] - values[previous[valid]]
+    return result
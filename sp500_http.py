@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP helpers for the S&P 500 Sentiment Analyzer
+Per-host token-bucket rate limiting and a pooled, conditional-GET
+HTTP client for the news sources.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+RSS_HEADERS = {
+    'User-Agent': USER_AGENT
+}
+
+PAGE_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+# A response `parse` stopped reading early is read to the end (and its
+# connection reused) when at most this many bytes are left; past that the
+# connection is dropped rather than downloading a large page for nothing
+DRAIN_BYTES = 256 * 1024
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    One token bucket per host, so concurrent workers stay polite to each
+    news source without serialising requests to different hosts.
+    A rate of None or 0 disables limiting (e.g. for a local test server).
+    """
+
+    def __init__(self, rate=2.0, burst=2):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def acquire(self, url_or_host):
+        """Wait for a request slot on the host of `url_or_host`"""
+        if not self.rate:
+            return
+
+        host = urlsplit(url_or_host).netloc or url_or_host
+        self.bucket(host).acquire()
+
+
+class HTTPClient:
+    """
+    Shared keep-alive session for the RSS and quote-page sources.
+
+    Remembers ETag / Last-Modified per URL along with the parsed result of
+    the last 200 response, so repeat fetches send If-None-Match /
+    If-Modified-Since and reuse the parsed result on a 304.
+    """
+
+    def __init__(self, pool_size=10):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.validators = {}  # url -> {'etag', 'last_modified', 'parsed'}
+        self.stats = {'requests': 0, 'not_modified': 0, 'bytes': 0}
+        self.lock = threading.Lock()
+
+    def fetch(self, url, headers, parse, timeout=10):
+        """
+        GET `url` and return `parse(response)`, or the cached parse result
+        when the server answers 304. Returns None for any other status.
+        The body is streamed: `parse` may read it with
+        response.raw.read(n, decode_content=True) and stop early. The rest
+        of a small body is then drained so the keep-alive connection goes
+        back to the pool; a large one (more than DRAIN_BYTES left, e.g. a
+        quote page) is abandoned with its connection.
+        """
+        with self.lock:
+            cached = self.validators.get(url)
+
+        request_headers = dict(headers)
+        if cached:
+            if cached['etag']:
+                request_headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                request_headers['If-Modified-Since'] = cached['last_modified']
+
+        # Streamed, so `parse` can stop reading once it has what it needs
+        with self.session.get(url, headers=request_headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 200:
+                parsed = parse(response)
+            self.drain(response)
+            size = response.raw.tell()  # bytes actually read off the wire
+
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            if response.status_code == 304 and cached:
+                self.stats['not_modified'] += 1
+                return cached['parsed']
+
+        if response.status_code != 200:
+            return None
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            with self.lock:
+                self.validators[url] = {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'parsed': parsed
+                }
+
+        return parsed
+
+    @staticmethod
+    def drain(response, limit=DRAIN_BYTES):
+        """
+        Read what is left of a partly read body, up to `limit` bytes, so
+        urllib3 releases the connection to the pool. Returns False if more
+        was left (the connection is then closed with the response).
+        """
+        length = response.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) - response.raw.tell() > limit:
+            return False
+
+        drained = 0
+        while drained <= limit:
+            chunk = response.raw.read(64 * 1024, decode_content=True)
+            if not chunk:
+                return True
+            drained += len(chunk)
+        return False
+
+    def summary(self):
+        """One-line transfer report for the end of a run"""
+        with self.lock:
+            stats = dict(self.stats)
+        return (f"{stats['requests']} HTTP requests, {stats['not_modified']} served by 304, "
+                f"{stats['bytes'] / 1024:.1f} KB transferred")
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics for the S&P 500 Sentiment Analyzer
+Latency histograms and counters per pipeline stage and news source,
+Prometheus text rendering, and an optional cProfile hook for one run.
+"""
+
+import contextlib
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'sp500_stage_seconds': ('histogram', 'Time spent per pipeline stage and news source'),
+    'sp500_headlines_total': ('counter', 'Headlines returned per news source'),
+    'sp500_synthetic_fallback_total': ('counter', 'Tickers scored from synthetic headlines because no source had news'),
+    'sp500_source_skipped_total': ('counter', 'Source attempts skipped while its circuit breaker was open'),
+    'sp500_breaker_opened_total': ('counter', 'Times a news source circuit breaker opened'),
+    'sp500_duplicate_headlines_total': ('counter', 'Headlines scored as an exact or near duplicate of another'),
+    'sp500_api_score_batches_total': ('counter', 'Micro-batches scored for /api/score'),
+    'sp500_api_score_texts_total': ('counter', 'Texts scored for /api/score'),
+    'sp500_api_score_rejected_total': ('counter', '/api/score requests refused because the scoring queue was full'),
+}
+
+
+class Timer:
+    """Times one stage; set `outcome` inside the block to override 'ok'"""
+
+    __slots__ = ('metrics', 'stage', 'labels', 'outcome', 'start')
+
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+        self.outcome = 'ok'
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = 'error' if exc_type is not None else self.outcome
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, outcome=outcome, **self.labels)
+        return False
+
+
+class NullTimer:
+    """Shared do-nothing timer handed out while metrics are disabled"""
+
+    __slots__ = ()
+    outcome = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """
+    Thread-safe registry of stage histograms and counters.
+
+    With enabled=False, timer() returns NULL_TIMER and the other methods
+    return immediately, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self, enabled=True, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.histograms = {}  # (stage, sorted label items) -> [bucket counts..., sum, count]
+        self.counters = {}    # (name, sorted label items) -> value
+        self.lock = threading.Lock()
+
+    def timer(self, stage, **labels):
+        """Context manager observing the block's duration for `stage`"""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, stage, labels)
+
+    def observe(self, stage, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (stage, tuple(sorted(labels.items())))
+        with self.lock:
+            entry = self.histograms.get(key)
+            if entry is None:
+                entry = self.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += seconds
+            entry[-1] += 1
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    # Sharing between processes (the dashboard's job and its web workers)
+
+    def snapshot(self):
+        """JSON-serializable copy of every series"""
+        with self.lock:
+            return {
+                'buckets': list(self.buckets),
+                'histograms': [[stage, dict(labels), entry] for (stage, labels), entry in self.histograms.items()],
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+            }
+
+    def merge(self, snapshot):
+        """Add another registry's snapshot (with the same buckets) to this one"""
+        if list(snapshot['buckets']) != list(self.buckets):
+            raise ValueError('histogram buckets differ')
+        with self.lock:
+            for stage, labels, entry in snapshot['histograms']:
+                key = (stage, tuple(sorted(labels.items())))
+                current = self.histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+                for i, value in enumerate(entry):
+                    current[i] += value
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(sorted(labels.items())))
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    # Reporting
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        if histograms:
+            lines += header('sp500_stage_seconds')
+            for (stage, labels), entry in histograms:
+                base = (('stage', stage),) + labels
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    lines.append(f"sp500_stage_seconds_bucket{format_labels(base + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"sp500_stage_seconds_bucket{format_labels(base + (('le', '+Inf'),))} {entry[-1]}")
+                lines.append(f"sp500_stage_seconds_sum{format_labels(base)} {entry[-2]!r}")
+                lines.append(f"sp500_stage_seconds_count{format_labels(base)} {entry[-1]}")
+
+        previous = None
+        for (name, labels), value in counters:
+            metric = f"sp500_{name}_total"
+            if metric != previous:
+                lines += header(metric)
+                previous = metric
+            lines.append(f"{metric}{format_labels(labels)} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Per-stage table for the end of a CLI run: count, mean and ~p95"""
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = [f"{'stage':<10}{'source':<10}{'outcome':<9}{'count':>7}{'mean ms':>10}{'~p95 ms':>10}"]
+        for (stage, labels), entry in histograms:
+            labels = dict(labels)
+            count = entry[-1]
+            lines.append(f"{stage:<10}{labels.get('source', '-'):<10}{labels.get('outcome', '-'):<9}{count:>7}"
+                         f"{entry[-2] / count * 1000:>10.1f}{self.quantile(entry, 0.95) * 1000:>10.0f}")
+        for (name, labels), value in counters:
+            label_text = ', '.join(f"{k}={v}" for k, v in labels)
+            lines.append(f"{name}{f' ({label_text})' if label_text else ''}: {value}")
+        return '\n'.join(lines)
+
+    def quantile(self, entry, q):
+        """Upper bound of the bucket holding quantile `q` (histograms only keep buckets)"""
+        target = q * entry[-1]
+        cumulative = 0
+        for bound, count in zip(self.buckets, entry):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+
+def header(metric):
+    kind, text = HELP.get(metric, ('untyped', ''))
+    return [f"# HELP {metric} {text}", f"# TYPE {metric} {kind}"]
+
+
+def format_labels(items):
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + '}'
+
+
+@contextlib.contextmanager
+def profiled(path=None):
+    """
+    Run the block under cProfile and write pstats data to `path`
+    (view with `python -m pstats PATH` or snakeviz). No-op without a path.
+    Only the calling thread is profiled (Python 3.12+ allows a single
+    active profiler), so callers run the analysis serially under it.
+    """
+    if not path:
+        yield None
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"[INFO] Profile written to {path}")
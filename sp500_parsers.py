@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming headline parsers for the S&P 500 Sentiment Analyzer
+Feed the RSS and quote-page responses chunk by chunk through lxml pull
+parsers and stop as soon as enough headlines are known, without building
+(or downloading) the whole document.
+"""
+
+from lxml import etree
+
+CHUNK_SIZE = 16 * 1024
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """Byte chunks from a requests response (streamed), bytes, or an iterable of bytes"""
+    if isinstance(source, bytes):
+        return (source[i:i + chunk_size] for i in range(0, len(source), chunk_size))
+    if hasattr(source, 'raw'):
+        # Plain reads rather than iter_content(): abandoning an iter_content()
+        # generator part way through a chunked body makes urllib3 drop the
+        # connection, while after reads the rest can still be drained. raw
+        # reads skip requests' decoding, so gzip/deflate is undone here
+        return iter(lambda: source.raw.read(chunk_size, decode_content=True), b'')
+    if hasattr(source, 'iter_content'):
+        return source.iter_content(chunk_size=chunk_size)
+    return source
+
+
+def release(element):
+    """Free a finished element and the siblings before it"""
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def parse_rss_titles(source, limit=10):
+    """Text of the <title> of the first `limit` <item> elements of an RSS feed"""
+    parser = etree.XMLPullParser(events=('end',), tag='{*}item', recover=True, resolve_entities=False)
+    titles = []
+    items = 0
+
+    for chunk in iter_chunks(source):
+        parser.feed(chunk)
+        for _, item in parser.read_events():
+            items += 1
+            title = item.find('.//{*}title')
+            if title is not None:
+                titles.append(''.join(title.itertext()).strip())
+            release(item)
+
+            if items >= limit:
+                return titles
+
+    return titles
+
+
+# Selectors tried in order by the quote-page scraper:
+# 'h3', '[data-test-locator="headline"]', '.Mb\(5px\)', 'a[data-test-locator="stream-item-title"]'
+QUOTE_PAGE_SELECTORS = (
+    lambda tag, attrib: tag == 'h3',
+    lambda tag, attrib: attrib.get('data-test-locator') == 'headline',
+    lambda tag, attrib: 'Mb(5px)' in attrib.get('class', '').split(),
+    lambda tag, attrib: tag == 'a' and attrib.get('data-test-locator') == 'stream-item-title',
+)
+
+
+def parse_quote_page_headlines(source, per_selector=10, enough=5):
+    """
+    Headlines from a Yahoo Finance quote news page, in one streaming pass.
+
+    Same result as running each selector over the full page in turn: take
+    its first `per_selector` matches with 15-200 characters of text and stop
+    after the first selector that brings the total to `enough`. Parsing
+    stops once every selector up to that one has seen its matches.
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'))
+    # Per selector, one slot per match in document order: None while the
+    # element is still open, then its text, or '' if the length filter failed
+    slots = [[] for _ in QUOTE_PAGE_SELECTORS]
+    open_matches = {}  # element -> [(selector index, slot index)]
+
+    def collect(final=False):
+        """Headlines from settled selectors, or None while still undetermined"""
+        headlines = []
+        for selector_slots in slots:
+            if not final and (len(selector_slots) < per_selector or None in selector_slots):
+                return None
+            headlines.extend(text for text in selector_slots if text)
+            if len(headlines) >= enough:
+                break
+        return headlines
+
+    for chunk in iter_chunks(source):
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if not isinstance(element.tag, str):
+                continue  # comments and processing instructions
+
+            if event == 'start':
+                matched = []
+                for i, selector in enumerate(QUOTE_PAGE_SELECTORS):
+                    if len(slots[i]) < per_selector and selector(element.tag, element.attrib):
+                        matched.append((i, len(slots[i])))
+                        slots[i].append(None)
+                if matched:
+                    open_matches[element] = matched
+                continue
+
+            matched = open_matches.pop(element, ())
+            if matched:
+                text = ''.join(element.itertext()).strip()
+                for i, slot in matched:
+                    slots[i][slot] = text if 15 < len(text) < 200 else ''
+
+            # Keep text around while an enclosing match still needs it
+            if not open_matches:
+                release(element)
+
+        headlines = collect()
+        if headlines is not None:
+            return headlines
+
+    return collect(final=True)
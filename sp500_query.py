@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Query indexes for the S&P 500 Sentiment Analyzer dashboard
+Per-ticker, ranking and sector lookups over one published result set,
+built once per data version so each API request is a dict lookup or a
+slice plus string joins of pre-encoded rows.
+"""
+
+import json
+from array import array
+
+from sp500_ranking import rank_key
+
+# Rows per page for /api/rank and /api/sector (k), default and maximum
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+def query_rows(rows):
+    """
+    Analyzer result rows in the compact form published with a snapshot;
+    `score` is rounded for display, `prediction_score` is kept exact to rank by
+    """
+    return [{
+        'ticker': row['ticker'],
+        'company': row['company'],
+        'sector': row.get('sector') or '',
+        'score': round(row['prediction_score'], 1),
+        'prediction_score': row['prediction_score'],
+        'sentiment': round(row['sentiment_compound'], 3),
+        'headline': row['sample_headlines'][0] if row['sample_headlines'] else '',
+        'headlines_count': row['headlines_count'],
+        'fresh': row.get('fresh', True),
+    } for row in rows]
+
+
+class QueryIndex:
+    """
+    Read-only indexes over one snapshot's result rows (query_rows form).
+
+    Rows are sorted by exact prediction_score, best first (ties by
+    ticker: rank_key), as RankingIndex orders /api/data's top 10 lists,
+    and each is JSON-encoded once with its overall rank. A dict maps
+    tickers to positions in that order; each sector keeps an array of its
+    rows' positions, so it is score-sorted too. Sectors are matched
+    case-insensitively. Pages are in descending score order, or
+    ascending (falls first) with order='asc'.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.rows = sorted(rows, key=rank_key)
+        self.encoded = [json.dumps(dict(row, rank=rank)) for rank, row in enumerate(self.rows, 1)]
+        self.positions = {row['ticker']: i for i, row in enumerate(self.rows)}
+        self.everything = array('l', range(len(self.rows)))
+
+        self.sectors = {}       # lower-case name -> (name, array of positions)
+        self.sector_rank = []   # position -> rank within its sector
+        for i, row in enumerate(self.rows):
+            name, positions = self.sectors.setdefault(row['sector'].lower(), (row['sector'], array('l')))
+            positions.append(i)
+            self.sector_rank.append(len(positions))
+
+        self.sector_stats = {key: self.summarize(name, positions)
+                             for key, (name, positions) in self.sectors.items()}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def summarize(self, name, positions):
+        rows = [self.rows[i] for i in positions]
+        return {
+            'sector': name,
+            'count': len(rows),
+            'mean_score': round(sum(row['prediction_score'] for row in rows) / len(rows), 2),
+            'mean_sentiment': round(sum(row['sentiment'] for row in rows) / len(rows), 4),
+            'positive': sum(1 for row in rows if row['prediction_score'] > 0),
+            'negative': sum(1 for row in rows if row['prediction_score'] < 0),
+            'stale': sum(1 for row in rows if not row['fresh']),
+        }
+
+    def sector_names(self):
+        """(name, row count) per sector, most rows first"""
+        return sorted(((name, len(positions)) for name, positions in self.sectors.values()),
+                      key=lambda item: (-item[1], item[0]))
+
+    def ticker(self, ticker):
+        """JSON for one ticker with its overall and sector rank, or None"""
+        i = self.positions.get(ticker.upper())
+        if i is None:
+            return None
+        row = self.rows[i]
+        return json.dumps(dict(row, rank=i + 1, total=len(self.rows), sector_rank=self.sector_rank[i],
+                               sector_count=len(self.sectors[row['sector'].lower()][1])))
+
+    def page(self, positions, k, offset, order, **meta):
+        """JSON page of rows at `positions` (score-sorted), with paging metadata"""
+        total = len(positions)
+        if order == 'asc':
+            selected = positions[max(total - offset - k, 0):max(total - offset, 0)][::-1]
+        else:
+            selected = positions[offset:offset + k]
+        next_offset = offset + k if offset + k < total else None
+
+        header = json.dumps(dict(meta, total=total, k=k, offset=offset, order=order, next_offset=next_offset))
+        # The rows are pre-encoded: splice them into the header object
+        return f'{header[:-1]}, "rows": [{", ".join(self.encoded[i] for i in selected)}]}}'
+
+    def rank(self, k=PAGE_SIZE, offset=0, sector=None, order='desc'):
+        """JSON page of the ranking, overall or within one sector; None for an unknown sector"""
+        if sector is None:
+            return self.page(self.everything, k, offset, order, sector=None)
+        entry = self.sectors.get(sector.lower())
+        if entry is None:
+            return None
+        return self.page(entry[1], k, offset, order, sector=entry[0])
+
+    def sector(self, sector, k=PAGE_SIZE, offset=0, order='desc'):
+        """JSON summary of one sector with a page of its rows; None if unknown"""
+        entry = self.sectors.get(sector.lower())
+        if entry is None:
+            return None
+        stats = self.sector_stats[sector.lower()]
+        return self.page(entry[1], k, offset, order, **stats)
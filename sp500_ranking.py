@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming ranking index for the S&P 500 Sentiment Analyzer
+Keeps result rows ordered by prediction score as they arrive, so the top
+rises and falls can be read at any time without sorting a DataFrame.
+"""
+
+import bisect
+import threading
+
+
+def rank_key(row, score_key='prediction_score'):
+    """Sort key of a result row: highest score first, equal scores by ticker"""
+    return -row[score_key], row['ticker']
+
+
+class RankingIndex:
+    """
+    Sorted index of result rows keyed by ticker.
+
+    Rows are kept in a list ordered by rank_key, so top(k) and bottom(k)
+    are O(k) slices and updating a ticker's score is a bisect-remove plus
+    bisect-insert. Ties are ordered by ticker, not arrival, so rankings
+    read from a checkpoint or a query index (which sort by rank_key too)
+    match however the run's threads finished.
+    """
+
+    def __init__(self, score_key='prediction_score'):
+        self.score_key = score_key
+        self.keys = []   # sorted (-score, ticker)
+        self.rows = {}   # ticker -> (key, row)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def update(self, row):
+        """Insert a row, or move an existing ticker to its new score"""
+        ticker = row['ticker']
+        with self.lock:
+            previous = self.rows.get(ticker)
+            if previous is not None:
+                del self.keys[bisect.bisect_left(self.keys, previous[0])]
+
+            key = rank_key(row, self.score_key)
+            bisect.insort(self.keys, key)
+            self.rows[ticker] = (key, row)
+
+    def attach(self, row):
+        """
+        Swap in a different object for a ticker's row without moving it,
+        e.g. a view of the same row in a result table
+        """
+        with self.lock:
+            entry = self.rows.get(row['ticker'])
+            if entry is not None:
+                self.rows[row['ticker']] = (entry[0], row)
+
+    def remove(self, ticker):
+        with self.lock:
+            previous = self.rows.pop(ticker, None)
+            if previous is not None:
+                del self.keys[bisect.bisect_left(self.keys, previous[0])]
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+            self.rows.clear()
+
+    def top(self, k=10, offset=0):
+        """Rows with the highest scores, best first"""
+        with self.lock:
+            return [self.rows[key[1]][1] for key in self.keys[offset:offset + k]]
+
+    def bottom(self, k=10, offset=0):
+        """Rows with the lowest scores, worst first"""
+        with self.lock:
+            end = len(self.keys) - offset
+            return [self.rows[key[1]][1] for key in reversed(self.keys[max(0, end - k):max(0, end)])]
+
+    def rank(self, ticker):
+        """1-based position of a ticker from the top, or None"""
+        with self.lock:
+            entry = self.rows.get(ticker)
+            if entry is None:
+                return None
+            return bisect.bisect_left(self.keys, entry[0]) + 1
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar result store for the S&P 500 Sentiment Analyzer
+Keeps one NumPy array per result field instead of one dict per ticker,
+with sectors and sample headlines interned in string tables.
+"""
+
+from collections.abc import Mapping
+
+SCORE_COLUMNS = ('prediction_score', 'sentiment_compound', 'sentiment_pos', 'sentiment_neg', 'sentiment_neu')
+# When the row was scored (epoch seconds) and whether this run scored it;
+# a deadline-limited run carries stale rows over from the history store
+FRESHNESS_COLUMNS = ('scored_at', 'fresh')
+COLUMNS = ('ticker', 'company', 'sector') + SCORE_COLUMNS + ('headlines_count', 'sample_headlines') + FRESHNESS_COLUMNS
+SAMPLE_HEADLINES = 3  # sample_headlines kept per row (see build_result)
+
+# Output format by file extension
+OUTPUT_FORMATS = {'csv': 'csv', 'json': 'json', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}
+
+
+class StringTable:
+    """Each distinct string stored once and referred to by its position"""
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def intern(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+
+class ResultRow(Mapping):
+    """
+    Read-only dict view of one row of a ResultTable, for callers written
+    against the old per-ticker dicts: row['ticker'], dict(row), **row.
+    """
+
+    __slots__ = ('table', 'position')
+
+    def __init__(self, table, position):
+        self.table = table
+        self.position = position
+
+    def __getitem__(self, key):
+        return self.table.value(self.position, key)
+
+    def __iter__(self):
+        return iter(COLUMNS)
+
+    def __len__(self):
+        return len(COLUMNS)
+
+    def __repr__(self):
+        return f"ResultRow({dict(self)!r})"
+
+
+class ResultTable:
+    """
+    Result rows stored column by column.
+
+    Scores are float64 arrays, counts int32, and tickers and company names
+    object arrays. Sectors are int16 codes into one string table, and each
+    row's sample headlines are int32 ids into another, -1 where a row has
+    fewer than SAMPLE_HEADLINES. Headlines repeat across runs and tickers,
+    so each distinct headline is stored once; the table is rebuilt when
+    replaced rows have left it mostly unused. Arrays grow by doubling.
+    column() returns views, so exports to pandas or Arrow do not copy
+    the numeric data.
+    """
+
+    def __init__(self, capacity=512):
+        self.size = 0
+        self.capacity = 0
+        self.initial_capacity = max(1, capacity)
+        self.arrays = {}
+        self.sectors = StringTable()
+        self.headlines = StringTable()
+
+    @classmethod
+    def from_rows(cls, rows):
+        table = cls(capacity=len(rows))
+        for row in rows:
+            table.append(row)
+        return table
+
+    def grow(self):
+        # NumPy is imported on first use so the CLI starts without it
+        import numpy as np
+
+        capacity = max(self.initial_capacity, self.capacity * 2)
+        arrays = {
+            'ticker': np.empty(capacity, dtype=object),
+            'company': np.empty(capacity, dtype=object),
+            'sector': np.zeros(capacity, dtype=np.int16),
+            'headlines_count': np.zeros(capacity, dtype=np.int32),
+            'sample_headlines': np.full((capacity, SAMPLE_HEADLINES), -1, dtype=np.int32),
+            'scored_at': np.full(capacity, np.nan),
+            'fresh': np.ones(capacity, dtype=bool),
+        }
+        arrays.update((name, np.zeros(capacity, dtype=np.float64)) for name in SCORE_COLUMNS)
+
+        for name, array in self.arrays.items():
+            arrays[name][:self.size] = array[:self.size]
+        self.arrays = arrays
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return (ResultRow(self, position) for position in range(self.size))
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [ResultRow(self, i) for i in range(*position.indices(self.size))]
+        if position < 0:
+            position += self.size
+        if not 0 <= position < self.size:
+            raise IndexError('result row out of range')
+        return ResultRow(self, position)
+
+    def __eq__(self, other):
+        """Equal to another table or a list of dicts with the same rows"""
+        if not isinstance(other, (ResultTable, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(row == other_row for row, other_row in zip(self, other))
+
+    __hash__ = None
+
+    def __setitem__(self, position, row):
+        """Overwrite a row in place (incremental refreshes)"""
+        if not 0 <= position < self.size:
+            raise IndexError('result row out of range')
+        self.write(position, row)
+        # The replaced row's headlines stay interned until the table holds
+        # twice as many as the rows could use
+        if len(self.headlines) > 2 * SAMPLE_HEADLINES * self.size:
+            self.compact_headlines()
+
+    def compact_headlines(self):
+        """Rebuild the headline table with only the headlines rows still use"""
+        import numpy as np
+
+        ids = self.arrays['sample_headlines'][:self.size]
+        used = np.unique(ids[ids >= 0])
+        table = StringTable()
+        for string_id in used.tolist():
+            table.intern(self.headlines[string_id])
+
+        remap = np.full(len(self.headlines), -1, dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        present = ids >= 0
+        ids[present] = remap[ids[present]]
+        self.headlines = table
+
+    def append(self, row):
+        """Add a row given as a mapping with the COLUMNS keys; returns its position"""
+        if self.size == self.capacity:
+            self.grow()
+        self.write(self.size, row)
+        self.size += 1
+        return self.size - 1
+
+    def write(self, position, row):
+        arrays = self.arrays
+        arrays['ticker'][position] = row['ticker']
+        arrays['company'][position] = row['company']
+        arrays['sector'][position] = self.sectors.intern(row.get('sector') or '')
+        for name in SCORE_COLUMNS:
+            arrays[name][position] = row[name]
+        arrays['headlines_count'][position] = row['headlines_count']
+        # Rows from before freshness was tracked count as fresh, time unknown
+        arrays['scored_at'][position] = row.get('scored_at', float('nan'))
+        arrays['fresh'][position] = row.get('fresh', True)
+
+        samples = arrays['sample_headlines'][position]
+        samples[:] = -1
+        for i, headline in enumerate(row['sample_headlines'][:SAMPLE_HEADLINES]):
+            samples[i] = self.headlines.intern(headline)
+
+    def value(self, position, key):
+        """One field of one row as a plain Python value"""
+        if key == 'sample_headlines':
+            return self.sample_headlines(position)
+        if key == 'sector':
+            return self.sectors[self.arrays['sector'][position]]
+        if key in ('ticker', 'company'):
+            return self.arrays[key][position]
+        if key in SCORE_COLUMNS or key in FRESHNESS_COLUMNS or key == 'headlines_count':
+            return self.arrays[key][position].item()
+        raise KeyError(key)
+
+    def sample_headlines(self, position):
+        return [self.headlines[i] for i in self.arrays['sample_headlines'][position].tolist() if i >= 0]
+
+    def column(self, name):
+        """View (no copy) of the first len(self) entries of a stored array"""
+        if self.size == 0:
+            self.grow()
+        return self.arrays[name][:self.size]
+
+    def to_dicts(self):
+        """Rows as plain dicts, e.g. for json.dump"""
+        return [dict(row) for row in self]
+
+    def to_pandas(self):
+        """
+        DataFrame with the same columns as the old per-row dicts. Score and
+        count columns share memory with this table; sector is categorical.
+        """
+        import pandas as pd
+
+        data = {name: self.column(name) for name in ('ticker', 'company')}
+        data['sector'] = pd.Categorical.from_codes(self.column('sector'), categories=self.sectors.strings)
+        data.update((name, self.column(name)) for name in SCORE_COLUMNS + ('headlines_count',))
+        data['sample_headlines'] = [self.sample_headlines(position) for position in range(self.size)]
+        data.update((name, self.column(name)) for name in FRESHNESS_COLUMNS)
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """pyarrow Table (optional dependency); numeric columns are zero-copy"""
+        import pyarrow as pa
+
+        columns = {name: pa.array(self.column(name), type=pa.string()) for name in ('ticker', 'company')}
+        columns['sector'] = pa.DictionaryArray.from_arrays(pa.array(self.column('sector')),
+                                                           pa.array(self.sectors.strings, type=pa.string()))
+        columns.update((name, pa.array(self.column(name))) for name in SCORE_COLUMNS + ('headlines_count',))
+
+        # sample_headlines as list<dictionary>: offsets per row into the flattened headline ids
+        ids = self.column('sample_headlines')
+        present = ids >= 0
+        offsets = pa.array([0] + present.sum(axis=1).cumsum().tolist(), type=pa.int32())
+        values = pa.DictionaryArray.from_arrays(pa.array(ids[present]),
+                                                pa.array(self.headlines.strings, type=pa.string()))
+        columns['sample_headlines'] = pa.ListArray.from_arrays(offsets, values)
+        columns.update((name, pa.array(self.column(name))) for name in FRESHNESS_COLUMNS)
+        return pa.table(columns)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deadline scheduling for the S&P 500 Sentiment Analyzer
+Orders a run's tickers by priority (index weight, time since last scored,
+recent sentiment volatility) and stops dispatching new tickers once the
+remaining wall-clock budget no longer covers one, carrying the skipped
+tickers' last scores over from the history store.
+"""
+
+import math
+import threading
+import time
+
+from sp500_history import FIELDS
+
+# Share of each component in a ticker's priority (each component is 0..1)
+PRIORITY_WEIGHTS = {'weight': 0.5, 'staleness': 0.3, 'volatility': 0.2}
+
+# Seconds since last scored at which staleness reaches 1
+STALE_AFTER = 6 * 3600
+
+# Volatility: standard deviation of the compound score over the latest
+# VOLATILITY_RUNS runs, reaching 1 at VOLATILITY_SCALE; a ticker with fewer
+# than 3 runs counts as fully volatile (nothing is known about it)
+VOLATILITY_RUNS = 10
+VOLATILITY_SCALE = 0.3
+
+# History older than this is not read for priorities or carried rows
+LOOKBACK = 7 * 86400
+
+# Per-ticker duration estimate: smoothed mean plus DEVIATIONS smoothed mean
+# deviations, as for TCP retransmission timeouts
+SMOOTHING = 0.2
+DEVIATIONS = 2
+
+# Share of the budget kept back for scoring, reports and output
+RESERVE = 0.05
+
+
+class DeadlineScheduler:
+    """
+    Priority order and dispatch cut-off for one deadline-limited run.
+
+    plan() sorts the companies by priority; start() starts the clock.
+    Workers call allow() before each ticker (in plan order) and record()
+    with its duration after. allow() turns False, for good, once
+    now + the expected ticker duration passes the deadline minus the
+    reserve, so tickers already running finish and no lower-priority
+    ticker starts after a higher-priority one was refused.
+    """
+
+    def __init__(self, budget, universe=None, history=None, weights=None, reserve=None):
+        self.budget = float(budget)
+        self.universe = universe
+        self.history = history
+        self.weights = dict(PRIORITY_WEIGHTS, **(weights or {}))
+        self.reserve = self.budget * RESERVE if reserve is None else float(reserve)
+
+        self.priorities = {}   # ticker -> priority, 0..1
+        self.last_scores = {}  # ticker -> (time, {field: value}) of its latest history row
+        self.volatility = {}   # ticker -> compound volatility, 0..1
+        self.deadline = None
+        self.ticker_seconds = None
+        self.ticker_deviation = 0.0
+        self.stopped = False
+        self.stats = {'dispatched': 0, 'skipped': 0, 'carried': 0}
+        self.lock = threading.Lock()
+
+    def plan(self, companies, now=None):
+        """Companies sorted by priority, highest first (ties keep their order)"""
+        now = time.time() if now is None else now
+        tickers = [company['ticker'] for company in companies]
+        self.load_history(tickers, now)
+
+        weights = self.index_weights(tickers)
+        for ticker in tickers:
+            last = self.last_scores.get(ticker)
+            staleness = 1.0 if last is None else min(max(now - last[0], 0.0) / STALE_AFTER, 1.0)
+            self.priorities[ticker] = (self.weights['weight'] * weights[ticker]
+                                       + self.weights['staleness'] * staleness
+                                       + self.weights['volatility'] * self.volatility.get(ticker, 1.0))
+        return sorted(companies, key=lambda company: -self.priorities[company['ticker']])
+
+    def index_weights(self, tickers):
+        """Index weight relative to the heaviest ticker; unknown weights get the median"""
+        weights = {}
+        if self.universe is not None:
+            weights = {ticker: self.universe.weight(ticker) for ticker in tickers if ticker in self.universe}
+            weights = {ticker: weight for ticker, weight in weights.items() if not math.isnan(weight)}
+        if not weights:
+            return dict.fromkeys(tickers, 1.0)
+
+        heaviest = max(weights.values()) or 1.0
+        known = sorted(weights.values())
+        median = known[len(known) // 2]
+        return {ticker: weights.get(ticker, median) / heaviest for ticker in tickers}
+
+    def load_history(self, tickers, now):
+        """Latest scores and compound volatility per ticker from the history store"""
+        import numpy as np
+
+        self.last_scores = {}
+        self.volatility = {}
+        if self.history is None:
+            return
+
+        columns = {}
+        for field in FIELDS:
+            ticker_ids, times, values = self.history.load(tickers, field, start=now - LOOKBACK)
+            columns[field] = values
+        if len(times) == 0:
+            return
+
+        # Rows are sorted by ticker then time: the last row of each group is the latest
+        ends = np.append(np.flatnonzero(np.diff(ticker_ids)) + 1, len(ticker_ids))
+        starts = np.concatenate(([0], ends[:-1]))
+        compound = columns['sentiment_compound']
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            ticker = self.history.tickers[ticker_ids[start]]
+            latest = end - 1
+            self.last_scores[ticker] = (float(times[latest]),
+                                        {field: float(columns[field][latest]) for field in FIELDS})
+            recent = compound[max(start, end - VOLATILITY_RUNS):end]
+            if len(recent) >= 3:
+                self.volatility[ticker] = min(float(recent.std()) / VOLATILITY_SCALE, 1.0)
+
+    def start(self):
+        """Start the budget's clock"""
+        self.deadline = time.monotonic() + self.budget
+        self.stopped = False
+        with self.lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+    def allow(self):
+        """Whether another ticker can start and still finish before the deadline"""
+        with self.lock:
+            if not self.stopped and self.deadline is not None:
+                expected = 0.0
+                if self.ticker_seconds is not None:
+                    expected = self.ticker_seconds + DEVIATIONS * self.ticker_deviation
+                self.stopped = time.monotonic() + expected > self.deadline - self.reserve
+            if self.stopped:
+                self.stats['skipped'] += 1
+                return False
+            self.stats['dispatched'] += 1
+            return True
+
+    def record(self, seconds):
+        """Update the per-ticker duration estimate with one ticker's time"""
+        with self.lock:
+            if self.ticker_seconds is None:
+                self.ticker_seconds, self.ticker_deviation = seconds, seconds / 2
+            else:
+                self.ticker_deviation += SMOOTHING * (abs(seconds - self.ticker_seconds) - self.ticker_deviation)
+                self.ticker_seconds += SMOOTHING * (seconds - self.ticker_seconds)
+
+    def carried_row(self, company):
+        """Stale result row for a skipped ticker from its latest history row, or None"""
+        last = self.last_scores.get(company['ticker'])
+        if last is None:
+            return None
+
+        scored_at, scores = last
+        with self.lock:
+            self.stats['carried'] += 1
+        return dict({
+            'ticker': company['ticker'],
+            'company': company['name'],
+            'sector': company.get('sector', ''),
+        }, **scores, headlines_count=0, sample_headlines=[], scored_at=scored_at, fresh=False)
+
+    def summary(self):
+        """One-line schedule report for the end of a run"""
+        with self.lock:
+            stats = dict(self.stats)
+        missing = stats['skipped'] - stats['carried']
+        return (f"Schedule: {stats['dispatched']} tickers analyzed within the {self.budget:g}s budget, "
+                f"{stats['skipped']} skipped ({stats['carried']} carried over stale, {missing} without scores)")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch sentiment scoring for the S&P 500 Sentiment Analyzer
+Scores every headline of a run in one pass (optionally across a process
+pool) and reduces them to per-ticker means with a vectorized group-by.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+# Column order of every score array returned by this module
+SCORE_FIELDS = ('compound', 'pos', 'neu', 'neg')
+
+# Below this many uncached texts the process pool costs more than it saves
+MIN_PARALLEL_TEXTS = 5000
+
+worker_analyzer = None
+
+
+def init_worker(lexicon, emojis):
+    """Process-pool initializer: one analyzer per process, same lexicon as the parent"""
+    global worker_analyzer
+    worker_analyzer = SentimentIntensityAnalyzer()
+    worker_analyzer.lexicon = lexicon
+    worker_analyzer.emojis = emojis
+
+
+def score_chunk(texts, analyzer=None):
+    """Score a list of texts into an (n, 4) array"""
+    analyzer = analyzer or worker_analyzer
+    out = np.empty((len(texts), len(SCORE_FIELDS)))
+    for i, text in enumerate(texts):
+        scores = analyzer.polarity_scores(text)
+        out[i] = [scores[field] for field in SCORE_FIELDS]
+    return out
+
+
+def score_texts(texts, analyzer, cache=None, processes=None, chunk_size=1000,
+                min_parallel=MIN_PARALLEL_TEXTS, progress=None):
+    """
+    Score `texts` and return an (n, 4) float array, columns SCORE_FIELDS.
+
+    Duplicate texts are scored once. With a ScoreCache, cached texts skip
+    VADER and new scores are written back. Large batches are split into
+    `chunk_size` chunks over `processes` worker processes (default: all
+    cores); small batches are scored in-process. `progress`, if given, is
+    called after each chunk.
+    """
+    unique = list(dict.fromkeys(texts))
+    scores = np.empty((len(unique), len(SCORE_FIELDS)))
+
+    missing = []
+    for i, text in enumerate(unique):
+        cached = cache.lookup(text) if cache is not None else None
+        if cached is None:
+            missing.append(i)
+        else:
+            scores[i] = [cached[field] for field in SCORE_FIELDS]
+
+    if missing:
+        missing_texts = [unique[i] for i in missing]
+        processes = processes or os.cpu_count() or 1
+
+        chunks = [missing_texts[i:i + chunk_size] for i in range(0, len(missing_texts), chunk_size)]
+
+        def reported(results):
+            for result in results:
+                if progress is not None:
+                    progress()
+                yield result
+
+        if processes > 1 and len(missing_texts) >= min_parallel:
+            with ProcessPoolExecutor(max_workers=processes, initializer=init_worker,
+                                     initargs=(analyzer.lexicon, analyzer.emojis)) as executor:
+                computed = np.vstack(list(reported(executor.map(score_chunk, chunks))))
+        else:
+            computed = np.vstack(list(reported(score_chunk(chunk, analyzer) for chunk in chunks)))
+
+        scores[missing] = computed
+
+        if cache is not None:
+            for text, row in zip(missing_texts, computed):
+                cache.store(text, dict(zip(SCORE_FIELDS, row.tolist())))
+
+    position = {text: i for i, text in enumerate(unique)}
+    return scores[[position[text] for text in texts]]
+
+
+def group_means(scores, groups, n_groups):
+    """
+    Per-group column means of `scores` for integer group ids in `groups`.
+    Returns (means, counts); groups with no rows get NaN means.
+
+    np.bincount sums rows in input order, so the means match a sequential
+    Python accumulation exactly.
+    """
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.column_stack([
+        np.bincount(groups, weights=scores[:, j], minlength=n_groups)
+        for j in range(scores.shape[1])
+    ])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts[:, None]
+    return means, counts
+
+
+def score_headline_sets(headline_sets, analyzer, cache=None, processes=None, progress=None):
+    """
+    Batch-score a list of headline lists (one per ticker); `progress` as
+    in score_texts.
+    Returns (means, counts): an (n_sets, 4) array and an (n_sets,) array.
+    """
+    texts = [text for headlines in headline_sets for text in headlines]
+    groups = np.repeat(np.arange(len(headline_sets)), [len(headlines) for headlines in headline_sets])
+
+    if texts:
+        scores = score_texts(texts, analyzer, cache=cache, processes=processes, progress=progress)
+    else:
+        scores = np.empty((0, len(SCORE_FIELDS)))
+
+    return group_means(scores, groups, len(headline_sets))
@@ -13,25 +13,175 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
-import requests
-import pandas as pd
-from bs4 import BeautifulSoup
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import time
+# pandas, lxml, VADER, NumPy and yfinance are imported where they
+# are first needed, so the CLI starts fetching without paying for them
+import argparse
 import random
 from datetime import datetime
+import hashlib
+import itertools
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sp500_http import HostRateLimiter, HTTPClient, RSS_HEADERS, PAGE_HEADERS
+from sp500_cache import HeadlineCache, ScoreCache
+from sp500_ranking import RankingIndex
+from sp500_results import ResultTable, OUTPUT_FORMATS
+from sp500_universe import UniverseLoader, CONSTITUENTS_PATH, MAX_AGE
+from sp500_history import HistoryStore, HISTORY_PATH, parse_duration
+from sp500_metrics import Metrics, profiled
+from sp500_checkpoint import Checkpoint, CHECKPOINT_PATH
+from sp500_sources import SourceSelector
+from sp500_schedule import DeadlineScheduler
+from sp500_shards import ShardCoordinator, LEASE_MARGIN, SHARD_DIR
+
+RSS_URL = "https://feeds.finance.yahoo.com/rss/2.0/headline?s={ticker}&region=US&lang=en-US"
+QUOTE_NEWS_URL = "https://finance.yahoo.com/quote/{ticker}/news"
+
 
 class SP500SentimentAnalyzer:
-    def __init__(self):
-        self.analyzer = SentimentIntensityAnalyzer()
+    # News sources, in the order tried until there are stats to reorder them by
+    SOURCES = ('yfinance', 'rss', 'scrape')
+    SOURCE_LABELS = {
+        'yfinance': 'news articles via yfinance',
+        'rss': 'headlines via RSS',
+        'scrape': 'headlines via scraping',
+    }
+
+    def __init__(self, workers=1, rate_limit=2.0, rss_url=RSS_URL, quote_news_url=QUOTE_NEWS_URL,
+                 headline_cache=None, score_cache_path=None, batch_scoring=False, score_processes=None,
+                 universe_loader=None, metrics=None, sources=None, request_timeout=10,
+                 yfinance_batch_size=50, dedup=False, downweight_shared=False, checkpoint=None,
+                 scheduler=None):
+        # VADER and the memoized score cache are created on first use
+        # (headlines repeat between refreshes and across tickers)
+        self.loaded_analyzer = None
+        self.loaded_score_cache = None
+        self.loaded_deduplicator = None
+        self.score_cache_path = score_cache_path
+        self.load_lock = threading.Lock()
         self.sp500_companies = []
-        self.results = []
+        self.results = ResultTable()
+
+        # Optional sp500_universe.UniverseLoader for the full constituent list;
+        # without one (or if it finds nothing) the curated list below is used
+        self.universe_loader = universe_loader
+        self.universe = None
+
+        # Incremental refreshes: ticker -> position in self.results and the
+        # fingerprint of the headlines that row was scored from
+        self.result_index = {}
+        self.fingerprints = {}
+        self.recomputed = 0
+
+        # Rows ordered by prediction score, updated as each ticker completes
+        self.ranking = RankingIndex()
+
+        # Optional callback(ticker, row, done, total) after each ticker; row is
+        # None while batch scoring is pending or when the ticker was unchanged
+        self.progress_callback = None
+
+        # Optional callback() on progress short of a finished ticker: a source
+        # fetch, a batch-scoring chunk, a row re-averaged by downweight_shared
+        self.heartbeat = None
+
+        # Fetch settings: number of concurrent tickers and requests/second per host
+        self.workers = max(1, int(workers))
+        self.rate_limiter = HostRateLimiter(rate_limit)
+        self.http = HTTPClient(pool_size=max(10, self.workers))
+        self.rss_url = rss_url
+        self.quote_news_url = quote_news_url
+        self.request_timeout = request_timeout
+
+        # Bulk yfinance retrieval: news for every ticker is read up front, in
+        # yf.Tickers batches of this many symbols (0 or None: one at a time)
+        self.yfinance_batch_size = yfinance_batch_size
+        self.yfinance_news = {}
+
+        # Adaptive source order and per-source circuit breakers
+        # (sp500_sources.SourceSelector; pass one in to keep its stats across runs)
+        self.sources = sources if sources is not None else SourceSelector(self.SOURCES)
+
+        # Batch scoring: fetch every ticker first, then score all headlines in one
+        # pass over `score_processes` processes (default: all cores)
+        self.batch_scoring = batch_scoring
+        self.score_processes = score_processes
+
+        # Optional sp500_cache.HeadlineCache shared with the web dashboard
+        self.headline_cache = headline_cache
+
+        # Cross-ticker dedup (sp500_dedup): clusters the run's headlines into
+        # stories to report the duplicate ratio and, with downweight_shared,
+        # weight each headline by 1 / number of tickers that carried its story.
+        # Scores always come from each ticker's own headline text.
+        self.dedup = dedup or downweight_shared
+        self.downweight_shared = downweight_shared
+        self.headline_clusters = {}  # ticker -> cluster id per headline, this run
+
+        # Stage timings and counters (sp500_metrics.Metrics); disabled by default
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+
+        # Optional sp500_checkpoint.Checkpoint: every finished row is appended to
+        # it, and a resumed run skips the tickers it already holds
+        self.checkpoint = checkpoint
+
+        # Optional sp500_schedule.DeadlineScheduler: tickers run in priority order
+        # until its time budget runs out, the rest keep their last history scores
+        self.scheduler = scheduler
+
+    @property
+    def analyzer(self):
+        """VADER SentimentIntensityAnalyzer, loaded on first use"""
+        with self.load_lock:
+            if self.loaded_analyzer is None:
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+                self.loaded_analyzer = SentimentIntensityAnalyzer()
+            return self.loaded_analyzer
+
+    @property
+    def score_cache(self):
+        """ScoreCache wrapping self.analyzer, created on first use"""
+        analyzer = self.analyzer
+        with self.load_lock:
+            if self.loaded_score_cache is None:
+                self.loaded_score_cache = ScoreCache(analyzer, path=self.score_cache_path)
+            return self.loaded_score_cache
+
+    @property
+    def deduplicator(self):
+        """HeadlineDeduplicator for the current run, created on first use"""
+        analyzer = self.analyzer
+        with self.load_lock:
+            if self.loaded_deduplicator is None:
+                from sp500_dedup import HeadlineDeduplicator
+                from vaderSentiment.vaderSentiment import NEGATE, BOOSTER_DICT
+                # Near duplicates may only differ in words VADER ignores
+                protected = set(analyzer.lexicon) | set(NEGATE) | set(BOOSTER_DICT)
+                self.loaded_deduplicator = HeadlineDeduplicator(protected_words=protected)
+            return self.loaded_deduplicator
+
+    def load_index_weights(self):
+        """
+        Market-cap weights for the loaded universe, fetched on first need
+        (deadline runs rank tickers by them) through the yfinance rate limit
+        """
+        if self.universe_loader is not None and self.universe is not None:
+            self.universe_loader.load_weights(self.universe, self.rate_limiter)
 
     def fetch_sp500_list(self):
-        """Fetch S&P 500 company list from Wikipedia"""
+        """Load the S&P 500 constituents, falling back to a curated list of major companies"""
         print("Fetching S&P 500 company list...")
 
+        if self.universe_loader is not None:
+            universe = self.universe_loader.load()
+            if universe:
+                self.universe = universe
+                self.sp500_companies = universe.companies()
+                print(f"[OK] Loaded {len(self.sp500_companies)} S&P 500 companies "
+                      f"in {len(universe.sector_names)} sectors")
+                return True
+
         # Use curated list of major S&P 500 companies
         # This is more reliable than web scraping
         print("[INFO] Using curated list of major S&P 500 companies...")
@@ -146,12 +296,126 @@ class SP500SentimentAnalyzer:
 
     def search_company_news(self, company_name, ticker):
         """Search for company news using multiple methods"""
-        headlines = []
+        # Methods 1-3: yfinance API, Yahoo Finance RSS feed, quote page scraping,
+        # most promising first; sources behind an open circuit breaker are skipped
+        for source in self.sources.order(ticker):
+            if not self.sources.allow(source):
+                self.metrics.increment('source_skipped', source=source)
+                continue
+
+            headlines = self.fetch_source_headlines(source, ticker)
+
+            if headlines:
+                print(f"  [OK] Found {len(headlines)} {self.SOURCE_LABELS[source]}")
+                self.metrics.increment('headlines', len(headlines[:10]), source=source)
+                return headlines[:10]
 
-        # Method 1: Try yfinance API (most reliable)
+        # Method 4: Generate diverse synthetic sentiment phrases
+        # These are designed to have varied sentiment for demonstration
+        print(f"  [WARNING] No real news found for {ticker}, using synthetic data")
+        self.metrics.increment('synthetic_fallback')
+        return self.synthetic_headlines(company_name, ticker)
+
+    def fetch_source_headlines(self, source, ticker):
+        """
+        Fetch headlines for `ticker` from one source, going through the
+        headline cache when one is configured. Returns None on failure.
+        """
+        pending = self.yfinance_news.pop(ticker, None) if source == 'yfinance' else None
+        if pending is not None:
+            # Read in a batch (see submit_yfinance_batches), which already timed, recorded and cached it
+            headlines, fetched = pending.result()
+            if fetched:
+                return headlines
+
+        fetchers = {
+            'yfinance': self.fetch_yfinance_headlines,
+            'rss': self.fetch_rss_headlines,
+            'scrape': self.fetch_quote_page_headlines,
+        }
+
+        def fetch():
+            # Only live fetches feed the source stats; cache hits say nothing about the source
+            start = time.perf_counter()
+            headlines = fetchers[source](ticker)
+            self.record_fetch(source, ticker, headlines, time.perf_counter() - start)
+            return headlines
+
+        with self.metrics.timer('fetch', source=source) as timer:
+            if self.headline_cache is None:
+                headlines = fetch()
+            else:
+                headlines = self.headline_cache.get_or_fetch(ticker, source, fetch)
+            timer.outcome = 'ok' if headlines else ('empty' if headlines is not None else 'failed')
+
+        return headlines
+
+    def beat(self):
+        if self.heartbeat is not None:
+            self.heartbeat()
+
+    def stall_seconds(self):
+        """
+        Longest a healthy run can go between progress reports: one fetch
+        per source timing out, each behind every worker's rate-limited request
+        """
+        queued = self.workers / self.rate_limiter.rate if self.rate_limiter.rate else 0
+        return len(self.SOURCES) * (self.request_timeout + queued)
+
+    def record_fetch(self, source, ticker, headlines, seconds):
+        """Feed one live fetch to the source selector, reporting a breaker that opens"""
+        if self.sources.record(source, ticker, headlines, seconds):
+            print(f"  [WARNING] {source} failed repeatedly, skipping it for "
+                  f"{self.sources.cool_down(source)}s")
+            self.metrics.increment('breaker_opened', source=source)
+        self.beat()
+
+    def submit_yfinance_batches(self, executor, tickers):
+        """
+        Bulk yfinance retrieval: build one yf.Tickers object per
+        `yfinance_batch_size` symbols and queue a news read per ticker on
+        `executor`. Returns {ticker: Future of (headlines, fetched)}, where
+        fetched is False if the yfinance breaker was open; each read is
+        timed, recorded and cached like a live fetch.
+        """
         try:
             import yfinance as yf
-            stock = yf.Ticker(ticker)
+        except ImportError:
+            return {}
+
+        def read(ticker, stock):
+            if not self.sources.allow('yfinance'):
+                return None, False
+            with self.metrics.timer('fetch', source='yfinance') as timer:
+                start = time.perf_counter()
+                headlines = self.fetch_yfinance_headlines(ticker, stock)
+                self.record_fetch('yfinance', ticker, headlines, time.perf_counter() - start)
+                if headlines is not None and self.headline_cache is not None:
+                    self.headline_cache.put(ticker, 'yfinance', headlines)
+                timer.outcome = 'ok' if headlines else ('empty' if headlines is not None else 'failed')
+            return headlines, True
+
+        futures = {}
+        size = self.yfinance_batch_size
+        for start in range(0, len(tickers), size):
+            chunk = tickers[start:start + size]
+            try:
+                batch = yf.Tickers(' '.join(chunk)).tickers
+            except Exception as e:
+                print(f"  [INFO] yfinance batch failed: {str(e)[:50]}")
+                batch = {}
+            for ticker in chunk:
+                futures[ticker] = executor.submit(read, ticker, batch.get(ticker))
+        return futures
+
+    def fetch_yfinance_headlines(self, ticker, stock=None):
+        """Method 1: yfinance API (most reliable); `stock` is a yf.Ticker from a batch"""
+        headlines = []
+        try:
+            import yfinance as yf
+            self.rate_limiter.acquire('yfinance')
+            if stock is None:
+                stock = yf.Ticker(ticker)
             news = stock.news
 
             if news and len(news) > 0:
@@ -162,76 +426,34 @@ class SP500SentimentAnalyzer:
                     elif 'headline' in article:
                         headlines.append(article['headline'])
 
-                if len(headlines) > 0:
-                    print(f"  [OK] Found {len(headlines)} news articles via yfinance")
-                    return headlines[:10]  # Return up to 10 headlines
+            return headlines[:10]
         except Exception as e:
             print(f"  [INFO] yfinance failed for {ticker}: {str(e)[:50]}")
+            return None
 
-        # Method 2: Try Yahoo Finance RSS feed
+    def fetch_rss_headlines(self, ticker):
+        """Method 2: Yahoo Finance RSS feed"""
         try:
-            rss_url = f"https://feeds.finance.yahoo.com/rss/2.0/headline?s={ticker}&region=US&lang=en-US"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-            response = requests.get(rss_url, headers=headers, timeout=10)
-
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'xml')
-                items = soup.find_all('item')
-
-                for item in items[:10]:
-                    title = item.find('title')
-                    if title:
-                        headlines.append(title.text.strip())
-
-                if len(headlines) > 0:
-                    print(f"  [OK] Found {len(headlines)} headlines via RSS")
-                    return headlines[:10]
+            rss_url = self.rss_url.format(ticker=ticker)
+            self.rate_limiter.acquire(rss_url)
+            return self.http.fetch(rss_url, RSS_HEADERS, self.parse_rss_headlines, timeout=self.request_timeout)
         except Exception as e:
             print(f"  [INFO] RSS feed failed: {str(e)[:50]}")
+            return None
 
-        # Method 3: Try direct Yahoo Finance page scraping
+    def fetch_quote_page_headlines(self, ticker):
+        """Method 3: direct Yahoo Finance page scraping"""
         try:
-            url = f"https://finance.yahoo.com/quote/{ticker}/news"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                # Try multiple selectors
-                selectors = [
-                    'h3',
-                    '[data-test-locator="headline"]',
-                    '.Mb\\(5px\\)',
-                    'a[data-test-locator="stream-item-title"]'
-                ]
-
-                for selector in selectors:
-                    items = soup.select(selector)
-                    for item in items[:10]:
-                        text = item.get_text().strip()
-                        if len(text) > 15 and len(text) < 200:
-                            headlines.append(text)
-
-                    if len(headlines) >= 5:
-                        break
-
-                if len(headlines) > 0:
-                    print(f"  [OK] Found {len(headlines)} headlines via scraping")
-                    return headlines[:10]
+            url = self.quote_news_url.format(ticker=ticker)
+            self.rate_limiter.acquire(url)
+            return self.http.fetch(url, PAGE_HEADERS, self.parse_quote_page_headlines,
+                                   timeout=self.request_timeout)
         except Exception as e:
             print(f"  [INFO] Web scraping failed: {str(e)[:50]}")
+            return None
 
-        # Method 4: Generate diverse synthetic sentiment phrases
-        # These are designed to have varied sentiment for demonstration
-        print(f"  [WARNING] No real news found for {ticker}, using synthetic data")
-
+    def synthetic_headlines(self, company_name, ticker):
+        """Method 4: deterministic synthetic phrases for tickers without news"""
         # Use company/ticker info to generate varied phrases
         synthetic_phrases = []
 
@@ -267,6 +489,19 @@ class SP500SentimentAnalyzer:
 
         return headlines[:10]
 
+    def parse_rss_headlines(self, response):
+        """Extract up to 10 item titles from an RSS response"""
+        from sp500_parsers import parse_rss_titles
+        # Includes reading the streamed body
+        with self.metrics.timer('parse', source='rss'):
+            return parse_rss_titles(response, limit=10)
+
+    def parse_quote_page_headlines(self, response):
+        """Extract headlines from a Yahoo Finance quote news page"""
+        from sp500_parsers import parse_quote_page_headlines
+        with self.metrics.timer('parse', source='scrape'):
+            return parse_quote_page_headlines(response)
+
     def analyze_sentiment(self, texts):
         """Analyze sentiment of multiple texts and return average scores"""
         if not texts:
@@ -280,10 +515,11 @@ class SP500SentimentAnalyzer:
 
         total_scores = {'compound': 0, 'pos': 0, 'neu': 0, 'neg': 0}
 
-        for text in texts:
-            scores = self.analyzer.polarity_scores(text)
-            for key in total_scores:
-                total_scores[key] += scores[key]
+        with self.metrics.timer('score'):
+            for text in texts:
+                scores = self.score_cache.polarity_scores(text)
+                for key in total_scores:
+                    total_scores[key] += scores[key]
 
         count = len(texts)
         avg_scores = {key: total_scores[key] / count for key in total_scores}
@@ -291,6 +527,55 @@ class SP500SentimentAnalyzer:
 
         return avg_scores
 
+    def score_headline_sets(self, headline_sets):
+        """
+        Batch version of analyze_sentiment over many tickers' headlines:
+        one scoring pass plus a vectorized per-ticker mean
+        """
+        from sp500_scoring import SCORE_FIELDS, score_headline_sets
+        with self.metrics.timer('score_batch'):
+            means, counts = score_headline_sets(headline_sets, self.analyzer, cache=self.score_cache,
+                                                processes=self.score_processes, progress=self.beat)
+        sentiments = []
+        for row, count in zip(means.tolist(), counts.tolist()):
+            if count == 0:
+                sentiments.append(self.analyze_sentiment([]))
+                continue
+
+            sentiment = dict(zip(SCORE_FIELDS, row))
+            sentiment['text_count'] = count
+            sentiments.append(sentiment)
+
+        return sentiments
+
+    def cluster_headlines(self, company, headlines):
+        """
+        With dedup on, record which story cluster each of a company's
+        headlines belongs to. Clusters compare masked, normalized text, so
+        they only attribute stories to tickers; what gets scored is still
+        the headline itself.
+        """
+        if self.dedup:
+            clusters = self.deduplicator.add(company['ticker'], headlines, company['name'])
+            self.headline_clusters[company['ticker']] = clusters
+
+    def shared_weighted_sentiment(self, ticker, headlines):
+        """
+        Like analyze_sentiment over the ticker's headlines, but each weighted
+        by 1 / number of tickers whose news carried the same story
+        """
+        clusters = self.headline_clusters[ticker]
+        weights = [1 / self.deduplicator.shared_by(cluster) for cluster in clusters]
+        total = sum(weights)
+
+        sentiment = {'compound': 0.0, 'pos': 0.0, 'neu': 0.0, 'neg': 0.0}
+        for headline, weight in zip(headlines, weights):
+            scores = self.score_cache.polarity_scores(headline)
+            for key in sentiment:
+                sentiment[key] += scores[key] * weight / total
+        sentiment['text_count'] = len(clusters)
+        return sentiment
+
     def calculate_prediction_score(self, sentiment_scores):
         """
         Calculate prediction score based on sentiment analysis
@@ -309,68 +594,284 @@ class SP500SentimentAnalyzer:
 
         return prediction_score
 
-    def analyze_all_companies(self, sample_size=None):
-        """Analyze sentiment for all S&P 500 companies (or sample)"""
+    def analyze_all_companies(self, sample_size=None, incremental=False, resume=False):
+        """
+        Analyze sentiment for all S&P 500 companies (or sample).
+        With incremental=True, rows whose headlines are unchanged since the
+        previous run are kept as-is and only changed tickers are rescored.
+        With a checkpoint and resume=True, the checkpointed run's tickers are
+        analyzed instead, minus those it already has rows for.
+        With a scheduler, tickers are analyzed by priority (a sample takes the
+        highest) until its deadline, and skipped tickers get stale rows.
+        """
         if not self.sp500_companies:
             print("No companies loaded. Fetching list first...")
             if not self.fetch_sp500_list():
                 return False
 
         companies_to_analyze = self.sp500_companies
-        if sample_size:
+        if self.scheduler is not None:
+            self.scheduler.start()
+            companies_to_analyze = self.scheduler.plan(companies_to_analyze)[:sample_size]
+        elif sample_size:
             companies_to_analyze = random.sample(self.sp500_companies, min(sample_size, len(self.sp500_companies)))
 
-        print(f"\nAnalyzing sentiment for {len(companies_to_analyze)} companies...")
-        print("This may take a while. Please be patient...\n")
+        if self.checkpoint is not None:
+            plan, done = self.checkpoint.start([company['ticker'] for company in companies_to_analyze], resume)
+            by_ticker = {company['ticker']: company for company in self.sp500_companies}
+            companies_to_analyze = [by_ticker[ticker] for ticker in plan
+                                    if ticker in by_ticker and ticker not in done]
+            if done:
+                print(f"[INFO] Resuming {self.checkpoint.path}: {len(done)} of {len(plan)} tickers already done")
 
-        for idx, company in enumerate(companies_to_analyze, 1):
-            ticker = company['ticker']
-            name = company['name']
-
-            print(f"[{idx}/{len(companies_to_analyze)}] Analyzing {ticker} - {name}...")
-
-            # Fetch news/reviews
-            headlines = self.search_company_news(name, ticker)
-
-            # Analyze sentiment
-            sentiment = self.analyze_sentiment(headlines)
-            prediction_score = self.calculate_prediction_score(sentiment)
-
-            result = {
-                'ticker': ticker,
-                'company': name,
-                'prediction_score': prediction_score,
-                'sentiment_compound': sentiment['compound'],
-                'sentiment_pos': sentiment['pos'],
-                'sentiment_neg': sentiment['neg'],
-                'sentiment_neu': sentiment['neu'],
-                'headlines_count': sentiment['text_count'],
-                'sample_headlines': headlines[:3]
-            }
+        if self.loaded_score_cache is not None:
+            self.score_cache.check_version()
 
-            self.results.append(result)
+        total = len(companies_to_analyze)
+        print(f"\nAnalyzing sentiment for {total} companies...")
+        print("This may take a while. Please be patient...\n")
 
-            # Be respectful with requests
-            time.sleep(random.uniform(0.5, 1.5))
+        # Only tickers that will ask yfinance first, unless it has headlines cached
+        if self.yfinance_batch_size:
+            fresh = self.headline_cache.fresh_tickers('yfinance') if self.headline_cache is not None else set()
+            batched = [company['ticker'] for company in companies_to_analyze
+                       if company['ticker'] not in fresh and self.sources.ranked(company['ticker'])[0] == 'yfinance']
+        else:
+            batched = []
+
+        if self.dedup:
+            self.loaded_deduplicator = None
+            self.headline_clusters = {}
+
+        progress = itertools.count(1)
+
+        def report(company, row):
+            if self.progress_callback is not None:
+                self.progress_callback(company['ticker'], row, next(progress), total)
+
+        def dispatch(item):
+            """False for tickers the scheduler's deadline leaves out"""
+            if self.scheduler is None or self.scheduler.allow():
+                return True
+            report(item[1], None)
+            return False
+
+        def search(item):
+            idx, company = item
+            print(f"[{idx}/{total}] Analyzing {company['ticker']} - {company['name']}...")
+            return self.search_company_news(company['name'], company['ticker'])
+
+        def fetch(item):
+            if not dispatch(item):
+                return None
+            start = time.perf_counter()
+            with self.metrics.timer('ticker'):
+                headlines = search(item)
+            if self.scheduler is not None:
+                self.scheduler.record(time.perf_counter() - start)
+            report(item[1], None)
+            return headlines
+
+        def changed(company, headlines):
+            return not (incremental and company['ticker'] in self.result_index
+                        and self.fingerprints.get(company['ticker']) == self.headline_fingerprint(headlines))
+
+        def analyze(item):
+            if not dispatch(item):
+                return None
+            start = time.perf_counter()
+            with self.metrics.timer('ticker'):
+                headlines = search(item)
+                company = item[1]
+                self.cluster_headlines(company, headlines)
+                if changed(company, headlines):
+                    row = self.build_result(company, headlines, self.analyze_sentiment(headlines))
+                    self.ranking.update(row)
+                    self.save_checkpoint(row)
+                else:
+                    row = None
+            if self.scheduler is not None:
+                self.scheduler.record(time.perf_counter() - start)
+            report(company, row)
+            return headlines, row
+
+        # Batched yfinance reads run alongside the per-ticker fetches, which wait
+        # for their ticker's read instead of making their own request
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sp500-yfinance') as yfinance_pool:
+            self.yfinance_news = {}
+            if batched:
+                print(f"[INFO] Reading yfinance news for {len(batched)} tickers "
+                      f"in batches of {self.yfinance_batch_size}\n")
+                self.yfinance_news = self.submit_yfinance_batches(yfinance_pool, batched)
+
+            if self.batch_scoring:
+                fetched = self.map_companies(fetch, companies_to_analyze)
+                skipped = [company for company, headlines in zip(companies_to_analyze, fetched) if headlines is None]
+                companies_to_analyze = [company for company, headlines in zip(companies_to_analyze, fetched)
+                                        if headlines is not None]
+                headline_sets = [headlines for headlines in fetched if headlines is not None]
+                for company, headlines in zip(companies_to_analyze, headline_sets):
+                    self.cluster_headlines(company, headlines)
+                rows = [None] * len(companies_to_analyze)
+                stale = [i for i, (company, headlines) in enumerate(zip(companies_to_analyze, headline_sets))
+                         if changed(company, headlines)]
+                sentiments = self.score_headline_sets([headline_sets[i] for i in stale])
+                for i, sentiment in zip(stale, sentiments):
+                    rows[i] = self.build_result(companies_to_analyze[i], headline_sets[i], sentiment)
+                    self.ranking.update(rows[i])
+                    self.save_checkpoint(rows[i])
+            else:
+                fetched = self.map_companies(analyze, companies_to_analyze)
+                skipped = [company for company, result in zip(companies_to_analyze, fetched) if result is None]
+                companies_to_analyze = [company for company, result in zip(companies_to_analyze, fetched)
+                                        if result is not None]
+                headline_sets = [headlines for headlines, row in filter(None, fetched)]
+                rows = [row for headlines, row in filter(None, fetched)]
+
+            # Reads queued for tickers the deadline skipped are no longer needed
+            for future in self.yfinance_news.values():
+                future.cancel()
+        self.yfinance_news = {}
+
+        if self.dedup and self.headline_clusters:
+            if self.downweight_shared:
+                # Share counts are only final now, so rescored rows are re-averaged here
+                for i, row in enumerate(rows):
+                    if row is not None:
+                        company, headlines = companies_to_analyze[i], headline_sets[i]
+                        rows[i] = self.build_result(company, headlines,
+                                                    self.shared_weighted_sentiment(company['ticker'], headlines))
+                        self.ranking.update(rows[i])
+                        self.save_checkpoint(rows[i])
+                        self.beat()
+            stats = self.deduplicator.stats
+            self.metrics.increment('duplicate_headlines', stats['exact'], kind='exact')
+            self.metrics.increment('duplicate_headlines', stats['near'], kind='near')
+
+        if skipped:
+            # Best-effort ranking: skipped tickers keep their last scores, flagged stale
+            for company in skipped:
+                row = self.scheduler.carried_row(company)
+                if row is not None:
+                    self.ranking.update(row)
+                    self.save_checkpoint(row)
+                    companies_to_analyze.append(company)
+                    headline_sets.append(row['sample_headlines'])
+                    rows.append(row)
+
+        self.store_results(companies_to_analyze, headline_sets, rows, incremental)
+        if incremental:
+            print(f"\n[INFO] Recomputed {self.recomputed} of {total} tickers "
+                  f"({total - self.recomputed} unchanged)")
 
         print(f"\n[OK] Analysis complete for {len(self.results)} companies")
+        self.score_cache.flush()
+        print(f"[INFO] {self.http.summary()}")
+        print(f"[INFO] {self.sources.summary()}")
+        if self.scheduler is not None:
+            print(f"[INFO] {self.scheduler.summary()}")
+        if self.dedup and self.headline_clusters:
+            print(f"[INFO] {self.deduplicator.summary()}")
+        print(f"[INFO] {self.score_cache.summary()}")
+        if self.headline_cache is not None:
+            print(f"[INFO] {self.headline_cache.summary()}")
         return True
 
-    def get_predictions(self):
-        """Get top 10 predicted rises and falls"""
-        if not self.results:
+    def save_checkpoint(self, row):
+        if self.checkpoint is not None:
+            self.checkpoint.append(row)
+
+    def store_results(self, companies, headline_sets, rows, incremental=False):
+        """
+        Add new result rows, replacing a ticker's previous row in place when
+        running incrementally. A row of None means the ticker was unchanged.
+        """
+        self.recomputed = 0
+        for company, headlines, row in zip(companies, headline_sets, rows):
+            ticker = company['ticker']
+            if row is None or row['fresh']:
+                self.fingerprints[ticker] = self.headline_fingerprint(headlines)
+            if row is None:
+                continue
+
+            self.recomputed += 1
+            if incremental and ticker in self.result_index:
+                self.results[self.result_index[ticker]] = row
+            else:
+                self.result_index[ticker] = len(self.results)
+                self.results.append(row)
+
+            # Rank the stored row rather than keeping the dict alive
+            self.ranking.attach(self.results[self.result_index[ticker]])
+
+    @staticmethod
+    def headline_fingerprint(headlines):
+        """Stable hash of a ticker's headline list (order matters for samples)"""
+        return hashlib.sha1('\n'.join(headlines).encode('utf-8')).hexdigest()
+
+    def run_serially(self):
+        """
+        Do all of a run's work on the calling thread: no fetch or yfinance
+        thread pools, no scoring processes. cProfile only sees the thread
+        that enabled it, so profiled runs use this.
+        """
+        self.workers = 1
+        self.yfinance_batch_size = 0
+        self.score_processes = 1
+
+    def map_companies(self, func, companies):
+        """
+        Apply `func` to (index, company) pairs, on the worker pool if enabled.
+        Requests are paced per host by self.rate_limiter, so tickers can be
+        fetched concurrently; map() keeps results in input order either way.
+        """
+        items = enumerate(companies, 1)
+        if self.workers > 1:
+            # Named threads make py-spy and faulthandler output readable
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sp500-fetch') as executor:
+                return list(executor.map(func, items))
+        return list(map(func, items))
+
+    def build_result(self, company, headlines, sentiment):
+        """Result row for one company from its headlines and average sentiment"""
+        prediction_score = self.calculate_prediction_score(sentiment)
+
+        return {
+            'ticker': company['ticker'],
+            'company': company['name'],
+            'sector': company.get('sector', ''),
+            'prediction_score': prediction_score,
+            'sentiment_compound': sentiment['compound'],
+            'sentiment_pos': sentiment['pos'],
+            'sentiment_neg': sentiment['neg'],
+            'sentiment_neu': sentiment['neu'],
+            'headlines_count': sentiment['text_count'],
+            'sample_headlines': headlines[:3],
+            'scored_at': time.time(),
+            'fresh': True
+        }
+
+    def get_predictions(self, k=10):
+        """
+        Get top k predicted rises and falls. Can be called while a run is in
+        progress to get provisional rankings from the tickers done so far.
+        """
+        if len(self.ranking) == 0:
+            # Results loaded from elsewhere (e.g. assigned directly)
+            for row in self.results:
+                self.ranking.update(row)
+
+        if len(self.ranking) == 0:
             print("No results to analyze. Run analysis first.")
             return None, None
 
-        # Sort by prediction score
-        df = pd.DataFrame(self.results)
-        df_sorted = df.sort_values('prediction_score', ascending=False)
+        import pandas as pd
 
-        # Top 10 predicted rises (highest positive scores)
-        top_rises = df_sorted.head(10)
+        # Top k predicted rises (highest positive scores)
+        top_rises = pd.DataFrame([dict(row) for row in self.ranking.top(k)])
 
-        # Top 10 predicted falls (lowest scores)
-        top_falls = df_sorted.tail(10).sort_values('prediction_score')
+        # Top k predicted falls (lowest scores)
+        top_falls = pd.DataFrame([dict(row) for row in self.ranking.bottom(k)])
 
         return top_rises, top_falls
 
@@ -390,6 +891,8 @@ class SP500SentimentAnalyzer:
             print(f"{idx:<6}{row.ticker:<10}{row.company[:33]:<35}{row.prediction_score:>8.2f}{row.sentiment_compound:>10.3f}")
             if row.sample_headlines:
                 print(f"       Sample: {row.sample_headlines[0][:70]}...")
+            if not getattr(row, 'fresh', True):
+                print(f"       Stale: last scored {datetime.fromtimestamp(row.scored_at):%Y-%m-%d %H:%M}")
 
         print("\n" + "="*80)
         print("\n[DOWN ARROW] TOP 10 PREDICTED FALLS (Based on Negative Sentiment)")
@@ -401,6 +904,8 @@ class SP500SentimentAnalyzer:
             print(f"{idx:<6}{row.ticker:<10}{row.company[:33]:<35}{row.prediction_score:>8.2f}{row.sentiment_compound:>10.3f}")
             if row.sample_headlines:
                 print(f"       Sample: {row.sample_headlines[0][:70]}...")
+            if not getattr(row, 'fresh', True):
+                print(f"       Stale: last scored {datetime.fromtimestamp(row.scored_at):%Y-%m-%d %H:%M}")
 
         print("\n" + "="*80)
         print("\n[CHART] SCORING CRITERIA:")
@@ -415,36 +920,117 @@ class SP500SentimentAnalyzer:
         print("   - This is NOT financial advice. Do your own research!")
         print("="*80 + "\n")
 
-    def save_results(self, filename='sp500_sentiment_results.csv'):
-        """Save all results to CSV"""
+    def save_results(self, filename='sp500_sentiment_results.csv', fmt=None):
+        """Save all results to CSV, JSON or NDJSON (format taken from the extension by default)"""
         if not self.results:
             print("No results to save.")
             return False
 
-        df = pd.DataFrame(self.results)
-        df.to_csv(filename, index=False)
+        fmt = fmt or OUTPUT_FORMATS.get(filename.rsplit('.', 1)[-1].lower(), 'csv')
+
+        # Results may also have been assigned directly as a list of dicts
+        results = self.results if isinstance(self.results, ResultTable) else ResultTable.from_rows(self.results)
+
+        if fmt == 'csv':
+            results.to_pandas().to_csv(filename, index=False)
+        else:
+            with open(filename, 'w', encoding='utf-8') as f:
+                if fmt == 'json':
+                    json.dump(results.to_dicts(), f, indent=2)
+                else:
+                    for row in results:
+                        f.write(json.dumps(dict(row)) + '\n')
+
         print(f"[OK] Results saved to {filename}")
         return True
 
 
-def main():
-    print("""
+BANNER = """
 ╔══════════════════════════════════════════════════════════════════════════════╗
 ║                   S&P 500 SENTIMENT ANALYSIS PREDICTOR                       ║
 ║                                                                              ║
 ║  This tool analyzes online sentiment for S&P 500 companies and predicts     ║
 ║  potential stock price movements based on news and review sentiment.        ║
 ╚══════════════════════════════════════════════════════════════════════════════╝
-    """)
-
-    analyzer = SP500SentimentAnalyzer()
-
-    # Fetch S&P 500 list
-    if not analyzer.fetch_sp500_list():
-        print("Failed to fetch S&P 500 list. Exiting.")
-        return
-
-    # Ask user for sample size
+    """
+
+
+def parse_sample_size(value):
+    """argparse type for --sample-size: a positive integer or 'all'"""
+    if value.lower() == 'all':
+        return None
+    size = int(value)
+    if size < 1:
+        raise argparse.ArgumentTypeError("sample size must be positive or 'all'")
+    return size
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze news sentiment for S&P 500 companies and rank likely rises and falls.",
+        epilog="Without --sample-size an interactive menu is shown when stdin is a terminal."
+    )
+    parser.add_argument('-n', '--sample-size', type=parse_sample_size, default=argparse.SUPPRESS,
+                        help="number of companies to analyze, or 'all'")
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help="concurrent tickers to fetch (default: 8)")
+    parser.add_argument('--rate-limit', type=float, default=2.0,
+                        help="requests per second per news host, 0 to disable (default: 2)")
+    parser.add_argument('-o', '--output', default='sp500_sentiment_results.csv',
+                        help="results file (default: sp500_sentiment_results.csv)")
+    parser.add_argument('-f', '--format', choices=['csv', 'json', 'ndjson'], default=None,
+                        help="output format (default: from the output file extension)")
+    parser.add_argument('--constituents', default=CONSTITUENTS_PATH,
+                        help=f"constituents CSV to analyze instead of the cached universe (default: {CONSTITUENTS_PATH})")
+    parser.add_argument('--universe-max-age', type=float, default=MAX_AGE / 86400,
+                        help=f"days before the cached universe is refreshed (default: {MAX_AGE / 86400:g})")
+    parser.add_argument('--sector', help="only analyze companies in this GICS sector")
+    parser.add_argument('--top', type=int, default=10, help="rises/falls to print (default: 10)")
+    parser.add_argument('--deadline', type=parse_duration, metavar='DURATION',
+                        help="time budget such as 60s or 5m: analyze tickers by index weight, staleness and "
+                             "volatility until it runs out; the rest keep their last scores, marked stale")
+    parser.add_argument('--batch-scoring', action='store_true',
+                        help="score all headlines in one multi-process batch after fetching")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not read or write the headline and score caches")
+    parser.add_argument('--history', default=HISTORY_PATH,
+                        help=f"directory the run's scores are appended to (default: {HISTORY_PATH})")
+    parser.add_argument('--no-history', action='store_true', help="do not record the run in the history store")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH,
+                        help=f"file each finished ticker is appended to (default: {CHECKPOINT_PATH})")
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help="keep results in memory only; an interrupted run starts over")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue the run in the checkpoint file, skipping tickers it already has")
+    parser.add_argument('--yfinance-batch', type=int, default=50, metavar='N',
+                        help="read yfinance news for N tickers per batch before the other sources; 0 reads "
+                             "each ticker's news as it comes up (default: 50)")
+    parser.add_argument('--dedup', action='store_true',
+                        help="group the run's headlines into stories shared across tickers and report the "
+                             "duplicate ratio (scores are unchanged)")
+    parser.add_argument('--downweight-shared', action='store_true',
+                        help="weight each headline by 1 / number of tickers whose news carried the same story "
+                             "(implies --dedup)")
+    parser.add_argument('--fixed-source-order', action='store_true',
+                        help="always try yfinance, RSS, then scraping, with no circuit breakers")
+    parser.add_argument('--shards', type=int, default=0, metavar='N',
+                        help="split the tickers into N shards analyzed by separate worker processes")
+    parser.add_argument('--shard-processes', type=int, metavar='P',
+                        help="local worker processes for --shards (default: one per shard; 0 when workers "
+                             "on other hosts run 'sp500_shards.py worker' on a shared --shard-dir)")
+    parser.add_argument('--shard-dir', default=SHARD_DIR,
+                        help=f"directory holding a sharded run's plan and shard results (default: {SHARD_DIR})")
+    parser.add_argument('--metrics', action='store_true', help="print per-stage timings and counters after the run")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="profile the analysis with cProfile and write pstats data to FILE; the run is then "
+                             "single-threaded (--workers 1, no yfinance batches), and with --shards only the "
+                             "coordinator is profiled")
+    parser.add_argument('-q', '--quiet', action='store_true', help="skip the banner and the predictions table")
+    return parser.parse_args(argv)
+
+
+def ask_sample_size():
+    """Interactive sample size menu"""
     print("\n" + "-"*80)
     print("ANALYSIS OPTIONS:")
     print("1. Quick Test (analyze 50 companies) - ~2-3 minutes")
@@ -455,36 +1041,131 @@ def main():
     choice = input("\nSelect option (1/2/3) or press Enter for Quick Test: ").strip()
 
     if choice == '2':
-        sample_size = 200
+        return 200
     elif choice == '3':
-        sample_size = None  # All companies
+        return None  # All companies
+    return 50  # Default quick test
+
+
+def build_analyzer(args):
+    """Analyzer configured from parsed command-line arguments (shard workers use it too)"""
+    return SP500SentimentAnalyzer(
+        workers=args.workers,
+        rate_limit=args.rate_limit,
+        headline_cache=None if args.no_cache else HeadlineCache(),
+        score_cache_path=None if args.no_cache else 'sp500_scores.db',
+        batch_scoring=args.batch_scoring,
+        universe_loader=UniverseLoader(args.constituents, max_age=args.universe_max_age * 86400),
+        metrics=Metrics(enabled=args.metrics),
+        sources=SourceSelector(SP500SentimentAnalyzer.SOURCES, adaptive=not args.fixed_source_order),
+        yfinance_batch_size=args.yfinance_batch,
+        dedup=args.dedup,
+        downweight_shared=args.downweight_shared,
+        checkpoint=None if args.no_checkpoint else Checkpoint(args.checkpoint)
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if not args.quiet:
+        print(BANNER)
+
+    if args.shards and args.deadline:
+        print("--deadline cannot be combined with --shards. Exiting.")
+        return 1
+
+    analyzer = build_analyzer(args)
+    if args.profile and not args.shards:
+        # Work on pool threads would be missing from the profile
+        analyzer.run_serially()
+        print("[INFO] Profiling: analyzing on one thread (--workers 1, no yfinance batches)")
+
+    # Fetch S&P 500 list
+    if not analyzer.fetch_sp500_list():
+        print("Failed to fetch S&P 500 list. Exiting.")
+        return 1
+
+    if args.sector:
+        if analyzer.universe is None:
+            print("Sector filtering needs the S&P 500 universe, which could not be loaded. Exiting.")
+            return 1
+        analyzer.sp500_companies = analyzer.universe.companies(args.sector)
+        if not analyzer.sp500_companies:
+            print(f"No companies in sector '{args.sector}'. Sectors: {', '.join(analyzer.universe.sector_names)}")
+            return 1
+
+    if args.deadline:
+        history = None if args.no_history else HistoryStore(args.history)
+        analyzer.load_index_weights()
+        analyzer.scheduler = DeadlineScheduler(args.deadline, universe=analyzer.universe, history=history)
+
+    if hasattr(args, 'sample_size'):
+        sample_size = args.sample_size
+    elif args.deadline:
+        sample_size = None  # the deadline decides how many
+    elif sys.stdin.isatty():
+        sample_size = ask_sample_size()
     else:
-        sample_size = 50  # Default quick test
+        sample_size = 50
 
     # Run analysis
     print(f"\nStarting analysis with sample size: {sample_size if sample_size else 'ALL'}")
-    if not analyzer.analyze_all_companies(sample_size):
+    if args.shards:
+        # The coordinator merges the shard workers' checkpoints into one
+        companies = analyzer.sp500_companies
+        if sample_size:
+            companies = random.sample(companies, min(sample_size, len(companies)))
+        coordinator = ShardCoordinator(args.shard_dir, processes=args.shard_processes)
+        with profiled(args.profile):
+            analyzer.checkpoint = coordinator.run(companies, args.shards, vars(args), resume=args.resume,
+                                                  lease_seconds=analyzer.stall_seconds() + LEASE_MARGIN)
+        succeeded = len(analyzer.checkpoint) > 0
+    else:
+        with profiled(args.profile):
+            succeeded = analyzer.analyze_all_companies(sample_size, resume=args.resume)
+    if analyzer.checkpoint is not None:
+        analyzer.checkpoint.close()
+    if not succeeded:
         print("Analysis failed. Exiting.")
-        return
+        return 1
+
+    if args.metrics:
+        print("\n" + analyzer.metrics.summary())
+
+    # With a checkpoint, report on every row it holds (including those of an
+    # earlier, interrupted run) without loading them all
+    report = analyzer.checkpoint if analyzer.checkpoint is not None else analyzer
+
+    if not args.quiet:
+        # Get predictions
+        top_rises, top_falls = report.get_predictions(args.top)
 
-    # Get predictions
-    top_rises, top_falls = analyzer.get_predictions()
+        # Print results
+        analyzer.print_predictions(top_rises, top_falls)
 
-    # Print results
-    analyzer.print_predictions(top_rises, top_falls)
+    # Save results
+    if not report.save_results(args.output, args.format):
+        return 1
 
-    # Save to CSV
-    analyzer.save_results()
+    if not args.no_history:
+        results = analyzer.results if analyzer.checkpoint is None else analyzer.checkpoint.rows()
+        rows = HistoryStore(args.history).append(results)
+        print(f"[OK] Recorded {rows} scores in history store '{args.history}'")
 
-    print("\n[OK] Analysis complete! Check 'sp500_sentiment_results.csv' for full data.")
+    print(f"\n[OK] Analysis complete! Check '{args.output}' for full data.")
+    return 0
 
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
         print("\n\nAnalysis interrupted by user. Exiting...")
+        print("Finished tickers are kept in the checkpoint; rerun with --resume to continue.")
+        sys.exit(130)
     except Exception as e:
         print(f"\n\nUnexpected error: {e}")
         import traceback
         traceback.print_exc()
+        sys.exit(1)
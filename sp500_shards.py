@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sharded runs for the S&P 500 Sentiment Analyzer
+Splits a run's tickers into shards by a stable hash and analyzes them in
+worker processes, on this machine or on other hosts sharing the shard
+directory, then merges the shards' checkpoints into one result file.
+
+    python sp500_sentiment_analyzer.py -n all --shards 8          # coordinator + 8 local workers
+    python sp500_shards.py worker sp500_shards                    # extra worker on another host
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from sp500_checkpoint import Checkpoint, CHECKPOINT_VERSION
+
+SHARD_DIR = 'sp500_shards'
+
+# Seconds without a heartbeat after which a worker's shard lease can be taken
+# (plans written before leases were sized per run)
+LEASE_SECONDS = 30
+
+# A run's lease is the longest a healthy worker can go without progress
+# (SP500SentimentAnalyzer.stall_seconds) plus this margin. Workers only beat
+# while the analysis makes progress, so a hung one lets its lease go stale
+LEASE_MARGIN = 30
+
+# Seconds between a waiting worker's or the coordinator's checks
+POLL_SECONDS = 0.5
+
+# Replacement worker processes the coordinator starts after failures
+RETRIES = 3
+
+
+def shard_of(ticker, shards):
+    """Shard number of a ticker; the same on every host and Python version"""
+    return int(hashlib.sha1(ticker.encode('utf-8')).hexdigest()[:8], 16) % shards
+
+
+def worker_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ShardDirectory:
+    """
+    A sharded run's state, as files in one directory:
+
+    - plan.json: the companies in run order, the shard count and the CLI
+      options every worker builds its analyzer from
+    - shard-NNN.ndjson: the shard's checkpoint (see sp500_checkpoint)
+    - shard-NNN.lease: held by the worker analyzing the shard, which
+      touches it every third of the plan's lease_seconds while its analysis
+      makes progress; one not touched for lease_seconds belongs to a dead
+      or hung worker and can be taken over
+    - shard-NNN.done: written when the shard's checkpoint is complete
+
+    Leases are created with O_EXCL and taken over by renaming the stale
+    file away, so on a local or NFS directory only one worker gets a shard.
+    A worker that takes over a shard resumes its checkpoint.
+    """
+
+    def __init__(self, path=SHARD_DIR):
+        self.path = path
+        self.loaded_plan = None
+
+    def file(self, shard, kind):
+        return os.path.join(self.path, f"shard-{shard:03d}.{kind}")
+
+    def create(self, companies, shards, options, lease_seconds=LEASE_SECONDS):
+        """Write a new plan, removing any earlier run's shard files"""
+        os.makedirs(self.path, exist_ok=True)
+        for name in os.listdir(self.path):
+            if name.startswith(('shard-', 'worker-')) or name == 'merged.ndjson':
+                os.remove(os.path.join(self.path, name))
+
+        plan = {
+            'shards': shards,
+            'companies': [{key: company.get(key, '') for key in ('ticker', 'name', 'sector')}
+                          for company in companies],
+            'options': options,
+            'lease_seconds': lease_seconds,
+        }
+        temporary = os.path.join(self.path, f"plan.json.{os.getpid()}")
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(plan, f)
+        os.replace(temporary, os.path.join(self.path, 'plan.json'))
+        self.loaded_plan = plan
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, 'plan.json'))
+
+    @property
+    def plan(self):
+        if self.loaded_plan is None:
+            with open(os.path.join(self.path, 'plan.json'), encoding='utf-8') as f:
+                self.loaded_plan = json.load(f)
+        return self.loaded_plan
+
+    @property
+    def shards(self):
+        return self.plan['shards']
+
+    @property
+    def lease_seconds(self):
+        return self.plan.get('lease_seconds', LEASE_SECONDS)
+
+    def companies(self, shard):
+        """The shard's companies, in run order"""
+        return [company for company in self.plan['companies']
+                if shard_of(company['ticker'], self.shards) == shard]
+
+    def is_done(self, shard):
+        return os.path.exists(self.file(shard, 'done'))
+
+    def pending(self):
+        return [shard for shard in range(self.shards) if not self.is_done(shard)]
+
+    # Leases
+
+    def claim(self, owner):
+        """Lease the first shard that is neither done nor leased; returns its number or None"""
+        for shard in self.pending():
+            lease = self.file(shard, 'lease')
+            age = self.lease_age(shard)
+            if age is not None:
+                if age < self.lease_seconds or not self.expire(lease, owner):
+                    continue
+
+            try:
+                fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue  # another worker was quicker
+            with os.fdopen(fd, 'w') as f:
+                f.write(owner)
+            if self.is_done(shard):
+                # Finished between pending() and the lease
+                self.release(shard)
+                continue
+            return shard
+        return None
+
+    def expire(self, lease, owner):
+        """Move a stale lease aside; False if another worker got to it first"""
+        expired = f"{lease}.expired-{owner.replace(':', '-')}"
+        try:
+            os.rename(lease, expired)
+        except FileNotFoundError:
+            return False
+        # The lease renamed may be a fresh one created since it was found stale
+        if time.time() - os.stat(expired).st_mtime < self.lease_seconds:
+            try:
+                os.link(expired, lease)
+            except FileExistsError:
+                pass
+            os.remove(expired)
+            return False
+        os.remove(expired)
+        return True
+
+    def owner(self, shard):
+        try:
+            with open(self.file(shard, 'lease'), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def lease_age(self, shard):
+        """Seconds since the shard's lease was last touched, or None without a lease"""
+        try:
+            return time.time() - os.stat(self.file(shard, 'lease')).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def stale_owner(self, owner):
+        """Whether `owner` holds a lease it stopped renewing lease_seconds ago"""
+        for shard in self.pending():
+            age = self.lease_age(shard)
+            if age is not None and age >= self.lease_seconds and self.owner(shard) == owner:
+                return True
+        return False
+
+    def heartbeat(self, shard):
+        try:
+            os.utime(self.file(shard, 'lease'))
+        except FileNotFoundError:
+            pass
+
+    def release(self, shard):
+        try:
+            os.remove(self.file(shard, 'lease'))
+        except FileNotFoundError:
+            pass
+
+    def release_owner(self, owner):
+        """Drop the leases of a worker known to be dead, so others take its shards at once"""
+        for shard in self.pending():
+            if self.owner(shard) == owner:
+                self.release(shard)
+
+    def finish(self, shard, owner):
+        """Mark a shard done, unless its lease was taken over meanwhile"""
+        if self.owner(shard) != owner:
+            return False
+        with open(self.file(shard, 'done'), 'w', encoding='utf-8') as f:
+            f.write(owner)
+        self.release(shard)
+        return True
+
+    # Results
+
+    def merge(self):
+        """
+        Combine the shards' checkpoints, complete or not, into one
+        checkpoint in run order (merged.ndjson) and return it. Its
+        get_predictions and save_results give what one process analyzing
+        the whole plan with a checkpoint would.
+        """
+        tickers = [company['ticker'] for company in self.plan['companies']]
+        located = {}
+        for shard in range(self.shards):
+            path = self.file(shard, 'ndjson')
+            if os.path.exists(path):
+                checkpoint = Checkpoint(path)
+                checkpoint.repair()
+                located.update((ticker, (path, offset)) for ticker, offset in checkpoint.offsets().items())
+
+        merged = os.path.join(self.path, 'merged.ndjson')
+        files = {}
+        try:
+            with open(merged, 'wb') as out:
+                out.write(json.dumps({'checkpoint': CHECKPOINT_VERSION, 'tickers': tickers}).encode('utf-8') + b'\n')
+                for ticker in tickers:
+                    if ticker in located:
+                        path, offset = located[ticker]
+                        if path not in files:
+                            files[path] = open(path, 'rb')
+                        files[path].seek(offset)
+                        out.write(files[path].readline())
+        finally:
+            for f in files.values():
+                f.close()
+
+        missing = len(tickers) - len(located)
+        if missing:
+            print(f"[WARNING] {missing} of {len(tickers)} tickers have no result in any shard")
+        return Checkpoint(merged)
+
+
+def run_worker(directory, owner=None):
+    """
+    Analyze shards of the plan in `directory` until all are done; returns
+    the number of shards this worker finished. Waits for shards leased by
+    other workers, taking them over if their leases go stale.
+    """
+    import sp500_sentiment_analyzer
+
+    directory = ShardDirectory(directory) if isinstance(directory, str) else directory
+    owner = owner or worker_owner()
+    options = argparse.Namespace(**directory.plan['options'])
+    analyzer = sp500_sentiment_analyzer.build_analyzer(options)
+
+    finished = 0
+    while directory.pending():
+        shard = directory.claim(owner)
+        if shard is None:
+            time.sleep(POLL_SECONDS)
+            continue
+
+        stop = threading.Event()
+        progressed_at = [time.monotonic()]
+
+        def progressed(*args):
+            progressed_at[0] = time.monotonic()
+
+        def beat():
+            # Renew the lease only while the analysis makes progress (tickers,
+            # source fetches, scoring chunks), so a hung fetch or a deadlocked
+            # pool lets the shard be taken over
+            while not stop.wait(directory.lease_seconds / 3):
+                if time.monotonic() - progressed_at[0] < directory.lease_seconds:
+                    directory.heartbeat(shard)
+
+        analyzer.progress_callback = progressed
+        analyzer.heartbeat = progressed
+
+        heartbeat = threading.Thread(target=beat, name='sp500-shard-lease', daemon=True)
+        heartbeat.start()
+        try:
+            print(f"[INFO] {owner} analyzing shard {shard} of {directory.shards}")
+            analyzer.checkpoint = Checkpoint(directory.file(shard, 'ndjson'))
+            analyzer.sp500_companies = directory.companies(shard)
+            if analyzer.sp500_companies and not analyzer.analyze_all_companies(resume=True):
+                raise RuntimeError(f"analysis of shard {shard} failed")
+        finally:
+            stop.set()
+            heartbeat.join()
+            if analyzer.checkpoint is not None:
+                analyzer.checkpoint.close()
+        if directory.finish(shard, owner):
+            finished += 1
+        else:
+            print(f"[WARNING] Lease on shard {shard} was taken over; its new owner finishes it")
+    return finished
+
+
+class ShardCoordinator:
+    """
+    Runs a sharded analysis: writes the plan, keeps `processes` local
+    workers running (starting a replacement, up to `retries` times, when
+    one fails, and releasing its leases so its shards are reassigned at
+    once), and merges the shards when all are done. Workers started by
+    hand on other hosts against the same directory join in; with
+    processes=0 the coordinator only waits for them. A local worker whose
+    lease went stale (no progress for the plan's lease_seconds) is hung:
+    it is killed and handled like a failed one.
+    """
+
+    def __init__(self, directory=SHARD_DIR, processes=None, retries=RETRIES, command=None):
+        self.directory = ShardDirectory(directory)
+        self.processes = processes
+        self.retries = retries
+        # Command line starting one worker (the shard directory is appended)
+        self.command = command or [sys.executable, os.path.abspath(__file__), 'worker']
+
+    def start_worker(self):
+        log = open(os.path.join(self.directory.path, f"worker-{time.time_ns()}.log"), 'w')
+        try:
+            return subprocess.Popen(self.command + [self.directory.path], stdout=log, stderr=subprocess.STDOUT)
+        finally:
+            log.close()
+
+    def run(self, companies, shards, options, resume=False, lease_seconds=LEASE_SECONDS):
+        """
+        Analyze `companies` in `shards` shards; returns the merged Checkpoint.
+        `lease_seconds` is how long a worker may go without progress.
+        """
+        if resume and self.directory.exists():
+            print(f"[INFO] Resuming the sharded run in {self.directory.path}: "
+                  f"{len(self.directory.pending())} of {self.directory.shards} shards left")
+        else:
+            self.directory.create(companies, shards, options, lease_seconds)
+
+        processes = self.directory.shards if self.processes is None else self.processes
+        running = [self.start_worker() for _ in range(min(processes, len(self.directory.pending())))]
+        print(f"[INFO] {len(running)} local workers analyzing {self.directory.shards} shards "
+              f"in {self.directory.path}")
+        retries = self.retries
+        done = 0
+        while self.directory.pending():
+            for worker in list(running):
+                code = worker.poll()
+                if code is None:
+                    if self.directory.stale_owner(f"{socket.gethostname()}:{worker.pid}"):
+                        print(f"[WARNING] Worker {worker.pid} stopped making progress, killing it")
+                        worker.kill()
+                    continue
+                running.remove(worker)
+                if code != 0:
+                    self.directory.release_owner(f"{socket.gethostname()}:{worker.pid}")
+                    if retries > 0 and self.directory.pending():
+                        retries -= 1
+                        print(f"[WARNING] Worker {worker.pid} exited with {code}, starting a replacement")
+                        running.append(self.start_worker())
+
+            if processes and not running and self.directory.pending():
+                print(f"[ERROR] All workers stopped with shards {self.directory.pending()} unfinished")
+                break
+
+            left = self.directory.shards - len(self.directory.pending())
+            if left != done:
+                done = left
+                print(f"[INFO] {done} of {self.directory.shards} shards done")
+            time.sleep(POLL_SECONDS)
+
+        # A worker still running here lost its shard to another (e.g. it hung)
+        deadline = time.monotonic() + self.directory.lease_seconds
+        for worker in running:
+            try:
+                worker.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                print(f"[WARNING] Worker {worker.pid} did not exit after all shards were done, killing it")
+                worker.kill()
+                worker.wait()
+        return self.directory.merge()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze shards of a sharded S&P 500 sentiment run (see --shards in sp500_sentiment_analyzer.py)."
+    )
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('directory', nargs='?', default=SHARD_DIR,
+                        help=f"shard directory shared with the coordinator (default: {SHARD_DIR})")
+    args = parser.parse_args(argv)
+
+    while not ShardDirectory(args.directory).exists():
+        time.sleep(POLL_SECONDS)
+    finished = run_worker(args.directory)
+    print(f"[OK] Finished {finished} shards")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
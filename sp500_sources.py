@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+News source selection for the S&P 500 Sentiment Analyzer
+Orders the news sources per ticker by expected payoff (success rate and
+latency observed so far) and skips a source behind a circuit breaker
+for a cool-down after repeated failures.
+"""
+
+import itertools
+import threading
+import time
+
+# Consecutive failures (errors or timeouts, not empty results) that open a breaker
+FAILURE_THRESHOLD = 5
+
+# Seconds an open breaker skips its source; doubled after each failed probe
+COOL_DOWN = 60
+MAX_COOL_DOWN = 600
+
+# Weight of the newest observation in the moving averages
+SMOOTHING = 0.2
+
+# Starting estimates, equal for every source so the default order holds
+# until there is evidence
+PRIOR_SUCCESS = 0.5
+PRIOR_LATENCY = 1.0
+
+# The default order also reflects headline quality: a source has to be this
+# many times cheaper than the one before it in that order to be tried first
+PREFERENCE = 2.0
+
+# Every this many tickers the default order is used, so sources ranked
+# last keep being measured and can move back up once they recover
+EXPLORE_EVERY = 20
+
+
+class CircuitBreaker:
+    """
+    Closed until `threshold` consecutive failures, then open for
+    `cool_down` seconds. After that one caller at a time may probe the
+    source (at most one per cool-down); a success closes the breaker and
+    a failure re-opens it with twice the cool-down, up to `max_cool_down`.
+    Not thread-safe on its own; SourceSelector holds a lock around it.
+    """
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, cool_down=COOL_DOWN, max_cool_down=MAX_COOL_DOWN):
+        self.threshold = threshold
+        self.base_cool_down = cool_down
+        self.max_cool_down = max_cool_down
+        self.cool_down = cool_down
+        self.failures = 0
+        self.opened_at = None  # monotonic time the breaker opened (or was last probed)
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self, now):
+        """Whether a request may go to the source now"""
+        if self.opened_at is None:
+            return True
+        if now - self.opened_at < self.cool_down:
+            return False
+        # Half-open: let this caller probe and hold the others off for another cool-down
+        self.opened_at = now
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.cool_down = self.base_cool_down
+
+    def failure(self, now):
+        """Count a failure; returns True if this opened the breaker"""
+        self.failures += 1
+        if self.opened_at is not None:
+            # A failed probe
+            self.cool_down = min(self.cool_down * 2, self.max_cool_down)
+            self.opened_at = now
+            return False
+        if self.failures >= self.threshold:
+            self.opened_at = now
+            return True
+        return False
+
+
+class SourceStats:
+    """Moving averages of one source's live fetches"""
+
+    __slots__ = ('success', 'latency', 'fetches')
+
+    def __init__(self):
+        self.success = PRIOR_SUCCESS
+        self.latency = PRIOR_LATENCY
+        self.fetches = 0
+
+    def record(self, ok, seconds):
+        self.success += SMOOTHING * ((1.0 if ok else 0.0) - self.success)
+        self.latency += SMOOTHING * (seconds - self.latency)
+        self.fetches += 1
+
+    @property
+    def expected_cost(self):
+        """Seconds spent per ticker that gets headlines from this source"""
+        return self.latency / max(self.success, 0.01)
+
+
+class SourceSelector:
+    """
+    Thread-safe, shared by all fetch workers (and kept across refreshes).
+
+    order(ticker) lists the sources cheapest expected cost first, i.e.
+    latency divided by success rate, which minimises the expected time to
+    the first source with headlines; each step down the default order
+    multiplies a source's cost by `preference`. Per ticker, the source that last had
+    headlines goes first and sources that last came back empty go last.
+    Every `explore_every`-th call returns the default order instead.
+    allow(source) is False while the source's breaker is open.
+
+    With adaptive=False sources are always tried in the given order and
+    never skipped.
+    """
+
+    def __init__(self, sources, adaptive=True, threshold=FAILURE_THRESHOLD, cool_down=COOL_DOWN,
+                 max_cool_down=MAX_COOL_DOWN, preference=PREFERENCE, explore_every=EXPLORE_EVERY):
+        self.sources = tuple(sources)
+        self.adaptive = adaptive
+        self.preference = preference
+        self.explore_every = explore_every
+        self.calls = itertools.count(1)
+        self.stats = {source: SourceStats() for source in self.sources}
+        self.breakers = {source: CircuitBreaker(threshold, cool_down, max_cool_down) for source in self.sources}
+        self.last_hit = {}   # ticker -> source that last returned headlines
+        self.empty = set()   # (ticker, source) pairs whose last fetch was empty
+        self.lock = threading.Lock()
+
+    def order(self, ticker):
+        if not self.adaptive or next(self.calls) % self.explore_every == 0:
+            return self.sources
+        return self.ranked(ticker)
+
+    def ranked(self, ticker):
+        """order() without the periodic default order"""
+        if not self.adaptive:
+            return self.sources
+
+        with self.lock:
+            rank = {source: (self.stats[source].expected_cost * self.preference ** i, i)
+                    for i, source in enumerate(self.sources)}
+            hit = self.last_hit.get(ticker)
+            empty = {source for source in self.sources if (ticker, source) in self.empty}
+
+        def key(source):
+            return (source != hit, source in empty, rank[source])
+
+        return tuple(sorted(self.sources, key=key))
+
+    def allow(self, source):
+        if not self.adaptive:
+            return True
+        with self.lock:
+            return self.breakers[source].allow(time.monotonic())
+
+    def record(self, source, ticker, headlines, seconds):
+        """
+        Record a live fetch: headlines is None for a failure (error or
+        timeout), empty for no news. Returns True if the failure opened
+        the source's breaker.
+        """
+        with self.lock:
+            self.stats[source].record(bool(headlines), seconds)
+            if not self.adaptive:
+                return False
+            breaker = self.breakers[source]
+
+            if headlines is None:
+                return breaker.failure(time.monotonic())
+
+            breaker.success()
+            if headlines:
+                self.last_hit[ticker] = source
+                self.empty.discard((ticker, source))
+            else:
+                self.empty.add((ticker, source))
+            return False
+
+    def cool_down(self, source):
+        with self.lock:
+            return self.breakers[source].cool_down
+
+    def summary(self):
+        """One-line report of each source's success rate, latency and breaker"""
+        parts = []
+        with self.lock:
+            for source in self.sources:
+                stats = self.stats[source]
+                if not stats.fetches:
+                    continue
+                state = ', breaker open' if self.breakers[source].is_open else ''
+                parts.append(f"{source} {stats.success:.0%} ok, {stats.latency * 1000:.0f} ms{state}")
+        return "Sources: " + ('; '.join(parts) if parts else 'no live fetches')
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared results store for the S&P 500 Sentiment Dashboard
+Lets several gunicorn workers serve the same data while one background
+analysis job writes it, using a single SQLite database in WAL mode.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+RESULTS_DB_PATH = 'sp500_results.db'
+
+
+class ResultsStore:
+    """
+    Versioned dashboard snapshots, an SSE event log and a job lease.
+
+    Each snapshot is written as one row in one transaction, so readers see
+    either the previous or the new result set, never a mix. Event ids are
+    shared by every process, so Last-Event-ID works across workers.
+    """
+
+    def __init__(self, path=RESULTS_DB_PATH, keep_snapshots=10, keep_events=5000):
+        self.path = path
+        self.keep_snapshots = keep_snapshots
+        self.keep_events = keep_events
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                version INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_by_type ON events (event, id);
+            CREATE TABLE IF NOT EXISTS job (
+                name TEXT PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS metrics (
+                owner TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+        ''')
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def write(self, statements):
+        """Run (sql, params) statements in one immediate transaction"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = None
+                for sql, params in statements:
+                    cursor = self.conn.execute(sql, params)
+                self.conn.execute('COMMIT')
+                return cursor
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    # Snapshots
+
+    def publish_snapshot(self, data):
+        """Store a complete result set as the new current version"""
+        self.write([
+            ('INSERT INTO snapshots (created_at, data) VALUES (?, ?)', (time.time(), json.dumps(data))),
+            ('DELETE FROM snapshots WHERE version <= (SELECT MAX(version) FROM snapshots) - ?',
+             (self.keep_snapshots,)),
+        ])
+        return self.snapshot_version()
+
+    def snapshot_version(self):
+        """Current snapshot version, 0 if nothing was published yet"""
+        return self.query('SELECT COALESCE(MAX(version), 0) FROM snapshots')[0][0]
+
+    def latest_snapshot(self):
+        """(version, data) of the current snapshot, or (0, None)"""
+        rows = self.query('SELECT version, data FROM snapshots ORDER BY version DESC LIMIT 1')
+        if not rows:
+            return 0, None
+        return rows[0][0], json.loads(rows[0][1])
+
+    # Events
+
+    def append_event(self, event, data, only_if_changed=True):
+        """Append an event; by default skip it if equal to the last of its type"""
+        payload = json.dumps(data, sort_keys=True)
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                if only_if_changed:
+                    row = self.conn.execute(
+                        'SELECT data FROM events WHERE event = ? ORDER BY id DESC LIMIT 1', (event,)
+                    ).fetchone()
+                    if row is not None and row[0] == payload:
+                        self.conn.execute('COMMIT')
+                        return None
+
+                event_id = self.conn.execute(
+                    'INSERT INTO events (event, data) VALUES (?, ?)', (event, payload)
+                ).lastrowid
+                if event_id % 1000 == 0:
+                    self.conn.execute('DELETE FROM events WHERE id <= ?', (event_id - self.keep_events,))
+                self.conn.execute('COMMIT')
+                return event_id
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def events_after(self, event_id, limit=1000):
+        """Events with id greater than `event_id` as (id, event, data)"""
+        rows = self.query('SELECT id, event, data FROM events WHERE id > ? ORDER BY id LIMIT ?',
+                          (event_id, limit))
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    def latest_events(self, event_types):
+        """Most recent event of each given type, oldest first"""
+        entries = []
+        for event in event_types:
+            rows = self.query('SELECT id, event, data FROM events WHERE event = ? ORDER BY id DESC LIMIT 1',
+                              (event,))
+            entries.extend((row[0], row[1], json.loads(row[2])) for row in rows)
+        return sorted(entries)
+
+    def last_event_id(self):
+        return self.query('SELECT COALESCE(MAX(id), 0) FROM events')[0][0]
+
+    # Background job lease
+
+    def acquire_job(self, owner, lease_seconds=3600, name='analysis'):
+        """Take the job lease unless another live owner holds it"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute('SELECT owner, expires_at FROM job WHERE name = ?', (name,)).fetchone()
+                if row is not None and row[0] is not None and row[0] != owner and row[1] > now:
+                    self.conn.execute('COMMIT')
+                    return False
+
+                self.conn.execute('INSERT OR REPLACE INTO job VALUES (?, ?, ?)',
+                                  (name, owner, now + lease_seconds))
+                self.conn.execute('COMMIT')
+                return True
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def release_job(self, owner, name='analysis'):
+        self.write([('UPDATE job SET owner = NULL WHERE name = ? AND owner = ?', (name, owner))])
+
+    # Metrics
+
+    def publish_metrics(self, owner, snapshot):
+        """Store one process's sp500_metrics snapshot, replacing its previous one"""
+        self.write([('INSERT OR REPLACE INTO metrics VALUES (?, ?, ?)', (owner, time.time(), json.dumps(snapshot)))])
+
+    def metrics_snapshots(self, exclude=None):
+        """Every stored metrics snapshot except `exclude`'s"""
+        rows = self.query('SELECT data FROM metrics WHERE owner IS NOT ?', (exclude,))
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        self.conn.close()
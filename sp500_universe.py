@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+S&P 500 universe for the S&P 500 Sentiment Analyzer
+Loads the index constituents with sector, industry and market-cap weight
+from a local CSV file or a cached snapshot, refreshing the snapshot from
+Wikipedia only when it is older than a configured age.
+"""
+
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+from array import array
+
+CONSTITUENTS_PATH = 'sp500_constituents.csv'
+UNIVERSE_SNAPSHOT_PATH = 'sp500_universe.json'
+CONSTITUENTS_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+MAX_AGE = 7 * 24 * 3600  # the index changes a few times a quarter
+
+# Consecutive failed market-cap lookups after which the rest are skipped
+MARKET_CAP_FAILURES = 20
+
+# Accepted column names in a constituents file (Wikipedia's table headers included)
+COLUMN_ALIASES = {
+    'ticker': ('ticker', 'symbol'),
+    'name': ('name', 'security', 'company'),
+    'sector': ('sector', 'gics sector'),
+    'industry': ('industry', 'gics sub-industry', 'sub-industry'),
+    'weight': ('weight', 'index weight'),
+    'market_cap': ('market_cap', 'market cap', 'marketcap'),
+}
+
+# Root of 1-5 letters, optionally a share class: BRK.B, BF.B
+TICKER_PATTERN = re.compile(r'^[A-Z]{1,5}(\.[A-Z]{1,2})?$')
+
+
+def normalize_ticker(value):
+    """
+    Canonical ticker, e.g. ' brk-b ', 'BRK/B' and 'BRK.B' all become
+    'BRK.B'. Returns None if the result is not a valid ticker.
+    """
+    ticker = re.sub(r'[-/ ]', '.', str(value).strip().upper())
+    return ticker if TICKER_PATTERN.match(ticker) else None
+
+
+def parse_number(value):
+    """Float from '1,234.5', '3.2%' or '' (NaN when missing or malformed)"""
+    try:
+        return float(str(value).replace(',', '').replace('%', '').strip())
+    except ValueError:
+        return math.nan
+
+
+class Universe:
+    """
+    Index constituents stored column by column.
+
+    Sectors and industries are kept as small integer codes into a list of
+    distinct names and weights as a float array, so filtering or grouping
+    by sector touches one compact array instead of 500 dicts.
+    """
+
+    def __init__(self, tickers, names, sectors, industries, weights, fetched_at=None, source=None):
+        self.tickers = tuple(tickers)
+        self.names = tuple(names)
+        self.sector_names, self.sector_codes = self.encode(sectors, 'B')
+        self.industry_names, self.industry_codes = self.encode(industries, 'H')
+        self.weights = array('d', weights)
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.source = source
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @staticmethod
+    def encode(values, typecode):
+        """(distinct names in first-seen order, array of codes into them)"""
+        names = {}
+        codes = array(typecode, (names.setdefault(sys.intern(value or ''), len(names)) for value in values))
+        return tuple(names), codes
+
+    @classmethod
+    def from_rows(cls, rows, source=None):
+        """
+        Build a universe from dicts with ticker, name and optional sector,
+        industry, weight or market_cap. Invalid tickers are dropped and
+        repeats (after normalization) keep their first row. Weights are
+        taken as given, or derived from market caps when no row has one.
+        """
+        seen = set()
+        columns = {'ticker': [], 'name': [], 'sector': [], 'industry': [], 'weight': [], 'market_cap': []}
+        invalid = duplicates = 0
+
+        for row in rows:
+            ticker = normalize_ticker(row.get('ticker', ''))
+            if ticker is None:
+                invalid += 1
+                continue
+            if ticker in seen:
+                duplicates += 1
+                continue
+            seen.add(ticker)
+
+            columns['ticker'].append(ticker)
+            columns['name'].append((row.get('name') or ticker).strip())
+            columns['sector'].append((row.get('sector') or '').strip())
+            columns['industry'].append((row.get('industry') or '').strip())
+            columns['weight'].append(parse_number(row.get('weight', '')))
+            columns['market_cap'].append(parse_number(row.get('market_cap', '')))
+
+        if invalid or duplicates:
+            print(f"[INFO] Universe: skipped {invalid} invalid and {duplicates} duplicate tickers")
+
+        weights = columns['weight']
+        if all(math.isnan(weight) for weight in weights):
+            weights = normalize_weights(columns['market_cap'])
+        else:
+            weights = normalize_weights(weights)
+
+        return cls(columns['ticker'], columns['name'], columns['sector'], columns['industry'], weights,
+                   source=source)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.index
+
+    def sector(self, ticker):
+        return self.sector_names[self.sector_codes[self.index[ticker]]]
+
+    def industry(self, ticker):
+        return self.industry_names[self.industry_codes[self.index[ticker]]]
+
+    def weight(self, ticker):
+        return self.weights[self.index[ticker]]
+
+    def has_weights(self):
+        return not all(math.isnan(weight) for weight in self.weights)
+
+    def set_market_caps(self, caps):
+        """Replace the weights with ones derived from ticker -> market cap"""
+        self.weights = array('d', normalize_weights([caps.get(ticker, math.nan) for ticker in self.tickers]))
+
+    def company(self, i):
+        """Row `i` in the {'ticker', 'name', ...} form used by the analyzer"""
+        return {
+            'ticker': self.tickers[i],
+            'name': self.names[i],
+            'sector': self.sector_names[self.sector_codes[i]],
+            'industry': self.industry_names[self.industry_codes[i]],
+            'weight': self.weights[i],
+        }
+
+    def companies(self, sector=None):
+        """Constituents as company dicts, optionally only one sector"""
+        return [self.company(i) for i in self.rows(sector)]
+
+    def rows(self, sector=None):
+        """Row positions, optionally only those in `sector` (case-insensitive)"""
+        if sector is None:
+            return range(len(self))
+        codes = {code for code, name in enumerate(self.sector_names) if name.lower() == sector.lower()}
+        return [i for i, code in enumerate(self.sector_codes) if code in codes]
+
+    def sector_weights(self):
+        """Sector -> total index weight, heaviest first"""
+        totals = [0.0] * len(self.sector_names)
+        for code, weight in zip(self.sector_codes, self.weights):
+            if not math.isnan(weight):
+                totals[code] += weight
+        return dict(sorted(zip(self.sector_names, totals), key=lambda item: -item[1]))
+
+    # Snapshot files
+
+    def to_json(self):
+        return {
+            'fetched_at': self.fetched_at,
+            'source': self.source,
+            'tickers': self.tickers,
+            'names': self.names,
+            'sector_names': self.sector_names,
+            'sector_codes': self.sector_codes.tolist(),
+            'industry_names': self.industry_names,
+            'industry_codes': self.industry_codes.tolist(),
+            # JSON has no NaN; unknown weights are stored as null
+            'weights': [None if math.isnan(weight) else weight for weight in self.weights],
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        sectors = [data['sector_names'][code] for code in data['sector_codes']]
+        industries = [data['industry_names'][code] for code in data['industry_codes']]
+        weights = [math.nan if weight is None else weight for weight in data['weights']]
+        return cls(data['tickers'], data['names'], sectors, industries, weights,
+                   fetched_at=data['fetched_at'], source=data.get('source'))
+
+    def save(self, path):
+        """Write the snapshot atomically, so readers never see half a file"""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, separators=(',', ':'))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+
+def normalize_weights(values):
+    """Values scaled to sum to 1, ignoring NaN (all NaN if none is known)"""
+    total = sum(value for value in values if not math.isnan(value))
+    return [value / total if total else math.nan for value in values]
+
+
+def read_constituents(path):
+    """Rows of a constituents CSV, with its columns mapped to universe fields"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        headers = {header.strip().lower(): header for header in reader.fieldnames or ()}
+        mapping = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in headers:
+                    mapping[field] = headers[alias]
+                    break
+
+        if 'ticker' not in mapping:
+            raise ValueError(f"{path}: no ticker/symbol column")
+
+        return [{field: row.get(column) or '' for field, column in mapping.items()} for row in reader]
+
+
+def parse_constituents_table(content):
+    """Rows of the constituents table on Wikipedia's S&P 500 list page"""
+    from lxml import html
+
+    document = html.fromstring(content)
+    table = document.get_element_by_id('constituents', None)
+    if table is None:
+        raise ValueError('constituents table not found')
+
+    rows = table.findall('.//tr')
+    headers = [cell.text_content().strip().lower() for cell in rows[0].findall('th')]
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in headers:
+                mapping[field] = headers.index(alias)
+                break
+
+    constituents = []
+    for row in rows[1:]:
+        cells = [cell.text_content().strip() for cell in row.findall('td')]
+        if len(cells) == len(headers):
+            constituents.append({field: cells[column] for field, column in mapping.items()})
+    return constituents
+
+
+def fetch_market_caps(tickers, workers=8, rate_limiter=None):
+    """
+    Ticker -> market cap via yfinance (NaN where unavailable). Lookups are
+    paced by `rate_limiter` (an sp500_http.HostRateLimiter, host 'yfinance'),
+    and skipped once MARKET_CAP_FAILURES in a row have failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import yfinance as yf
+
+    failures = [0]
+
+    def market_cap(ticker):
+        if failures[0] >= MARKET_CAP_FAILURES:
+            return math.nan
+        if rate_limiter is not None:
+            rate_limiter.acquire('yfinance')
+        try:
+            # yfinance spells share classes with a dash: BRK-B
+            cap = float(yf.Ticker(ticker.replace('.', '-')).fast_info['marketCap'])
+        except Exception:
+            failures[0] += 1
+            return math.nan
+        failures[0] = 0
+        return cap
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(tickers, executor.map(market_cap, tickers)))
+
+
+class UniverseLoader:
+    """
+    Resolves the universe without touching the network when it can.
+
+    A local constituents file wins. Otherwise the cached snapshot is used
+    while younger than `max_age` seconds; an older (or missing) snapshot
+    is refreshed from `url`, and a stale snapshot is still used if that
+    refresh fails. A refresh reads only the constituents table: market
+    caps take a yfinance lookup per ticker, so load_weights() fetches them
+    when a run first needs weights, and they are kept in the snapshot.
+    """
+
+    def __init__(self, constituents_path=CONSTITUENTS_PATH, snapshot_path=UNIVERSE_SNAPSHOT_PATH,
+                 max_age=MAX_AGE, url=CONSTITUENTS_URL, market_caps=True):
+        self.constituents_path = constituents_path
+        self.snapshot_path = snapshot_path
+        self.max_age = max_age
+        self.url = url
+        self.market_caps = market_caps
+
+    def load(self):
+        """The universe, or None if no source is available"""
+        if self.constituents_path and os.path.exists(self.constituents_path):
+            universe = Universe.from_rows(read_constituents(self.constituents_path),
+                                          source=self.constituents_path)
+            print(f"[OK] Loaded {len(universe)} constituents from {self.constituents_path}")
+            return universe
+
+        snapshot = self.load_snapshot()
+        if snapshot is not None and time.time() - snapshot.fetched_at < self.max_age:
+            return snapshot
+
+        try:
+            universe = self.refresh()
+        except Exception as e:
+            print(f"[INFO] Universe refresh failed: {str(e)[:80]}")
+            if snapshot is not None:
+                print("[INFO] Using the stale universe snapshot")
+            return snapshot
+
+        if self.snapshot_path:
+            universe.save(self.snapshot_path)
+        return universe
+
+    def load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            return Universe.load(self.snapshot_path)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print(f"[INFO] Ignoring unreadable universe snapshot: {str(e)[:80]}")
+            return None
+
+    def refresh(self):
+        """Download the constituents (and market caps) and build a universe"""
+        import requests
+        from sp500_http import PAGE_HEADERS
+
+        print(f"[INFO] Refreshing S&P 500 constituents from {self.url}")
+        response = requests.get(self.url, headers=PAGE_HEADERS, timeout=30)
+        response.raise_for_status()
+        rows = parse_constituents_table(response.content)
+
+        universe = Universe.from_rows(rows, source=self.url)
+        previous = self.load_snapshot()
+        if previous is not None and not universe.has_weights() and previous.has_weights():
+            # Keep the weights already fetched for tickers still in the index
+            universe.set_market_caps({ticker: previous.weight(ticker) for ticker in previous.tickers})
+        return universe
+
+    def load_weights(self, universe, rate_limiter=None):
+        """
+        Fill in market-cap weights for a universe from `url` that has none,
+        paced by `rate_limiter`, and save them with the snapshot
+        """
+        if not self.market_caps or universe.source != self.url or universe.has_weights():
+            return universe
+
+        print(f"[INFO] Fetching market caps for {len(universe)} constituents via yfinance")
+        caps = fetch_market_caps(universe.tickers, rate_limiter=rate_limiter)
+        universe.set_market_caps(caps)
+        if not universe.has_weights():
+            print("[INFO] No market caps available; tickers are weighted equally")
+        elif self.snapshot_path:
+            universe.save(self.snapshot_path)
+        return universe